@@ -0,0 +1,124 @@
+"""
+Attendance breakdowns and the check-in rate over time for the dashboards.
+
+Every answer is a single GROUP BY over `employee_table`, cached for
+`ANALYTICS_CACHE_TTL_SECONDS` per set of parameters. Dashboards refreshing
+every few seconds therefore cost at most one query per parameter set per
+TTL and worker. Concurrent misses for the same parameters share one query
+instead of each sending their own.
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from datetime import datetime, timedelta
+
+from sqlalchemy import BigInteger, Integer, cast, func, select
+
+from cache import TTLCache
+from checkin import TAIPEI, to_taipei_time
+from config import config
+from database import database, employee_table
+from replicas import replica_router
+from reports import SUMMARY_TOTALS, summary_query
+
+analytics_cache = TTLCache(max_size=256, ttl=config.ANALYTICS_CACHE_TTL_SECONDS)
+_inflight: dict[Hashable, asyncio.Task] = {}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _finish(key: Hashable, task: asyncio.Task):
+    del _inflight[key]
+    # exception() also marks a failure as retrieved when nobody was waiting.
+    if not task.cancelled() and task.exception() is None:
+        analytics_cache.set(key, task.result())
+
+
+async def _cached(key: Hashable, compute: Callable[[], Awaitable[dict]]) -> dict:
+    cached = analytics_cache.get(key)
+    if cached is not None:
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        # Its own task, so a client that disconnects does not cancel the
+        # query for the others waiting on it.
+        task = _inflight[key] = asyncio.ensure_future(compute())
+        task.add_done_callback(lambda task: _finish(key, task))
+    return await asyncio.shield(task)
+
+
+def _as_of() -> str:
+    return datetime.now(TAIPEI).isoformat(timespec="seconds")
+
+
+async def breakdown(by: str) -> dict:
+    """Registered and checked-in families and people per company, department or group."""
+
+    async def compute() -> dict:
+        rows = []
+        for row in await replica_router.reader().fetch_all(summary_query(by)):
+            row = dict(row._mapping)
+            row["check_in_rate"] = (
+                round(row["checked_in_families"] / row["families"], 4)
+                if row["families"]
+                else 0.0
+            )
+            rows.append(row)
+        return {"by": by, "as_of": _as_of(), "rows": rows}
+
+    return await _cached(("breakdown", by), compute)
+
+
+def _taipei_seconds(column):
+    """Seconds since 1970-01-01 of the check-in's Taipei wall time, so buckets align to local time."""
+    if database.url.dialect.startswith("postgres"):
+        return cast(
+            func.extract("epoch", func.timezone("Asia/Taipei", column)), BigInteger
+        )
+    # SQLite already stores the naive Taipei wall time.
+    return cast(func.strftime("%s", column), Integer)
+
+
+async def check_in_rate(
+    bucket_minutes: int, since: datetime | None = None, until: datetime | None = None
+) -> dict:
+    """Check-ins and people arriving per `bucket_minutes`, oldest bucket first."""
+    # Stored check-in times are Taipei time (naive on SQLite), so compare in it.
+    since, until = to_taipei_time(since), to_taipei_time(until)
+
+    async def compute() -> dict:
+        bucket_seconds = bucket_minutes * 60
+        seconds = _taipei_seconds(employee_table.c.checked_in_time)
+        bucket = ((seconds // bucket_seconds) * bucket_seconds).label("bucket")
+        people = sum(
+            func.coalesce(func.sum(column), 0) for column in SUMMARY_TOTALS.values()
+        )
+
+        query = (
+            select(bucket, func.count().label("check_ins"), people.label("people"))
+            .where(
+                employee_table.c.is_checked == True,
+                employee_table.c.checked_in_time.is_not(None),
+            )
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+        if since is not None:
+            query = query.where(employee_table.c.checked_in_time >= since)
+        if until is not None:
+            query = query.where(employee_table.c.checked_in_time < until)
+
+        buckets = [
+            {
+                "start": to_taipei_time(
+                    _EPOCH + timedelta(seconds=row["bucket"])
+                ).isoformat(timespec="minutes"),
+                "check_ins": row["check_ins"],
+                "people": row["people"],
+            }
+            for row in await replica_router.reader().fetch_all(query)
+        ]
+        return {"bucket_minutes": bucket_minutes, "as_of": _as_of(), "buckets": buckets}
+
+    return await _cached(("check_in_rate", bucket_minutes, since, until), compute)
@@ -0,0 +1,80 @@
+"""
+Compare /all-employees variants on a large roster.
+
+Seeds a throwaway SQLite database with `--rows` employees and requests the
+roster through the ASGI app in-process, measuring time to first byte, total
+time and peak Python memory (tracemalloc) per variant. "legacy" re-creates
+the previous handler: fetch_all plus one EmployeeResponse per row.
+
+Usage:
+    python benchmarks/all_employees.py --rows 20000
+"""
+
+import argparse
+import asyncio
+import tracemalloc
+
+from asgi_client import request
+from harness import employee, seed
+
+from database import database, employee_table
+from main import app
+from migrations import upgrade
+from models.employee import EmployeeResponse
+
+PREFIX = "/api/v1/employee"
+
+VARIANTS = {
+    "legacy": "/bench/legacy-all-employees",
+    "json": f"{PREFIX}/all-employees",
+    "json page of 500": f"{PREFIX}/all-employees?limit=500",
+    "json stream": f"{PREFIX}/all-employees?stream=true",
+    "ndjson stream": f"{PREFIX}/all-employees?format=ndjson",
+    "ndjson name,mobile": f"{PREFIX}/all-employees?format=ndjson&fields=name,mobile",
+}
+
+
+@app.get("/bench/legacy-all-employees", response_model=list[EmployeeResponse])
+async def legacy_all_employees():
+    employees = await database.fetch_all(employee_table.select())
+    return [EmployeeResponse(**employee) for employee in employees]
+
+
+async def run(rows: int):
+    upgrade()
+    await database.connect()
+    try:
+        await seed(employee(i) for i in range(rows))
+
+        print(
+            f"{'variant':<20} {'status':>6} {'TTFB ms':>9} {'total ms':>9} {'peak MiB':>9} {'KiB':>9}"
+        )
+        for name, url in VARIANTS.items():
+            # Warm up, time an untraced run, then measure memory separately
+            # because tracemalloc slows allocation-heavy code down a lot.
+            await request(app, "GET", url)
+            result = await request(app, "GET", url)
+            tracemalloc.start()
+            await request(app, "GET", url)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            print(
+                f"{name:<20} {result['status']:>6} {1000 * result['first_byte']:>9.1f} "
+                f"{1000 * result['total']:>9.1f} {peak / 2**20:>9.1f} {len(result['body']) / 1024:>9.0f}"
+            )
+    finally:
+        await database.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Minimal in-process ASGI client used by the benchmarks to time responses."""
+
+import asyncio
+import json
+import time
+
+
+async def request(
+    app,
+    method: str,
+    url: str,
+    body: dict | None = None,
+    headers: dict | None = None,
+) -> dict:
+    """
+    Drive one request through `app` without a network hop.
+
+    Returns the status, response headers and body plus `first_byte` and
+    `total` timings in seconds.
+    """
+    path, _, query_string = url.partition("?")
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    raw_headers = [(b"host", b"benchmark")]
+    if body is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+        raw_headers.append((b"content-length", str(len(payload)).encode()))
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode(), value.encode()))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    result = {"status": None, "headers": {}, "first_byte": None, "body": bytearray()}
+    requested = False
+    finished = asyncio.Event()
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["headers"] = {
+                name.decode().lower(): value.decode()
+                for name, value in message.get("headers", [])
+            }
+        elif message["type"] == "http.response.body":
+            if message.get("body"):
+                if result["first_byte"] is None:
+                    result["first_byte"] = time.perf_counter() - start
+                result["body"] += message["body"]
+            if not message.get("more_body"):
+                finished.set()
+
+    await app(scope, receive, send)
+    result["total"] = time.perf_counter() - start
+    if result["first_byte"] is None:
+        result["first_byte"] = result["total"]
+    return result
@@ -0,0 +1,153 @@
+"""
+Sustained check-in throughput: direct writes vs the write-behind buffer.
+
+Seeds a throwaway database with `--employees` rows and checks every one of
+them in through POST /{mobile}/check-in on main.app, `--concurrency` at a
+time, once with direct writes and once with checkin_buffer enabled. For the
+buffered run it reports both the acknowledged rate and the time until every
+check-in is committed.
+
+Both runs are checked against the database: every employee checked in
+exactly once and the running totals equal to SUM(). Replaying the journal
+after a crash is covered by tests/test_checkin_buffer.py.
+
+Usage:
+    python benchmarks/check_in_buffer.py --employees 2000 --concurrency 200
+    TEST_DATABASE_URL=postgresql://... python benchmarks/check_in_buffer.py
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import harness
+from asgi_client import request
+from sqlalchemy import func, select
+
+import checkin_buffer
+import routers.employee
+from checkin_buffer import CheckInBuffer
+from database import database, employee_table, participant_totals_table
+from main import app
+from migrations import upgrade
+from security import create_access_token, identity_cache
+from totals import TOTAL_COLUMNS, reconcile_totals
+
+PREFIX = "/api/v1/employee"
+
+
+async def seed(employees: int):
+    await harness.seed(
+        harness.employee(i, group=f"G{i % 20}") for i in range(employees)
+    )
+    identity_cache.clear()
+
+
+async def verify(employees: int) -> bool:
+    checked = await database.fetch_one(
+        select(func.count())
+        .select_from(employee_table)
+        .where(employee_table.c.is_checked == True)
+    )
+    counters = dict(
+        await database.fetch_one(
+            participant_totals_table.select().where(participant_totals_table.c.id == 1)
+        )
+    )
+    totals = await reconcile_totals()
+    return checked[0] == employees and all(
+        counters[total] == totals[total] for total in TOTAL_COLUMNS
+    )
+
+
+async def scan_all(employees: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def scan(mobile: str):
+        nonlocal failed
+        headers = {"Authorization": f"Bearer {create_access_token(mobile)}"}
+        async with semaphore:
+            response = await request(
+                app, "POST", f"{PREFIX}/{mobile}/check-in", headers=headers
+            )
+        if response["status"] != 200:
+            failed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[scan(f"09{i:08d}") for i in range(employees)])
+    elapsed = time.perf_counter() - start
+    if failed:
+        print(f"  {failed} check-ins failed")
+    return elapsed
+
+
+def use_buffer(buffer: CheckInBuffer):
+    checkin_buffer.check_in_buffer = buffer
+    routers.employee.check_in_buffer = buffer
+
+
+async def run(args) -> bool:
+    journal = tempfile.mkdtemp()
+    upgrade()
+    await database.connect()
+    try:
+        await seed(args.employees)
+        direct = await scan_all(args.employees, args.concurrency)
+        direct_ok = await verify(args.employees)
+
+        await seed(args.employees)
+        buffer = CheckInBuffer(
+            journal, batch_size=args.batch_size, flush_interval=args.flush_interval
+        )
+        use_buffer(buffer)
+        await buffer.start()
+        start = time.perf_counter()
+        acknowledged = await scan_all(args.employees, args.concurrency)
+        await buffer.stop()
+        committed = time.perf_counter() - start
+        buffered_ok = await verify(args.employees)
+
+        leftover = os.listdir(journal)
+    finally:
+        await database.disconnect()
+
+    n = args.employees
+    print(f"backend:               {database.url.dialect}")
+    print(
+        f"check-ins:             {n}, concurrency {args.concurrency}, batch size {args.batch_size}"
+    )
+    print(
+        f"direct:                {direct:.3f}s ({n / direct:.0f} check-ins/s) {'OK' if direct_ok else 'FAILED'}"
+    )
+    print(
+        f"buffered, acknowledged: {acknowledged:.3f}s ({n / acknowledged:.0f} check-ins/s)"
+    )
+    print(
+        f"buffered, committed:   {committed:.3f}s ({n / committed:.0f} check-ins/s, "
+        f"{buffer.batches} batches) {'OK' if buffered_ok else 'FAILED'}"
+    )
+    if leftover:
+        print(f"journal not cleaned up: {leftover}")
+
+    return direct_ok and buffered_ok and not leftover
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--employees", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=0.25)
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Set-up shared by the benchmark scripts; import it before any module of the app.
+
+Puts the repository root on sys.path and points the test config at a
+throwaway SQLite database named after the running script, unless
+TEST_DATABASE_URL is already set. A benchmark that needs other settings
+sets them with os.environ.setdefault before importing this module.
+"""
+
+import os
+import sys
+import tempfile
+from collections.abc import Iterable
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("ENV_STATE", "test")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault(
+    "TEST_DATABASE_URL",
+    f"sqlite:///{tempfile.mkdtemp()}/{os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'benchmark'}.db",
+)
+
+from database import database, employee_table, participant_totals_table
+from totals import reconcile_totals
+
+
+def employee(i: int, **values) -> dict:
+    """Employee `i` of a synthetic roster: 200 groups, families of up to eight."""
+    return {
+        "name": f"Employee {i}",
+        "mobile": f"09{i:08d}",
+        "department": f"Department {i % 40}",
+        "company": f"Company {i % 5}",
+        "group": f"G{i % 200}",
+        "family_employee": 1,
+        "family_infant": i % 2,
+        "family_child": i % 3,
+        "family_adult": 2,
+        "family_elderly": i % 4 // 3,
+        "is_checked": False,
+        "is_deleted": False,
+        **values,
+    }
+
+
+async def seed(employees: Iterable[dict]):
+    """Replace the roster with `employees` and recount the participant totals."""
+    employees = list(employees)
+    await database.execute(employee_table.delete())
+    await database.execute(participant_totals_table.delete())
+    for start in range(0, len(employees), 1000):
+        await database.execute(
+            employee_table.insert().values(employees[start : start + 1000])
+        )
+    await reconcile_totals()
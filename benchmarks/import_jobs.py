@@ -0,0 +1,147 @@
+"""
+Check-in latency while admins upload rosters, synchronous imports against
+background import jobs.
+
+Seeds a throwaway database with attendees, then keeps checking them in one
+after another while `--uploads` rosters of `--rows` rows are imported at the
+same time, first through import_roster as /batch-create-employees does, then
+as background jobs. Reports check-in latency (median, p99, max), failed
+check-ins and how long the imports took, next to check-ins with no import
+running. On SQLite the synchronous imports read before they write inside one
+transaction, so they fail on the first check-in's write lock and that row
+measures check-ins with nothing else running.
+
+Usage:
+    python benchmarks/import_jobs.py --uploads 3 --rows 20000
+    TEST_DATABASE_URL=postgresql://... python benchmarks/import_jobs.py
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("TEST_IMPORT_JOB_DIR", tempfile.mkdtemp())
+
+import harness
+import pytz
+
+from checkin import check_in
+from database import database, import_job_table
+from importer import import_roster
+from jobs import FAILED, SUCCEEDED, import_jobs
+from migrations import upgrade
+
+HEADER = "name,company,department,mobile,group,family_employee,family_infant,family_child,family_adult,family_elderly\n"
+ATTENDEES = 100_000
+TAIPEI = pytz.timezone("Asia/Taipei")
+
+
+def roster(prefix: int, rows: int) -> bytes:
+    lines = (
+        f"Employee {i},Company,Department,0{prefix}{i:08d},G{i % 200},1,0,1,1,0\n"
+        for i in range(rows)
+    )
+    return (HEADER + "".join(lines)).encode("utf-8")
+
+
+async def seed():
+    await database.execute(import_job_table.delete())
+    await harness.seed(
+        harness.employee(i, group=f"G{i % 20}") for i in range(ATTENDEES)
+    )
+
+
+async def check_in_until(done: asyncio.Event, attendees) -> tuple[list[float], int]:
+    latencies, failures = [], 0
+    while not done.is_set():
+        start = time.perf_counter()
+        try:
+            await check_in(f"09{next(attendees):08d}", datetime.now(TAIPEI))
+        except Exception:  # noqa: BLE001 - any failed check-in counts
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+        # Gate tablets scan a few times a second, not back to back.
+        await asyncio.sleep(0.01)
+    return latencies, failures
+
+
+async def idle(bodies: list[bytes]) -> int:
+    await asyncio.sleep(5)
+    return 0
+
+
+async def synchronous(bodies: list[bytes]) -> int:
+    results = await asyncio.gather(
+        *[import_roster(io.BytesIO(body), "roster.csv") for body in bodies],
+        return_exceptions=True,
+    )
+    return sum(isinstance(result, Exception) for result in results)
+
+
+async def as_jobs(bodies: list[bytes]) -> int:
+    jobs = [await import_jobs.submit(io.BytesIO(body), "roster.csv") for body in bodies]
+    while True:
+        states = [(await import_jobs.get(job["id"]))["status"] for job in jobs]
+        if all(state in (SUCCEEDED, FAILED) for state in states):
+            return states.count(FAILED)
+        await asyncio.sleep(0.1)
+
+
+async def measure(name: str, imports, bodies: list[bytes], attendees):
+    done = asyncio.Event()
+    checker = asyncio.create_task(check_in_until(done, attendees))
+    start = time.perf_counter()
+    failed_imports = await imports(bodies)
+    elapsed = time.perf_counter() - start
+    done.set()
+    latencies, failures = await checker
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:<12} {1000 * statistics.median(latencies):8.1f} {1000 * p99:8.1f} "
+        f"{1000 * latencies[-1]:8.1f} {failures:>8} {elapsed:>9.1f} {failed_imports:>7}"
+    )
+
+
+async def run(uploads: int, rows: int):
+    upgrade()
+    await database.connect()
+    try:
+        await seed()
+        attendees = iter(range(ATTENDEES))
+        print(
+            f"{'imports':<12} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>8} {'import s':>9} {'failed':>7}"
+        )
+        print(f"{'':<12} {'check-in':>26} {'check-ins':>17} {'':>9} {'imports':>7}")
+        await measure("none", idle, [], attendees)
+        await measure(
+            "synchronous",
+            synchronous,
+            [roster(10 + i, rows) for i in range(uploads)],
+            attendees,
+        )
+        await measure(
+            "jobs", as_jobs, [roster(30 + i, rows) for i in range(uploads)], attendees
+        )
+    finally:
+        await database.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--uploads", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(args.uploads, args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+How many idle live-feed subscribers can one process sustain?
+
+Attaches N subscribers to a LiveHub, each consumed by its own task exactly as
+the SSE endpoint does, then publishes events and measures publish cost,
+delivery latency to the last subscriber and memory per subscriber.
+
+Usage:
+    python benchmarks/live_fanout.py --subscribers 1000 5000 10000 --events 20
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+import harness  # noqa: F401
+
+from live import LiveHub
+
+
+async def consume(hub: LiveHub, received: list):
+    subscriber = hub.subscribe()
+    async for _ in hub.stream(subscriber, heartbeat_seconds=60):
+        received[0] += 1
+
+
+async def run(subscribers: int, events: int) -> dict:
+    hub = LiveHub()
+    received = [0]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    tasks = [asyncio.create_task(consume(hub, received)) for _ in range(subscribers)]
+    while len(hub.subscribers) < subscribers:
+        await asyncio.sleep(0.01)
+
+    memory_per_subscriber = (
+        tracemalloc.get_traced_memory()[0] - baseline
+    ) / subscribers
+    tracemalloc.stop()
+
+    publish_times = []
+    latencies = []
+    data = {
+        "total_employee": 1234,
+        "total_infant": 56,
+        "total_child": 789,
+        "total_adult": 1011,
+        "total_elderly": 12,
+    }
+    for _ in range(events):
+        received[0] = 0
+        start = time.perf_counter()
+        hub.publish("totals", data)
+        published = time.perf_counter()
+
+        while received[0] < subscribers:
+            await asyncio.sleep(0)
+        delivered = time.perf_counter()
+
+        publish_times.append(published - start)
+        latencies.append(delivered - start)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        "subscribers": subscribers,
+        "events": events,
+        "publish_ms": 1000 * sum(publish_times) / events,
+        "delivery_ms": 1000 * sum(latencies) / events,
+        "max_delivery_ms": 1000 * max(latencies),
+        "kib_per_subscriber": memory_per_subscriber / 1024,
+        "dropped": hub.dropped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--subscribers", type=int, nargs="+", default=[1000, 5000, 10000]
+    )
+    parser.add_argument("--events", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"{'subscribers':>11} {'publish ms':>10} {'deliver ms':>10} {'max ms':>8} {'KiB/sub':>8} {'dropped':>7}"
+    )
+    for subscribers in args.subscribers:
+        result = asyncio.run(run(subscribers, args.events))
+        print(
+            f"{result['subscribers']:>11} {result['publish_ms']:>10.2f} {result['delivery_ms']:>10.2f} "
+            f"{result['max_delivery_ms']:>8.2f} {result['kib_per_subscriber']:>8.2f} {result['dropped']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Event-day load test: the morning gate surge against main.app.
+
+Seeds a throwaway database with a realistic roster, then runs `--attendees`
+virtual attendees with at most `--concurrency` of them active at once. Each
+attendee logs in, checks in and then polls the participant totals like the
+big-screen dashboard does. Requests are driven through the ASGI app
+in-process, so the numbers reflect one worker without network overhead.
+
+Reports throughput and p50/p95/p99 latency per endpoint and writes the
+results as JSON so runs can be compared over time. Exits non-zero when any
+endpoint's error rate exceeds `--max-error-rate` or its p95 exceeds
+`--max-p95-ms`; a 503 asking the client to retry counts as an error. The
+default p95 budget fits one SQLite worker at the default concurrency, where
+attendees queue for the single event loop and write lock.
+
+Usage:
+    python benchmarks/load_test.py --attendees 2000 --concurrency 200
+    TEST_DATABASE_URL=postgresql://localhost/family_day_bench python benchmarks/load_test.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import UTC, datetime
+
+import harness
+from asgi_client import request
+
+from database import database
+from main import app
+from migrations import upgrade
+
+PREFIX = "/api/v1/employee"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def roster(rows: int, rng: random.Random) -> list[dict]:
+    """Families of one to six people, ~30 employees per group, a few companies."""
+    companies = ["Promate", "Legacy", "Solutions", "Electronics"]
+    employees = []
+    for i in range(rows):
+        employees.append(
+            {
+                "name": f"Employee {i}",
+                "mobile": f"09{i:08d}",
+                "department": f"Department {rng.randrange(40)}",
+                "company": rng.choice(companies),
+                "group": f"G{i // 30:03d}",
+                "family_employee": 1,
+                "family_infant": rng.choices([0, 1], weights=[9, 1])[0],
+                "family_child": rng.choices([0, 1, 2, 3], weights=[5, 3, 2, 1])[0],
+                "family_adult": rng.choices([0, 1, 2], weights=[3, 5, 2])[0],
+                "family_elderly": rng.choices([0, 1, 2], weights=[7, 2, 1])[0],
+                "is_checked": False,
+                "is_deleted": False,
+            }
+        )
+    return employees
+
+
+async def attendee(mobile: str, polls: int, samples: dict, errors: dict):
+    async def call(name: str, method: str, url: str, **kwargs) -> dict:
+        try:
+            response = await request(app, method, url, **kwargs)
+        except Exception as e:  # noqa: BLE001 - any failed request counts
+            errors[name] += 1
+            errors[f"{name}: {type(e).__name__}"] += 1
+            return {}
+        samples[name].append(response["total"])
+        if response["status"] >= 400:
+            errors[name] += 1
+        return response
+
+    login = await call(
+        "POST /token", "POST", f"{PREFIX}/token", body={"mobile": mobile}
+    )
+    if login.get("status") != 200:
+        return
+    token = json.loads(login["body"])["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+
+    await call(
+        "POST /{mobile}/check-in", "POST", f"{PREFIX}/{mobile}/check-in", headers=auth
+    )
+
+    for _ in range(polls):
+        await call("GET /total/participants", "GET", f"{PREFIX}/total/participants")
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(
+        len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1)
+    )
+    return sorted_values[index]
+
+
+def summarize(samples: dict, errors: dict, elapsed: float) -> dict:
+    endpoints = {}
+    for name, latencies in samples.items():
+        latencies = sorted(latencies)
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": errors.get(name, 0),
+            "throughput_rps": len(latencies) / elapsed,
+            "p50_ms": 1000 * percentile(latencies, 0.50),
+            "p95_ms": 1000 * percentile(latencies, 0.95),
+            "p99_ms": 1000 * percentile(latencies, 0.99),
+            "max_ms": 1000 * latencies[-1] if latencies else 0.0,
+        }
+    return endpoints
+
+
+def check_thresholds(
+    endpoints: dict, max_error_rate: float, max_p95_ms: float
+) -> list[str]:
+    failures = []
+    for name, stats in endpoints.items():
+        error_rate = stats["errors"] / stats["requests"] if stats["requests"] else 1.0
+        if error_rate > max_error_rate:
+            failures.append(
+                f"{name}: error rate {error_rate:.1%} above {max_error_rate:.1%}"
+            )
+        if stats["p95_ms"] > max_p95_ms:
+            failures.append(
+                f"{name}: p95 {stats['p95_ms']:.0f} ms above {max_p95_ms:.0f} ms"
+            )
+    return failures
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    upgrade()
+    await database.connect()
+    try:
+        await harness.seed(roster(args.roster, rng))
+
+        mobiles = [f"09{i:08d}" for i in rng.sample(range(args.roster), args.attendees)]
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(mobile: str):
+            async with semaphore:
+                await attendee(mobile, args.polls, samples, errors)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[bounded(mobile) for mobile in mobiles])
+        elapsed = time.perf_counter() - start
+    finally:
+        await database.disconnect()
+
+    endpoints = summarize(samples, errors, elapsed)
+    return {
+        "timestamp": datetime.now(UTC).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "database": database.url.dialect,
+        "parameters": vars(args),
+        "elapsed_s": elapsed,
+        "attendees_per_s": args.attendees / elapsed,
+        "endpoints": endpoints,
+        "error_details": {name: count for name, count in errors.items() if ":" in name},
+        "failures": check_thresholds(endpoints, args.max_error_rate, args.max_p95_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--roster", type=int, default=5000, help="employees in the seeded roster"
+    )
+    parser.add_argument(
+        "--attendees", type=int, default=1000, help="virtual attendees arriving"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=100, help="attendees active at once"
+    )
+    parser.add_argument(
+        "--polls", type=int, default=3, help="/total/participants polls per attendee"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--max-error-rate", type=float, default=0.01, help="per endpoint, 0.01 is 1%%"
+    )
+    parser.add_argument("--max-p95-ms", type=float, default=4500.0, help="per endpoint")
+    parser.add_argument(
+        "--output",
+        help="results file (default: benchmarks/results/load_test-<time>.json)",
+    )
+    args = parser.parse_args()
+    args.attendees = min(args.attendees, args.roster)
+
+    results = asyncio.run(run(args))
+
+    print(
+        f"{results['database']}: {args.attendees} attendees, concurrency {args.concurrency}, "
+        f"{results['elapsed_s']:.2f}s ({results['attendees_per_s']:.0f} attendees/s)"
+    )
+    print(
+        f"{'endpoint':<28} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for name, stats in results["endpoints"].items():
+        print(
+            f"{name:<28} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput_rps']:>8.0f} "
+            f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}"
+        )
+    for name, count in results["error_details"].items():
+        print(f"  {name}: {count}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load_test-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    for failure in results["failures"]:
+        print(f"FAILED {failure}")
+    sys.exit(1 if results["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
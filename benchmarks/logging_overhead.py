@@ -0,0 +1,107 @@
+"""
+Per-request logging overhead, before and after the queue-based pipeline.
+
+Replays the log calls of one check-in and one /total/participants poll the
+way the handlers made them before (eager f-strings and JSON dumps into a
+synchronous StreamHandler) and the way they make them now (lazy %-style
+arguments into logging_config's queue, sampled and formatted off-thread).
+Output goes to os.devnull in both cases; the number reported is the time
+spent on the request's own thread.
+
+Usage:
+    python benchmarks/logging_overhead.py --requests 20000
+"""
+
+import argparse
+import logging
+import os
+import time
+
+import harness  # noqa: F401
+
+from logging_config import sampled_logger, setup_logging, stop_logging
+from models.employee import EmployeeCreate
+
+EMPLOYEE = EmployeeCreate(
+    name="王小明",
+    mobile="0912345678",
+    department="Engineering",
+    company="Promate",
+    family_child=2,
+    family_adult=1,
+    group="G042",
+)
+TOTALS = {
+    "total_employee": 1234,
+    "total_infant": 56,
+    "total_child": 789,
+    "total_adult": 1011,
+    "total_elderly": 12,
+}
+
+
+def legacy_requests(logger: logging.Logger, requests: int):
+    for _ in range(requests):
+        mobile = EMPLOYEE.mobile
+        logger.info(f"Received check-in request for employee with mobile: {mobile}")
+        logger.info(f"Employee payload: {EMPLOYEE.model_dump_json()}")
+        logger.info(f"Employee with mobile: {mobile} checked in at 2024-05-01 09:00:00")
+        logger.info("Received request to calculate total participants")
+        logger.info(f"Response data: {TOTALS}")
+
+
+def current_requests(logger: logging.Logger, requests: int):
+    totals_logger = sampled_logger(logger, "get_total_of_participants")
+    for _ in range(requests):
+        mobile = EMPLOYEE.mobile
+        logger.info("Received check-in request for employee with mobile: %s", mobile)
+        logger.debug("Employee payload: %s", EMPLOYEE)
+        logger.info(
+            "Employee with mobile: %s checked in at %s", mobile, "2024-05-01 09:00:00"
+        )
+        totals_logger.info("Received request to calculate total participants")
+        totals_logger.info("Response data: %s", TOTALS)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        logger = logging.getLogger("benchmark.legacy")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(
+            logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+        )
+        logger.addHandler(handler)
+
+        start = time.perf_counter()
+        legacy_requests(logger, args.requests)
+        legacy = time.perf_counter() - start
+
+        setup_logging(devnull)
+        logger = logging.getLogger("benchmark.current")
+
+        start = time.perf_counter()
+        current_requests(logger, args.requests)
+        current = time.perf_counter() - start
+        stop_logging()
+        drained = time.perf_counter() - start
+
+    print(f"requests:             {args.requests}")
+    print(f"legacy:               {1e6 * legacy / args.requests:.1f} us/request")
+    print(
+        f"queue + sampling:     {1e6 * current / args.requests:.1f} us/request on the request thread"
+    )
+    print(
+        f"                      ({1e6 * drained / args.requests:.1f} us/request including background formatting)"
+    )
+
+
+if __name__ == "__main__":
+    main()
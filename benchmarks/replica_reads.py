@@ -0,0 +1,150 @@
+"""
+Read/write splitting: verify which reads go to the replica and that a client
+reads its own check-in right after it.
+
+Uses two SQLite files as primary and replica, or two databases given as
+TEST_DATABASE_URL and TEST_DATABASE_REPLICA_URL. The replica is a copy of the
+primary taken after seeding (SQLite files are copied with the backup API;
+with Postgres, seed both or point the replica at a real standby), so until
+the copy is refreshed it stands for a replica that has not caught up yet.
+
+Checks in `--check-ins` employees through POST /{mobile}/check-in, then reads
+the participant totals, their group and the roster with and without the
+cookie the check-in set. Fails unless cookie-less reads are served by the
+replica and still show the old state, and reads carrying the cookie are
+served by the primary and include the check-ins.
+
+Usage:
+    python benchmarks/replica_reads.py --employees 1000 --check-ins 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from urllib.parse import urlsplit
+
+os.environ.setdefault(
+    "TEST_DATABASE_REPLICA_URL", f"sqlite:///{tempfile.mkdtemp()}/replica.db"
+)
+# Every read below must reach a database, not the previous request's cache.
+os.environ.setdefault("TEST_ROSTER_CACHE_TTL_SECONDS", "0")
+
+import harness
+from asgi_client import request
+
+from config import config
+from database import database
+from main import app
+from migrations import upgrade
+from replicas import db_reads_routed, replica_router
+from security import create_access_token
+
+
+def copy_to_replica():
+    primary, replica = config.DATABASE_URL, config.DATABASE_REPLICA_URL
+    if not primary.startswith("sqlite"):
+        return
+    with (
+        sqlite3.connect(urlsplit(primary).path) as source,
+        sqlite3.connect(urlsplit(replica).path) as target,
+    ):
+        source.backup(target)
+
+
+async def get(url: str, cookie: str | None = None):
+    response = await request(
+        app, "GET", url, headers={"Cookie": cookie} if cookie else None
+    )
+    assert response["status"] == 200, response
+    return json.loads(bytes(response["body"]))
+
+
+def routed() -> dict:
+    return {
+        target: db_reads_routed._values.get((target,), 0)
+        for target in ("primary", "replica")
+    }
+
+
+async def reads(cookie: str, mobiles: list[str]) -> tuple[int, int, int, dict]:
+    before = routed()
+    totals = await get("/api/v1/employee/total/participants", cookie)
+    group = await get("/api/v1/employee/group/members/G0", cookie)
+    roster = await get("/api/v1/employee/all-employees", cookie)
+    after = routed()
+    checked = {row["mobile"] for row in group if row["is_checked"]}
+    return (
+        totals["total_employee"],
+        len(checked & set(mobiles)),
+        sum(row["is_checked"] for row in roster),
+        {target: after[target] - before[target] for target in after},
+    )
+
+
+async def run(employees: int, check_ins: int) -> bool:
+    upgrade()
+    await database.connect()
+    try:
+        await harness.seed(
+            harness.employee(i, group=f"G{i % 20}") for i in range(employees)
+        )
+        copy_to_replica()
+        await replica_router.connect()
+
+        # Every 20th employee is in group G0.
+        mobiles = [f"09{i:08d}" for i in range(0, 20 * check_ins, 20)]
+        cookie = None
+        for mobile in mobiles:
+            response = await request(
+                app,
+                "POST",
+                f"/api/v1/employee/{mobile}/check-in",
+                headers={"Authorization": f"Bearer {create_access_token(mobile)}"},
+            )
+            assert response["status"] == 200, response
+            cookie = response["headers"]["set-cookie"].split(";")[0]
+
+        stale = await reads(None, mobiles)
+        sticky = await reads(cookie, mobiles)
+        copy_to_replica()
+        caught_up = await reads(None, mobiles)
+    finally:
+        await replica_router.disconnect()
+        await database.disconnect()
+
+    print(f"primary:  {config.DATABASE_URL}")
+    print(f"replica:  {config.DATABASE_REPLICA_URL}")
+    print(f"{'reads':<22} {'totals':>7} {'group':>6} {'roster':>7}  routed to")
+    for name, (totals, group, roster, targets) in (
+        ("without cookie", stale),
+        ("with check-in cookie", sticky),
+        ("replica caught up", caught_up),
+    ):
+        print(f"{name:<22} {totals:>7} {group:>6} {roster:>7}  {targets}")
+
+    ok = (
+        stale == (0, 0, 0, {"primary": 0, "replica": 3})
+        and sticky == (check_ins, check_ins, check_ins, {"primary": 3, "replica": 0})
+        and caught_up[:3] == sticky[:3]
+    )
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--check-ins", type=int, default=20)
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(run(args.employees, args.check_ins)) else 1)
+
+
+if __name__ == "__main__":
+    main()
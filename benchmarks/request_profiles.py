@@ -0,0 +1,108 @@
+"""
+Per-request profiling: overhead and what a profile shows.
+
+Seeds a throwaway database with `--employees` rows and enables profiling
+with an admin token. Sends `--requests` requests to each endpoint, first
+without the X-Profile header (the middleware only looks at the headers) and
+then with it, and prints the median latency of both. Then prints the
+module breakdown, database time and heaviest stacks of the last profile
+taken of each endpoint, as fetched from GET /debug/profiles/{id}.
+
+Profiling is not installed at all without PROFILE_ADMIN_TOKEN or
+PROFILE_SAMPLE_RATE; compare against `--requests` runs of other benchmarks
+for that case.
+
+Usage:
+    python benchmarks/request_profiles.py --employees 5000 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+
+os.environ.setdefault("TEST_PROFILE_ADMIN_TOKEN", "benchmark")
+# Every request must reach the database, not the previous request's cache.
+os.environ.setdefault("TEST_ROSTER_CACHE_TTL_SECONDS", "0")
+
+import harness
+from asgi_client import request
+
+from config import config
+from database import database
+from main import app
+from migrations import upgrade
+
+ENDPOINTS = (
+    "/api/v1/employee/total/participants",
+    "/api/v1/employee/group/members/G0",
+    "/api/v1/employee/all-employees",
+)
+
+
+async def timed(url: str, requests: int, headers: dict) -> tuple[float, dict]:
+    samples = []
+    for _ in range(requests):
+        response = await request(app, "GET", url, headers=headers)
+        assert response["status"] == 200, response
+        samples.append(response["total"])
+    return statistics.median(samples), response
+
+
+async def run(employees: int, requests: int, stacks: int):
+    upgrade()
+    await database.connect()
+    try:
+        await harness.seed(
+            harness.employee(i, group=f"G{i % 20}", is_checked=i % 3 == 0)
+            for i in range(employees)
+        )
+        admin = {"X-Profile": config.PROFILE_ADMIN_TOKEN}
+        profiles = {}
+        print(f"{'endpoint':<40} {'plain ms':>9} {'profiled ms':>12}")
+        for url in ENDPOINTS:
+            plain, _ = await timed(url, requests, {})
+            profiled, response = await timed(url, requests, admin)
+            # Fetched now, before later profiles push it out of the store.
+            profile_id = response["headers"]["x-profile-id"]
+            response = await request(
+                app, "GET", f"/debug/profiles/{profile_id}", headers=admin
+            )
+            profiles[url] = json.loads(bytes(response["body"]))
+            print(f"{url:<40} {1000 * plain:9.2f} {1000 * profiled:12.2f}")
+
+        for url, profile in profiles.items():
+            print(
+                f"\n{url}: {1000 * profile['duration_seconds']:.2f} ms, "
+                f"{1000 * profile['sampled_seconds']:.2f} ms sampled in {profile['samples']} samples, "
+                f"{profile['db_queries']} queries in {1000 * profile['db_seconds']:.2f} ms"
+            )
+            print(
+                "  modules:",
+                {
+                    module: round(1000 * seconds, 2)
+                    for module, seconds in profile["modules"].items()
+                },
+            )
+            for entry in profile["stacks"][:stacks]:
+                print(
+                    f"  {1000 * entry['seconds']:7.2f} ms  ...{entry['stack'][-110:]}"
+                )
+    finally:
+        await database.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--employees", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--stacks", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.employees, args.requests, args.stacks))
+
+
+if __name__ == "__main__":
+    main()
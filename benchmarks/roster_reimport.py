@@ -0,0 +1,129 @@
+"""
+Re-importing an updated roster: diff-based re-import against wipe and reload.
+
+Seeds a throwaway SQLite database with `--rows` employees, checks in a
+third of them, then builds a CSV of the same roster with `--changes` edits
+spread over updated headcounts, new employees and removed ones. Times the
+dry run, applying it, and the wipe-and-reload the re-import replaces, and
+checks that a second dry run finds nothing left to change and that check-ins
+survived.
+
+Usage:
+    python benchmarks/roster_reimport.py --rows 20000 --changes 50
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import sys
+import time
+
+import harness
+from sqlalchemy import func, select
+
+from database import database, employee_table
+from importer import REQUIRED_COLUMNS, import_roster, reimport_roster
+from migrations import upgrade
+
+COLUMNS = sorted(REQUIRED_COLUMNS)
+
+
+def employee(i: int) -> dict:
+    """Employee `i` as a row of the uploaded roster."""
+    row = harness.employee(i)
+    return {column: row[column] for column in COLUMNS}
+
+
+def to_csv(employees: list[dict]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    writer.writerows(employees)
+    return buffer.getvalue().encode("utf-8")
+
+
+async def seed(rows: int):
+    await harness.seed(harness.employee(i, is_checked=i % 3 == 0) for i in range(rows))
+
+
+def updated_roster(rows: int, changes: int) -> list[dict]:
+    employees = [employee(i) for i in range(rows)]
+    third = changes // 3
+    for i in range(0, rows, rows // (changes - 2 * third)):
+        employees[i]["family_child"] += 1
+    del employees[-third:]
+    employees.extend(employee(rows + i) for i in range(third))
+    return employees
+
+
+async def timed(coroutine) -> tuple[float, dict]:
+    start = time.perf_counter()
+    result = await coroutine
+    return time.perf_counter() - start, result
+
+
+async def checked_in() -> int:
+    return await database.fetch_val(
+        select(func.count())
+        .select_from(employee_table)
+        .where(employee_table.c.is_checked == True)
+    )
+
+
+async def run(rows: int, changes: int):
+    upgrade()
+    await database.connect()
+    try:
+        await seed(rows)
+        body = to_csv(updated_roster(rows, changes))
+        before = await checked_in()
+
+        elapsed, report = await timed(
+            reimport_roster(io.BytesIO(body), "roster.csv", dry_run=True)
+        )
+        summary = {
+            key: report[key] for key in ("inserted", "updated", "deleted", "unchanged")
+        }
+        # The first upload in a process also pays for importing pandas.
+        print(f"dry run (cold)   {1000 * elapsed:8.0f} ms  {summary}")
+
+        elapsed, _ = await timed(
+            reimport_roster(io.BytesIO(body), "roster.csv", dry_run=False)
+        )
+        print(f"apply            {1000 * elapsed:8.0f} ms")
+
+        elapsed, report = await timed(
+            reimport_roster(io.BytesIO(body), "roster.csv", dry_run=True)
+        )
+        left = report["inserted"] + report["updated"] + report["deleted"]
+        print(f"dry run again    {1000 * elapsed:8.0f} ms  changes left: {left}")
+        after = await checked_in()
+        print(f"check-ins kept: {after} of {before}")
+
+        await seed(rows)
+        start = time.perf_counter()
+        await database.execute(employee_table.delete())
+        await import_roster(io.BytesIO(body), "roster.csv")
+        print(
+            f"wipe and reload  {1000 * (time.perf_counter() - start):8.0f} ms  (check-ins lost: {before})"
+        )
+
+        if left or after != before:
+            sys.exit(1)
+    finally:
+        await database.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--changes", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.changes))
+
+
+if __name__ == "__main__":
+    main()
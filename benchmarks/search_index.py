@@ -0,0 +1,145 @@
+"""
+Help desk search: n-gram index against a LIKE scan on a large roster.
+
+Seeds a throwaway SQLite database with `--rows` employees with random
+Chinese names and mobiles, builds the search index, and reports its build
+time and memory (tracemalloc, measured in a separate build so the timing is
+not inflated). Then runs `--queries` random lookups of each kind through
+GET /api/v1/employee/search and through the `LIKE '%...%'` query it
+replaces, and prints median and p99 latency.
+
+Usage:
+    python benchmarks/search_index.py --rows 50000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from urllib.parse import quote
+
+from asgi_client import request
+from harness import employee, seed
+from sqlalchemy import or_, select
+
+from database import database, employee_table
+from main import app
+from migrations import upgrade
+from search import _Postings, search_index
+from snapshots import fetch_snapshot
+
+SURNAMES = "陳林黃張李王吳劉蔡楊許鄭謝洪郭邱曾廖賴徐周葉蘇莊呂江何蕭羅高"
+GIVEN = "家怡宇婷志明雅惠俊傑淑芬建宏美玲冠廷佳穎柏翰欣妤承恩子涵品妍彥廷詩涵"
+
+
+def roster(rows: int, rng: random.Random) -> list[dict]:
+    mobiles = rng.sample(range(10**8), rows)
+    return [
+        employee(
+            i,
+            name=rng.choice(SURNAMES)
+            + "".join(rng.choices(GIVEN, k=rng.choice([1, 2]))),
+            mobile=f"09{mobile:08d}",
+        )
+        for i, mobile in enumerate(mobiles)
+    ]
+
+
+def like_query(q: str):
+    pattern = f"%{q}%"
+    return (
+        select(employee_table)
+        .where(
+            employee_table.c.is_deleted == False,
+            or_(
+                employee_table.c.name.like(pattern),
+                employee_table.c.mobile.like(pattern),
+            ),
+        )
+        .limit(10)
+    )
+
+
+def percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"{1000 * statistics.median(samples):8.2f} {1000 * p99:8.2f}"
+
+
+async def run(rows: int, queries: int):
+    upgrade()
+    await database.connect()
+    try:
+        rng = random.Random(7)
+        employees = roster(rows, rng)
+        await seed(employees)
+
+        start = time.perf_counter()
+        await search_index.build()
+        build = time.perf_counter() - start
+
+        _, snapshot = await fetch_snapshot()
+        tracemalloc.start()
+        postings = _Postings(snapshot)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{rows} employees: fetched and indexed in {1000 * build:.0f} ms, "
+            f"{memory / 2**20:.1f} MiB, {len(postings.grams)} n-grams"
+        )
+        del postings
+
+        samples = {
+            "last 4 digits": [
+                employee["mobile"][-4:] for employee in rng.sample(employees, queries)
+            ],
+            "middle 5 digits": [
+                employee["mobile"][3:8] for employee in rng.sample(employees, queries)
+            ],
+            "surname": [
+                employee["name"][0] for employee in rng.sample(employees, queries)
+            ],
+            "full name": [
+                employee["name"] for employee in rng.sample(employees, queries)
+            ],
+        }
+
+        print(
+            f"{'query':<16} {'index p50':>9} {'p99 ms':>8} {'LIKE p50':>9} {'p99 ms':>8}"
+        )
+        for kind, terms in samples.items():
+            indexed, scanned = [], []
+            for term in terms:
+                start = time.perf_counter()
+                response = await request(
+                    app, "GET", f"/api/v1/employee/search?q={quote(term)}"
+                )
+                indexed.append(time.perf_counter() - start)
+                # Every term is taken from the roster, so something must match.
+                assert response["status"] == 200 and json.loads(
+                    bytes(response["body"])
+                ), term
+
+                start = time.perf_counter()
+                await database.fetch_all(like_query(term))
+                scanned.append(time.perf_counter() - start)
+            print(f"{kind:<16} {percentiles(indexed):>18} {percentiles(scanned):>18}")
+    finally:
+        await database.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Cold start: import time and time to first request of main.app.
+
+Each run starts a fresh interpreter that imports main, runs the app's
+start-up (migrations when MIGRATE_ON_STARTUP is set, database connect) and
+serves GET /health-check and GET /api/v1/employee/total/participants
+in-process. Reports the median over `--runs` of the interpreter's own
+start, `import main`, start-up and first responses, and lists the heavy
+optional modules (pandas, openpyxl, qrcode, PIL) that were loaded before
+the first request; there should be none.
+
+With `--importtime` it also prints the slowest imports under `import main`
+from `python -X importtime`.
+
+Usage:
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --importtime
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+HEAVY_MODULES = ["pandas", "openpyxl", "qrcode", "PIL"]
+
+# Runs in the child interpreter; prints one JSON line of timings.
+CHILD = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+sys.path[:0] = [{root!r}, {benchmarks!r}]
+import main
+imported = time.perf_counter()
+
+from asgi_client import request
+
+async def first_requests():
+    async with main.app.router.lifespan_context(main.app):
+        started = time.perf_counter()
+        health = await request(main.app, "GET", "/health-check")
+        healthy = time.perf_counter()
+        totals = await request(main.app, "GET", "/api/v1/employee/total/participants")
+        done = time.perf_counter()
+    assert health["status"] == 200 and totals["status"] == 200, (health["status"], totals["status"])
+    return started, healthy, done
+
+started, healthy, done = asyncio.run(first_requests())
+print(json.dumps({{
+    "import_main": imported - start,
+    "startup": started - imported,
+    "first_request": healthy - started,
+    "first_db_request": done - healthy,
+    "to_first_request": healthy - start,
+    "heavy_modules": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def child_env(database_url: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("ENV_STATE", "test")
+    env.setdefault("SECRET_KEY", "benchmark")
+    env.setdefault("TEST_DATABASE_URL", database_url)
+    # The throwaway database starts empty.
+    env.setdefault("TEST_MIGRATE_ON_STARTUP", "true")
+    env["LOG_LEVEL"] = "WARNING"
+    return env
+
+
+def run_once(env: dict) -> dict:
+    code = CHILD.format(
+        root=ROOT, benchmarks=os.path.join(ROOT, "benchmarks"), heavy=HEAVY_MODULES
+    )
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = time.perf_counter() - start
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_wall"] = wall
+    return timings
+
+
+def slowest_imports(env: dict, top: int) -> list[tuple[int, str]]:
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import sys; sys.path.insert(0, {ROOT!r}); import main",
+        ],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # main and the modules it imports directly; deeper entries are
+        # already counted in their parent's cumulative time.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--importtime", action="store_true", help="also list the slowest imports"
+    )
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = child_env(f"sqlite:///{tempfile.mkdtemp()}/startup.db")
+    runs = [run_once(env) for _ in range(args.runs)]
+
+    print(f"median of {args.runs} cold starts:")
+    for key in [
+        "import_main",
+        "startup",
+        "first_request",
+        "first_db_request",
+        "to_first_request",
+        "process_wall",
+    ]:
+        print(
+            f"  {key:<18} {1000 * statistics.median(run[key] for run in runs):8.1f} ms"
+        )
+    heavy = sorted({name for run in runs for name in run["heavy_modules"]})
+    print(
+        f"  heavy modules loaded before the first request: {', '.join(heavy) or 'none'}"
+    )
+
+    if args.importtime:
+        print("slowest imports under `import main` (cumulative):")
+        for cumulative, name in slowest_imports(env, args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    sys.exit(1 if heavy else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import sqlite3
+from datetime import UTC, datetime
+
+import pytz
+from sqlalchemy import select
+
+from database import database, employee_table, sqlite_writes
+from totals import add_check_in, add_check_in_cte
+
+# SQLite learned UPDATE ... RETURNING in 3.35.
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+TAIPEI = pytz.timezone("Asia/Taipei")
+
+
+def to_taipei_time(value: datetime | None) -> datetime | None:
+    """Normalize a stored check-in time; SQLite hands back naive Taipei time."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return TAIPEI.localize(value)
+    return value.astimezone(TAIPEI)
+
+
+def _check_in_update(mobile: str, checked_in_time: datetime):
+    # Only flips employees that are not checked in yet, so concurrent scans of
+    # the same QR code cannot both win.
+    return (
+        employee_table.update()
+        .where(employee_table.c.mobile == mobile, employee_table.c.is_checked == False)
+        .values(
+            is_checked=True,
+            checked_in_time=checked_in_time,
+            updated_at=checked_in_time.astimezone(UTC),
+        )
+    )
+
+
+async def _check_in_postgres(mobile: str, checked_in_time: datetime):
+    checked = (
+        _check_in_update(mobile, checked_in_time)
+        .returning(*employee_table.c)
+        .cte("checked")
+    )
+    query = select(checked).add_cte(add_check_in_cte(checked))
+    return await database.fetch_one(query)
+
+
+async def _check_in_sqlite(mobile: str, checked_in_time: datetime):
+    update_query = _check_in_update(mobile, checked_in_time)
+
+    async with sqlite_writes(), database.transaction():
+        if SQLITE_HAS_RETURNING:
+            employee = await database.fetch_one(
+                update_query.returning(*employee_table.c)
+            )
+        else:
+            await database.execute(update_query)
+            # The new checked_in_time identifies the row this update flipped.
+            employee = await database.fetch_one(
+                employee_table.select().where(
+                    employee_table.c.mobile == mobile,
+                    employee_table.c.checked_in_time == checked_in_time,
+                )
+            )
+
+        if employee is not None:
+            await add_check_in(employee)
+
+    return employee
+
+
+async def check_in(
+    mobile: str, checked_in_time: datetime
+) -> tuple[object | None, bool]:
+    """
+    Check an employee in at most once.
+
+    Returns `(employee, newly_checked_in)`. On Postgres a first check-in,
+    including the running totals update, is a single statement; a repeat scan
+    costs one more read to return the original check-in. `employee` is None
+    when no employee has this mobile.
+    """
+    if database.url.dialect.startswith("postgres"):
+        employee = await _check_in_postgres(mobile, checked_in_time)
+    else:
+        employee = await _check_in_sqlite(mobile, checked_in_time)
+
+    if employee is not None:
+        return employee, True
+
+    query = employee_table.select().where(employee_table.c.mobile == mobile)
+    return await database.fetch_one(query), False
@@ -0,0 +1,314 @@
+"""
+Write-behind check-in buffer for the gate-opening surge.
+
+When enabled (`CHECK_IN_BUFFER`), a check-in is appended to a local journal
+and acknowledged straight away; a background task applies the accepted
+check-ins to the database in batches, one multi-row UPDATE per
+`CHECK_IN_FLUSH_BATCH_SIZE` employees instead of a transaction per scan.
+
+The journal is a directory of JSON-lines segments. Each worker process
+writes its own segment and holds an exclusive `flock` on it. A flush seals
+the current segment, starts a new one and deletes the sealed segments once
+their check-ins are committed. On start-up every segment no live process
+holds a lock on, i.e. one left behind by a crash, is replayed before the
+worker serves requests. Replaying is safe to repeat: the UPDATE only flips
+employees that are not checked in yet and the running totals only count
+the rows it flipped.
+
+Appends are flushed to the OS, so a crashed worker loses nothing. Set
+`CHECK_IN_JOURNAL_FSYNC` to also survive a host crash, at the cost of an
+fsync per check-in.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from datetime import UTC, datetime
+from typing import IO
+
+from sqlalchemy import case, cast, literal
+
+from checkin import SQLITE_HAS_RETURNING
+from config import config
+from database import database, employee_table
+from live import hub
+from rosters import roster_cache
+from security import invalidate_identity
+from totals import TOTAL_COLUMNS, add_check_in, read_totals
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".journal"
+
+
+def _open_segment(path: str, mode: str) -> IO[str] | None:
+    """Open and lock a journal segment; None when another process holds it."""
+    segment = open(path, mode, encoding="utf-8")  # noqa: SIM115 - the caller owns the open segment
+    try:
+        fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        segment.close()
+        return None
+    return segment
+
+
+def _read_segment(segment: IO[str]) -> dict[str, datetime]:
+    entries = {}
+    for line in segment:
+        try:
+            entry = json.loads(line)
+            mobile, checked_in_time = (
+                entry["mobile"],
+                datetime.fromisoformat(entry["time"]),
+            )
+        except (ValueError, KeyError, TypeError):
+            # A crash mid-append leaves at most one torn line at the end.
+            logger.warning("Skipping unreadable journal line in %s", segment.name)
+            continue
+        entries.setdefault(mobile, checked_in_time)
+    return entries
+
+
+class CheckInBuffer:
+    def __init__(
+        self,
+        directory: str,
+        batch_size: int = 500,
+        flush_interval: float = 0.25,
+        fsync: bool = False,
+    ):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.running = False
+        # Accepted but not yet committed, mobile -> check-in time. Answers
+        # repeat scans until the committed row replaces the cached identity.
+        self._accepted: dict[str, datetime] = {}
+        self._pending: dict[str, datetime] = {}
+        self._segment: IO[str] | None = None
+        self._sealed: list[IO[str]] = []
+        self._sequence = 0
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.replayed = 0
+
+    def _new_segment(self) -> IO[str]:
+        self._sequence += 1
+        name = f"{os.getpid()}-{datetime.now(UTC):%Y%m%d%H%M%S%f}-{self._sequence}{SEGMENT_SUFFIX}"
+        return _open_segment(os.path.join(self.directory, name), "a")
+
+    def _recover(self):
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            segment = _open_segment(os.path.join(self.directory, name), "r")
+            if segment is None:
+                continue  # another live worker's segment
+            entries = _read_segment(segment)
+            logger.info("Replaying %d check-ins from %s", len(entries), name)
+            for mobile, checked_in_time in entries.items():
+                self._pending.setdefault(mobile, checked_in_time)
+                self._accepted.setdefault(mobile, checked_in_time)
+            self.replayed += len(entries)
+            self._sealed.append(segment)
+
+    async def start(self):
+        """Replay left-over journals, then start accepting and flushing."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._recover()
+        await self.flush()
+        self._segment = self._new_segment()
+        self._task = asyncio.create_task(self._run())
+        self.running = True
+
+    async def stop(self):
+        """Stop accepting check-ins and flush everything still pending."""
+        self.running = False
+        if self._task is not None:
+            # Under the lock so the flusher is never cancelled mid-batch.
+            async with self._lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._segment is not None:
+            # Nothing is pending, so the current segment holds no check-ins.
+            self._segment.close()
+            os.unlink(self._segment.name)
+            self._segment = None
+
+    def check_in(self, employee, checked_in_time: datetime) -> tuple[dict, bool]:
+        """
+        Accept a check-in for `employee` (the authenticated employee row)
+        without touching the database.
+
+        Returns `(employee, newly_checked_in)` like `checkin.check_in`, with
+        the employee as it will read once the check-in is committed.
+        """
+        employee = (
+            dict(employee._mapping) if hasattr(employee, "_mapping") else dict(employee)
+        )
+        mobile = employee["mobile"]
+
+        if employee["is_checked"]:
+            return employee, False
+
+        accepted = self._accepted.get(mobile)
+        if accepted is not None:
+            return {**employee, "is_checked": True, "checked_in_time": accepted}, False
+
+        line = (
+            json.dumps({"mobile": mobile, "time": checked_in_time.isoformat()}) + "\n"
+        )
+        self._segment.write(line)
+        self._segment.flush()
+        if self.fsync:
+            os.fsync(self._segment.fileno())
+
+        self._accepted[mobile] = checked_in_time
+        self._pending[mobile] = checked_in_time
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+        return {
+            **employee,
+            "is_checked": True,
+            "checked_in_time": checked_in_time,
+        }, True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Check-in flush failed")
+
+    def _seal(self):
+        if self._segment is not None:
+            self._sealed.append(self._segment)
+        self._segment = self._new_segment() if self.running else None
+
+    async def _apply(self, batch: dict[str, datetime]) -> list:
+        times = batch
+        if database.url.dialect.startswith("postgres"):
+            # Postgres takes untyped CASE branches for text. Not on SQLite,
+            # where CAST(... AS DATETIME) turns the times into numbers.
+            column_type = employee_table.c.checked_in_time.type
+            times = {
+                mobile: cast(literal(time), column_type)
+                for mobile, time in batch.items()
+            }
+        times = case(times, value=employee_table.c.mobile)
+        update_query = (
+            employee_table.update()
+            .where(
+                employee_table.c.mobile.in_(batch), employee_table.c.is_checked == False
+            )
+            .values(
+                is_checked=True, checked_in_time=times, updated_at=datetime.now(UTC)
+            )
+        )
+
+        async with database.transaction():
+            if database.url.dialect.startswith("postgres") or SQLITE_HAS_RETURNING:
+                employees = await database.fetch_all(
+                    update_query.returning(*employee_table.c)
+                )
+            else:
+                employees = await database.fetch_all(
+                    employee_table.select().where(
+                        employee_table.c.mobile.in_(batch),
+                        employee_table.c.is_checked == False,
+                    )
+                )
+                await database.execute(update_query)
+
+            if employees:
+                await add_check_in(
+                    {
+                        column.name: sum(
+                            employee[column.name] or 0 for employee in employees
+                        )
+                        for column in TOTAL_COLUMNS.values()
+                    }
+                )
+        return employees
+
+    async def flush(self):
+        """Apply every pending check-in, `batch_size` employees per statement."""
+        async with self._lock:
+            if not self._pending:
+                return
+
+            pending, self._pending = self._pending, {}
+            self._seal()
+            mobiles = list(pending)
+            groups = set()
+
+            try:
+                for start in range(0, len(mobiles), self.batch_size):
+                    batch = {
+                        mobile: pending[mobile]
+                        for mobile in mobiles[start : start + self.batch_size]
+                    }
+                    try:
+                        employees = await self._apply(batch)
+                    except BaseException:
+                        self.failures += 1
+                        # Retried on the next flush; the sealed segments stay
+                        # on disk until then.
+                        for mobile in mobiles[start:]:
+                            self._pending.setdefault(mobile, pending[mobile])
+                        raise
+
+                    self.batches += 1
+                    self.flushed += len(employees)
+                    groups.update(employee["group"] for employee in employees)
+                    for mobile in batch:
+                        self._accepted.pop(mobile, None)
+                        invalidate_identity(mobile)
+            finally:
+                for group in groups:
+                    roster_cache.invalidate(group)
+
+            for segment in self._sealed:
+                segment.close()
+                os.unlink(segment.name)
+            self._sealed.clear()
+
+        logger.info("Flushed %d buffered check-ins", len(mobiles))
+        if groups:
+            hub.publish("totals", await read_totals())
+
+    def stats(self) -> dict:
+        return {
+            "accepted": len(self._accepted),
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "replayed": self.replayed,
+        }
+
+
+check_in_buffer = CheckInBuffer(
+    config.CHECK_IN_JOURNAL_DIR,
+    batch_size=config.CHECK_IN_FLUSH_BATCH_SIZE,
+    flush_interval=config.CHECK_IN_FLUSH_INTERVAL_SECONDS,
+    fsync=config.CHECK_IN_JOURNAL_FSYNC,
+)
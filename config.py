@@ -1,17 +1,92 @@
 from functools import lru_cache
-from typing import Optional
 
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class BaseConfig(BaseSettings):
-    ENV_STATE: Optional[str] = None
+    ENV_STATE: str | None = None
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
 class GlobalConfig(BaseConfig):
-    DATABASE_URL: Optional[str] = None
+    DATABASE_URL: str | None = None
     DB_FORCE_ROLLBACK: bool = False
+    # Optional read replica for read-heavy endpoints; writes and anything
+    # that must see them stay on DATABASE_URL.
+    DATABASE_REPLICA_URL: str | None = None
+    # After a write, the same client reads from the primary for this long.
+    DB_REPLICA_STICKY_SECONDS: float = 5.0
+    # Run `python migrations.py` once per deploy, before the workers start.
+    # Set this to apply pending migrations when each worker starts instead;
+    # workers then take turns on a migration lock.
+    MIGRATE_ON_STARTUP: bool = False
+    DB_POOL_MIN_SIZE: int = 5
+    DB_POOL_MAX_SIZE: int = 30
+    DB_POOL_ACQUIRE_TIMEOUT_SECONDS: float = 10.0
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # How long an SQLite write waits for another connection's lock.
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 30.0
+    # None detects pgbouncer from the database URL (host name or port 6432).
+    DB_PGBOUNCER_TRANSACTION_MODE: bool | None = None
+    # Connections all workers together may hold, e.g. pgbouncer's
+    # MAX_CLIENT_CONN; /ready reports whether the pools fit in it.
+    DB_CONNECTION_BUDGET: int | None = None
+    # Read unprefixed, like uvicorn and gunicorn do.
+    WEB_CONCURRENCY: int = Field(1, validation_alias="WEB_CONCURRENCY")
+    LIVE_QUEUE_SIZE: int = 16
+    LIVE_HEARTBEAT_SECONDS: float = 15.0
+    IDENTITY_CACHE_TTL_SECONDS: float = 30.0
+    IDENTITY_CACHE_MAX_SIZE: int = 10000
+    PUBLIC_BASE_URL: str = "http://127.0.0.1:8000"
+    QR_CACHE_DIR: str = "qrcodes"
+    QR_RENDER_WORKERS: int = 0
+    ROSTER_CACHE_TTL_SECONDS: float = 5.0
+    ROSTER_CACHE_MAX_SIZE: int = 1000
+    NOTIFICATION_CACHE_TTL_SECONDS: float = 10.0
+    ANALYTICS_CACHE_TTL_SECONDS: float = 3.0
+    # Delta versions lag the clock by this much to cover writes still in flight.
+    SNAPSHOT_SAFETY_MARGIN_SECONDS: float = 5.0
+    # Build the help desk search index at start-up instead of on the first search.
+    SEARCH_INDEX_ON_STARTUP: bool = True
+    # How far the search index may lag writes made by other workers.
+    SEARCH_REFRESH_SECONDS: float = 5.0
+    # Repeat scans of a QR code within this many seconds are answered from
+    # memory; 0 sends every scan to the database.
+    CHECK_IN_DEDUP_WINDOW_SECONDS: float = 10.0
+    CHECK_IN_DEDUP_MAX_SIZE: int = 10000
+    # Acknowledge check-ins from a local journal and write them in batches.
+    CHECK_IN_BUFFER: bool = False
+    CHECK_IN_JOURNAL_DIR: str = "checkin-journal"
+    CHECK_IN_JOURNAL_FSYNC: bool = False
+    CHECK_IN_FLUSH_INTERVAL_SECONDS: float = 0.25
+    CHECK_IN_FLUSH_BATCH_SIZE: int = 500
+    # Roster uploads accepted as background jobs are spooled here.
+    IMPORT_JOB_DIR: str = "import-jobs"
+    # Jobs processed at once per worker; the rest wait their turn.
+    IMPORT_JOB_WORKERS: int = 1
+    IMPORT_JOB_MAX_PENDING: int = 10
+    # Rows committed per transaction; smaller chunks hold write locks and the
+    # event loop for less time, at the cost of slower imports.
+    IMPORT_JOB_CHUNK_SIZE: int = 200
+    # Requests sent with "X-Profile: <token>" are profiled, and the token
+    # unlocks GET /debug/profiles. Profiling is off while both are unset.
+    PROFILE_ADMIN_TOKEN: str | None = None
+    # Fraction of all requests profiled without asking.
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_SECONDS: float = 0.001
+    PROFILE_STORE_SIZE: int = 50
+    LOG_LEVEL: str = "INFO"
+    # Fraction of INFO lines kept per high-volume route handler.
+    LOG_SAMPLE_RATES: dict[str, float] = {
+        "get_total_of_participants": 0.01,
+        "get_team_members": 0.1,
+        "get_latest_notification": 0.01,
+        "live_feed": 0.1,
+        "get_roster_delta": 0.1,
+        "analytics": 0.1,
+        "search_employees": 0.1,
+    }
 
 
 class DevConfig(GlobalConfig):
@@ -29,7 +104,7 @@ class ProdConfig(GlobalConfig):
     model_config = SettingsConfigDict(env_prefix="PROD_", extra="ignore")
 
 
-@lru_cache()
+@lru_cache
 def get_config(env_state: str):
     configs = {"dev": DevConfig, "test": TestConfig, "prod": ProdConfig}
     return configs[env_state]()
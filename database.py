@@ -1,7 +1,17 @@
+import asyncio
+import sqlite3
+import time
+import weakref
+from contextlib import nullcontext
+from functools import lru_cache
+
 import databases
 import sqlalchemy
 
 from config import config
+from metrics import Gauge, db_query_duration, db_query_errors, registry
+from pool import DatabaseBusyError, PoolManager
+from profiling import record_query
 
 metadata = sqlalchemy.MetaData()
 
@@ -10,7 +20,9 @@ employee_table = sqlalchemy.Table(
     metadata,
     sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
     sqlalchemy.Column("name", sqlalchemy.String, nullable=False),
-    sqlalchemy.Column("mobile", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column(
+        "mobile", sqlalchemy.String, nullable=False, unique=True, index=True
+    ),
     sqlalchemy.Column("department", sqlalchemy.String, nullable=False),
     sqlalchemy.Column("company", sqlalchemy.String, nullable=False),
     sqlalchemy.Column("family_employee", sqlalchemy.Integer, default=1),
@@ -18,11 +30,16 @@ employee_table = sqlalchemy.Table(
     sqlalchemy.Column("family_child", sqlalchemy.Integer, nullable=True),
     sqlalchemy.Column("family_adult", sqlalchemy.Integer, nullable=True),
     sqlalchemy.Column("family_elderly", sqlalchemy.Integer, nullable=True),
-    sqlalchemy.Column("group", sqlalchemy.String, nullable=True),
-    sqlalchemy.Column("is_checked", sqlalchemy.Boolean, default=False),
-    # sqlalchemy.Column("checked_in_time", sqlalchemy.DateTime, nullable=True),
-    sqlalchemy.Column("checked_in_time", sqlalchemy.String, nullable=True),
+    sqlalchemy.Column("group", sqlalchemy.String, nullable=True, index=True),
+    sqlalchemy.Column("is_checked", sqlalchemy.Boolean, default=False, index=True),
+    sqlalchemy.Column(
+        "checked_in_time", sqlalchemy.DateTime(timezone=True), nullable=True, index=True
+    ),
     sqlalchemy.Column("is_deleted", sqlalchemy.Boolean, default=False),
+    # Set on every write so gate devices can sync only the rows that changed.
+    sqlalchemy.Column(
+        "updated_at", sqlalchemy.DateTime(timezone=True), nullable=True, index=True
+    ),
 )
 
 notifications_table = sqlalchemy.Table(
@@ -34,12 +51,225 @@ notifications_table = sqlalchemy.Table(
     sqlalchemy.Column("created_at", sqlalchemy.String, nullable=False),
 )
 
-connect_args = {"check_same_thread": False} if "sqlite" in config.DATABASE_URL else {}
-engine = sqlalchemy.create_engine(config.DATABASE_URL, connect_args=connect_args)
+# Single-row running totals of checked-in participants, maintained by the
+# check-in path so /total/participants does not have to scan employee.
+participant_totals_table = sqlalchemy.Table(
+    "participant_totals",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("total_employee", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column("total_infant", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column("total_child", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column("total_adult", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column("total_elderly", sqlalchemy.Integer, nullable=False, default=0),
+)
+
+# Roster uploads processed in the background (jobs.py); progress is written
+# with each committed chunk so any worker can report it.
+import_job_table = sqlalchemy.Table(
+    "import_job",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.String, primary_key=True),
+    sqlalchemy.Column("filename", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("status", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("total_rows", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column("inserted", sqlalchemy.Integer, nullable=False, default=0),
+    sqlalchemy.Column("rejected", sqlalchemy.Integer, nullable=False, default=0),
+    # JSON list of row errors, written when the job finishes.
+    sqlalchemy.Column("errors", sqlalchemy.Text, nullable=True),
+    sqlalchemy.Column("error", sqlalchemy.String, nullable=True),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+    sqlalchemy.Column("started_at", sqlalchemy.DateTime(timezone=True), nullable=True),
+    sqlalchemy.Column("finished_at", sqlalchemy.DateTime(timezone=True), nullable=True),
+    sqlalchemy.Column("updated_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+)
+
+
+@lru_cache
+def get_engine() -> sqlalchemy.Engine:
+    """
+    Synchronous engine for migrations and maintenance scripts.
+
+    Created on first use, so importing this module neither loads the sync
+    driver nor touches the database. The schema is created or upgraded by
+    `python migrations.py`, or at start-up when `MIGRATE_ON_STARTUP` is set.
+    """
+    connect_args = (
+        {"check_same_thread": False} if "sqlite" in config.DATABASE_URL else {}
+    )
+    return sqlalchemy.create_engine(config.DATABASE_URL, connect_args=connect_args)
+
+
+def query_shape(query) -> str:
+    """Low-cardinality label for a query, e.g. "select employee" or "update employee"."""
+    if isinstance(query, str):
+        return "text"
+
+    kind = getattr(query, "__visit_name__", type(query).__name__)
+    table = getattr(query, "table", None)
+    if table is not None:
+        names = [table.name]
+    elif hasattr(query, "get_final_froms"):
+        names = [getattr(source, "name", "?") for source in query.get_final_froms()]
+    else:
+        names = []
+    return f"{kind} {','.join(names)}"
+
+
+class TimedConnection(databases.core.Connection):
+    """Connection whose pool checkout is bounded and timed by the PoolManager."""
+
+    def __init__(
+        self, database: databases.Database, backend, pool_manager: PoolManager
+    ):
+        super().__init__(database, backend)
+        self._pool_manager = pool_manager
+
+    async def __aenter__(self):
+        # Connections are per task, so only the outermost use checks one out.
+        if self._connection_counter or not self._pool_manager.enabled:
+            return await super().__aenter__()
+        return await self._pool_manager.acquire(super().__aenter__())
+
+
+class InstrumentedDatabase(databases.Database):
+    """`databases.Database` that times every call by operation and query shape."""
+
+    def __init__(self, url: str, pool_manager: PoolManager, **options):
+        super().__init__(url, **options)
+        self.pool_manager = pool_manager
+
+    def connection(self) -> databases.core.Connection:
+        if self._global_connection is not None:
+            return self._global_connection
+
+        if not self._connection:
+            self._connection = TimedConnection(self, self._backend, self.pool_manager)
+        return self._connection
+
+    async def connect(self):
+        await super().connect()
+        self.pool_manager.attach(getattr(self._backend, "_pool", None))
+
+    async def disconnect(self):
+        self.pool_manager.detach()
+        await super().disconnect()
+
+    async def _timed(self, operation: str, query, call):
+        start = time.perf_counter()
+        try:
+            return await call
+        except Exception as e:
+            db_query_errors.inc(operation, query_shape(query))
+            if isinstance(e, sqlite3.OperationalError) and "database is locked" in str(
+                e
+            ):
+                raise DatabaseBusyError(
+                    "SQLite write lock not free within the busy timeout"
+                ) from e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            db_query_duration.observe(elapsed, operation, query_shape(query))
+            record_query(operation, query_shape(query), elapsed)
+
+    async def fetch_all(self, query, values=None):
+        return await self._timed("fetch_all", query, super().fetch_all(query, values))
+
+    async def fetch_one(self, query, values=None):
+        return await self._timed("fetch_one", query, super().fetch_one(query, values))
+
+    async def execute(self, query, values=None):
+        return await self._timed("execute", query, super().execute(query, values))
+
+    async def execute_many(self, query, values):
+        return await self._timed(
+            "execute_many", query, super().execute_many(query, values)
+        )
+
+    async def iterate(self, query, values=None):
+        start = time.perf_counter()
+        try:
+            async for record in super().iterate(query, values):
+                yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            db_query_duration.observe(elapsed, "iterate", query_shape(query))
+            record_query("iterate", query_shape(query), elapsed)
+
+
+_sqlite_writes: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def sqlite_writes():
+    """
+    SQLite has one writer at a time. Check-ins and import chunks queue for it
+    on this lock, in arrival order, instead of in sqlite3's busy handler,
+    which polls for the lock and gives up after the busy timeout when a burst
+    of writes is waiting. One lock per event loop, as a lock cannot be shared
+    between loops; a no-op on other databases.
+    """
+    if not database.url.dialect.startswith("sqlite"):
+        return nullcontext()
+    loop = asyncio.get_running_loop()
+    lock = _sqlite_writes.get(loop)
+    if lock is None:
+        lock = _sqlite_writes[loop] = asyncio.Lock()
+    return lock
+
 
-metadata.create_all(engine)
+def sqlite_options(url: str) -> dict:
+    """sqlite3.connect arguments; its `timeout` is the busy timeout."""
+    return (
+        {"timeout": config.SQLITE_BUSY_TIMEOUT_SECONDS}
+        if url.startswith("sqlite")
+        else {}
+    )
+
+
+pool_manager = PoolManager(config.DATABASE_URL)
+database = InstrumentedDatabase(
+    config.DATABASE_URL,
+    pool_manager,
+    force_rollback=config.DB_FORCE_ROLLBACK,
+    **pool_manager.options(),
+    **sqlite_options(config.DATABASE_URL),
+)
+
+# Read-only queries that tolerate replication lag go to the replica, see
+# replicas.py. Without DATABASE_REPLICA_URL it is the primary itself.
+replica_pool_manager = PoolManager(config.DATABASE_REPLICA_URL or config.DATABASE_URL)
+replica = (
+    InstrumentedDatabase(
+        config.DATABASE_REPLICA_URL,
+        replica_pool_manager,
+        **replica_pool_manager.options(),
+    )
+    if config.DATABASE_REPLICA_URL
+    else database
+)
+
+
+registry.register(
+    Gauge(
+        "db_pool_connections",
+        "Database pool connections by state; max is the configured pool limit.",
+        labels=("state",),
+        read=lambda: [
+            ((state,), value) for state, value in pool_manager.stats().items()
+        ],
+    )
+)
 
-db_args = {"min_size": 5, "max_size": 30} if "postgres" in config.DATABASE_URL else {}
-database = databases.Database(
-    config.DATABASE_URL, force_rollback=config.DB_FORCE_ROLLBACK, **db_args
+registry.register(
+    Gauge(
+        "db_replica_pool_connections",
+        "Read replica pool connections by state; empty without DATABASE_REPLICA_URL.",
+        labels=("state",),
+        read=lambda: [
+            ((state,), value) for state, value in replica_pool_manager.stats().items()
+        ],
+    )
 )
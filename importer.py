@@ -0,0 +1,559 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Iterator
+from datetime import UTC, datetime
+from typing import IO, TYPE_CHECKING
+
+from sqlalchemy import case, cast, insert, select
+from starlette.concurrency import run_in_threadpool
+
+from database import database, employee_table
+from totals import add_check_in
+
+# pandas and openpyxl take about half a second to import, so they are loaded
+# by the first roster upload instead of on every cold start.
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 1000
+REIMPORT_CHUNK_SIZE = 100_000
+
+REQUIRED_COLUMNS = {
+    "name",
+    "company",
+    "department",
+    "mobile",
+    "group",
+    "family_employee",
+    "family_infant",
+    "family_child",
+    "family_adult",
+    "family_elderly",
+}
+
+TEXT_COLUMNS = ["name", "mobile", "department", "company", "group"]
+REQUIRED_TEXT_COLUMNS = ["name", "mobile", "department", "company"]
+COUNT_COLUMNS = [
+    "family_employee",
+    "family_infant",
+    "family_child",
+    "family_adult",
+    "family_elderly",
+]
+# Compared by a re-import; mobile is the key rows are matched on.
+DIFF_COLUMNS = [column for column in TEXT_COLUMNS if column != "mobile"] + COUNT_COLUMNS
+
+
+class ImportFileError(Exception):
+    """Raised when the uploaded file cannot be read as a roster at all."""
+
+
+def _iter_csv_frames(file: IO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    import pandas as pd
+
+    reader = pd.read_csv(file, dtype=str, chunksize=chunk_size, keep_default_na=False)
+    for frame in reader:
+        # Line 1 is the header, so data row 0 is spreadsheet row 2.
+        frame.index = frame.index + 2
+        yield frame
+
+
+def _iter_excel_frames(file: IO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    # read_only mode streams rows from the sheet XML instead of building the
+    # whole workbook in memory.
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [
+            str(column).strip() if column is not None else "" for column in header
+        ]
+
+        chunk, row_numbers = [], []
+        for row_number, row in enumerate(rows, start=2):
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            row_numbers.append(row_number)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(
+                    chunk, columns=columns, index=row_numbers, dtype=object
+                )
+                chunk, row_numbers = [], []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns, index=row_numbers, dtype=object)
+    finally:
+        workbook.close()
+
+
+def iter_roster_frames(
+    file: IO, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the uploaded roster as DataFrames of at most `chunk_size` rows,
+    indexed by spreadsheet row number.
+    """
+    if filename.lower().endswith(".csv"):
+        frames = _iter_csv_frames(file, chunk_size)
+    else:
+        frames = _iter_excel_frames(file, chunk_size)
+
+    try:
+        first = next(frames, None)
+    except Exception as e:
+        raise ImportFileError(f"Failed to process the uploaded file: {e!s}") from e
+
+    if first is None:
+        return
+
+    missing = REQUIRED_COLUMNS - set(first.columns)
+    if missing:
+        raise ImportFileError(f"Missing required columns. Required: {REQUIRED_COLUMNS}")
+
+    yield first
+    yield from frames
+
+
+def _clean_text(values: pd.Series) -> pd.Series:
+    values = values.astype("string").str.strip()
+    return values.mask(values == "")
+
+
+def _clean_mobile(values: pd.Series) -> pd.Series:
+    # Excel hands numeric-looking mobiles back as numbers.
+    return _clean_text(values).str.replace(r"\.0$", "", regex=True)
+
+
+def convert_frame(
+    frame: pd.DataFrame, seen_mobiles: set
+) -> tuple[list[dict], list[dict]]:
+    """
+    Convert one chunk of raw roster rows into insertable records.
+
+    Error reports use the frame index, i.e. the row number the organizer sees
+    in Excel. `seen_mobiles` carries the mobiles accepted from earlier chunks
+    and is updated in place. Returns `(records, errors)`; each record carries
+    its spreadsheet `row` number.
+    """
+    converted, errors = _validate_frame(frame, seen_mobiles)
+    converted = converted.astype(object).where(converted.notna(), None)
+    converted["is_checked"] = False
+    converted["is_deleted"] = False
+    return converted.reset_index(names="row").to_dict("records"), errors
+
+
+def _validate_frame(
+    frame: pd.DataFrame, seen_mobiles: set
+) -> tuple[pd.DataFrame, list[dict]]:
+    """The valid rows of `frame` with cleaned, typed columns, and the errors of the rest."""
+    import pandas as pd
+
+    problems = pd.Series(
+        [[] for _ in range(len(frame))], index=frame.index, dtype=object
+    )
+
+    def flag(mask: pd.Series, message: str):
+        for index in mask[mask].index:
+            problems[index].append(message)
+
+    text = {column: _clean_text(frame[column]) for column in TEXT_COLUMNS}
+    text["mobile"] = _clean_mobile(frame["mobile"])
+
+    for column in REQUIRED_TEXT_COLUMNS:
+        flag(text[column].isna(), f"{column} is required")
+
+    counts = {}
+    for column in COUNT_COLUMNS:
+        raw = frame[column].astype("string").str.strip()
+        raw = raw.mask(raw == "")
+        values = pd.to_numeric(raw, errors="coerce")
+        flag(raw.notna() & values.isna(), f"{column} must be a number")
+        flag(
+            values.notna() & ((values < 0) | (values % 1 != 0)),
+            f"{column} must be a non-negative integer",
+        )
+        counts[column] = values
+    counts["family_employee"] = counts["family_employee"].fillna(1)
+
+    mobile = text["mobile"]
+    duplicated = mobile.notna() & (
+        mobile.duplicated(keep="first") | mobile.isin(seen_mobiles)
+    )
+    flag(duplicated, "mobile is duplicated in the file")
+
+    valid = problems.map(len) == 0
+
+    converted = pd.DataFrame(
+        {
+            **{column: text[column][valid] for column in TEXT_COLUMNS},
+            **{
+                column: counts[column][valid].astype("Int64")
+                for column in COUNT_COLUMNS
+            },
+        }
+    )
+    seen_mobiles.update(converted["mobile"])
+
+    errors = [
+        {"row": int(index), "errors": problems[index]} for index in valid[~valid].index
+    ]
+    return converted, errors
+
+
+async def reject_existing_mobiles(
+    records: list[dict], errors: list[dict]
+) -> list[dict]:
+    # employee.mobile is unique, so rows already in the database would abort
+    # the whole transaction; report them like any other invalid row.
+    if not records:
+        return records
+
+    query = select(employee_table.c.mobile).where(
+        employee_table.c.mobile.in_([record["mobile"] for record in records])
+    )
+    existing = {row["mobile"] for row in await database.fetch_all(query)}
+    if not existing:
+        return records
+
+    for record in records:
+        if record["mobile"] in existing:
+            errors.append({"row": record["row"], "errors": ["mobile already exists"]})
+    return [record for record in records if record["mobile"] not in existing]
+
+
+async def parse_roster(
+    file: IO, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE
+) -> AsyncIterator[tuple[int, list[dict], list[dict]]]:
+    """
+    Yield `(rows, records, errors)` per chunk of the uploaded roster.
+
+    Parsing and conversion run in the thread pool so the event loop keeps
+    serving check-ins while a large file is read.
+    """
+    frames = iter_roster_frames(file, filename, chunk_size)
+    seen_mobiles = set()
+    while True:
+        frame = await run_in_threadpool(next, frames, None)
+        if frame is None:
+            return
+
+        records, errors = await run_in_threadpool(convert_frame, frame, seen_mobiles)
+        yield len(frame), records, errors
+
+
+async def insert_records(records: list[dict]) -> int:
+    """Insert one chunk of converted records, see `reject_existing_mobiles`."""
+    if not records:
+        return 0
+
+    updated_at = datetime.now(UTC)
+    for record in records:
+        del record["row"]
+        record["updated_at"] = updated_at
+    await database.execute(insert(employee_table).values(records))
+    return len(records)
+
+
+def import_report(total_rows: int, inserted: int, errors: list[dict]) -> dict:
+    return {
+        "total_rows": total_rows,
+        "inserted": inserted,
+        "rejected": len(errors),
+        "errors": sorted(errors, key=lambda error: error["row"]),
+    }
+
+
+async def import_roster(
+    file: IO, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE
+) -> dict:
+    """
+    Stream the uploaded roster into `employee_table`.
+
+    Every chunk is written inside one transaction so a database failure
+    leaves nothing half imported. Rows that fail validation are skipped and
+    reported instead of aborting the whole import.
+    """
+    total_rows = 0
+    inserted = 0
+    errors = []
+
+    async with database.transaction():
+        async for rows, records, chunk_errors in parse_roster(
+            file, filename, chunk_size
+        ):
+            total_rows += rows
+            errors.extend(chunk_errors)
+            records = await reject_existing_mobiles(records, errors)
+            inserted += await insert_records(records)
+
+    logger.info(
+        "Imported roster %s: %d rows, %d inserted, %d rejected",
+        filename,
+        total_rows,
+        inserted,
+        len(errors),
+    )
+
+    return import_report(total_rows, inserted, errors)
+
+
+def _read_roster(file: IO, filename: str) -> tuple[pd.DataFrame, list[dict], set, int]:
+    """
+    The whole uploaded roster as `(rows, errors, mobiles, total_rows)`: the
+    valid rows indexed by mobile with their spreadsheet `row`, and every
+    mobile the file mentions, rejected rows included.
+    """
+    import pandas as pd
+
+    frames, errors, mobiles = [], [], set()
+    seen_mobiles = set()
+    total_rows = 0
+    # The diff needs the whole file anyway, so read it as one frame.
+    for frame in iter_roster_frames(file, filename, REIMPORT_CHUNK_SIZE):
+        converted, frame_errors = _validate_frame(frame, seen_mobiles)
+        frames.append(converted)
+        errors.extend(frame_errors)
+        mobiles.update(_clean_mobile(frame["mobile"]).dropna())
+        total_rows += len(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=["row", *DIFF_COLUMNS]), errors, mobiles, total_rows
+    rows = pd.concat(frames).reset_index(names="row").set_index("mobile")
+    return _typed(rows), errors, mobiles, total_rows
+
+
+def _typed(frame: pd.DataFrame) -> pd.DataFrame:
+    # Nullable dtypes on both sides, so None, NaN and NA all compare as missing.
+    return frame.astype(
+        {
+            **{
+                column: "string"
+                for column in DIFF_COLUMNS
+                if column not in COUNT_COLUMNS
+            },
+            **{column: "Int64" for column in COUNT_COLUMNS},
+        }
+    )
+
+
+async def _read_employees() -> pd.DataFrame:
+    import pandas as pd
+
+    columns = ["id", "mobile", *DIFF_COLUMNS, "is_checked", "is_deleted"]
+    rows = await database.fetch_all(
+        select(*[employee_table.c[column] for column in columns])
+    )
+
+    def to_frame():
+        frame = pd.DataFrame.from_records(
+            [tuple(row._mapping.values()) for row in rows], columns=columns
+        )
+        frame[["is_checked", "is_deleted"]] = (
+            frame[["is_checked", "is_deleted"]].fillna(False).astype(bool)
+        )
+        return _typed(frame.set_index("mobile"))
+
+    return await run_in_threadpool(to_frame)
+
+
+def _python(value):
+    # Plain Python values for JSON and the database, not numpy/pandas scalars.
+    import pandas as pd
+
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def diff_roster(incoming: pd.DataFrame, current: pd.DataFrame, mentioned: set) -> dict:
+    """
+    Compare the uploaded roster with the employee table, both indexed by mobile.
+
+    Rows only in the file are inserted. Rows in both whose compared columns
+    differ, or that were soft-deleted, are updated. Employees the file does
+    not mention at all are soft-deleted; rows the file mentions but rejected
+    are left alone so a typo never removes anyone. `is_checked` is never
+    touched.
+    """
+    import pandas as pd
+
+    common = incoming.index.intersection(current.index)
+    new, old = incoming.loc[common, DIFF_COLUMNS], current.loc[common, DIFF_COLUMNS]
+    # NA on one side only counts as a change; NA on both does not.
+    differs = (new != old).fillna(True) & ~(new.isna() & old.isna())
+    restored = current.loc[common, "is_deleted"]
+    changed = differs.any(axis=1) | restored
+
+    updates = []
+    totals_delta = {column: 0 for column in COUNT_COLUMNS}
+    for mobile in changed[changed].index:
+        columns = [column for column in DIFF_COLUMNS if differs.at[mobile, column]]
+        updates.append(
+            {
+                "mobile": mobile,
+                "row": int(incoming.at[mobile, "row"]),
+                "restored": bool(restored.at[mobile]),
+                "changes": {
+                    column: [
+                        _python(old.at[mobile, column]),
+                        _python(new.at[mobile, column]),
+                    ]
+                    for column in columns
+                },
+            }
+        )
+        # Checked-in families are already in the running totals; keep them
+        # in step with the new headcounts.
+        if current.at[mobile, "is_checked"]:
+            for column in COUNT_COLUMNS:
+                if column in columns:
+                    before, after = updates[-1]["changes"][column]
+                    totals_delta[column] += (after or 0) - (before or 0)
+
+    inserted = incoming.index.difference(current.index)
+    inserts = incoming.loc[inserted].reset_index()
+    inserts = inserts.astype(object).where(inserts.notna(), None).to_dict("records")
+
+    active = current[~current["is_deleted"]]
+    deleted = active.index.difference(
+        pd.Index(list(mentioned), dtype=active.index.dtype)
+    )
+    deletes = list(deleted)
+
+    return {
+        "inserts": sorted(inserts, key=lambda record: record["row"]),
+        "updates": sorted(updates, key=lambda update: update["row"]),
+        "deletes": deletes,
+        "unchanged": len(common) - len(updates),
+        "totals_delta": totals_delta,
+    }
+
+
+def _case(values: dict, column: str):
+    # Typed, so a CASE of only NULLs still matches the column type on Postgres.
+    column = employee_table.c[column]
+    return cast(case(values, value=employee_table.c.mobile, else_=column), column.type)
+
+
+async def _apply_diff(diff: dict, chunk_size: int):
+    updated_at = datetime.now(UTC)
+
+    async with database.transaction():
+        for start in range(0, len(diff["inserts"]), chunk_size):
+            records = []
+            for record in diff["inserts"][start : start + chunk_size]:
+                record = {key: value for key, value in record.items() if key != "row"}
+                records.append(
+                    {
+                        **record,
+                        "is_checked": False,
+                        "is_deleted": False,
+                        "updated_at": updated_at,
+                    }
+                )
+            await database.execute(insert(employee_table).values(records))
+
+        for start in range(0, len(diff["updates"]), chunk_size):
+            batch = diff["updates"][start : start + chunk_size]
+            changed = {}
+            for update in batch:
+                for column, (_, value) in update["changes"].items():
+                    changed.setdefault(column, {})[update["mobile"]] = value
+            await database.execute(
+                employee_table.update()
+                .where(
+                    employee_table.c.mobile.in_([update["mobile"] for update in batch])
+                )
+                .values(
+                    **{
+                        column: _case(values, column)
+                        for column, values in changed.items()
+                    },
+                    is_deleted=False,
+                    updated_at=updated_at,
+                )
+            )
+
+        for start in range(0, len(diff["deletes"]), chunk_size):
+            await database.execute(
+                employee_table.update()
+                .where(
+                    employee_table.c.mobile.in_(
+                        diff["deletes"][start : start + chunk_size]
+                    )
+                )
+                .values(is_deleted=True, updated_at=updated_at)
+            )
+
+        if any(diff["totals_delta"].values()):
+            await add_check_in(diff["totals_delta"])
+
+
+async def reimport_roster(
+    file: IO, filename: str, dry_run: bool = True, chunk_size: int = IMPORT_CHUNK_SIZE
+) -> dict:
+    """
+    Bring `employee_table` in line with an updated roster, keyed by mobile.
+
+    The file and the current table are loaded into DataFrames and compared
+    column by column in one vectorized pass, so only the inserts, updates and
+    soft-deletes that are actually needed reach the database, in batched
+    statements inside one transaction. With `dry_run` nothing is written and
+    the report describes what applying the file would change; applying
+    recomputes the diff against the table as it is then.
+    """
+    # Parse the file in the thread pool while the current roster is read.
+    (incoming, errors, mentioned, total_rows), current = await asyncio.gather(
+        run_in_threadpool(_read_roster, file, filename), _read_employees()
+    )
+    if not mentioned:
+        # Would soft-delete everyone; almost certainly the wrong file.
+        raise ImportFileError("The uploaded roster has no employees")
+    diff = await run_in_threadpool(diff_roster, incoming, current, mentioned)
+
+    if not dry_run:
+        await _apply_diff(diff, chunk_size)
+
+    logger.info(
+        "%s roster %s: %d rows, %d inserted, %d updated, %d deleted, %d unchanged, %d rejected",
+        "Compared" if dry_run else "Re-imported",
+        filename,
+        total_rows,
+        len(diff["inserts"]),
+        len(diff["updates"]),
+        len(diff["deletes"]),
+        diff["unchanged"],
+        len(errors),
+    )
+
+    return {
+        "dry_run": dry_run,
+        "total_rows": total_rows,
+        "inserted": len(diff["inserts"]),
+        "updated": len(diff["updates"]),
+        "restored": sum(update["restored"] for update in diff["updates"]),
+        "deleted": len(diff["deletes"]),
+        "unchanged": diff["unchanged"],
+        "rejected": len(errors),
+        "errors": sorted(errors, key=lambda error: error["row"]),
+        "changes": {
+            "inserted": [
+                {"row": record["row"], "mobile": record["mobile"]}
+                for record in diff["inserts"]
+            ],
+            "updated": [
+                {key: update[key] for key in ("row", "mobile", "restored", "changes")}
+                for update in diff["updates"]
+            ],
+            "deleted": diff["deletes"],
+        },
+    }
@@ -0,0 +1,206 @@
+"""
+Roster uploads processed as background jobs.
+
+An upload is spooled to `IMPORT_JOB_DIR` and answered straight away with a
+job id, so a large file neither runs into proxy timeouts nor keeps the
+request open. At most `IMPORT_JOB_WORKERS` jobs run at once per worker and
+the others wait their turn; beyond `IMPORT_JOB_MAX_PENDING` uploads are
+turned away, so several admins uploading at once cannot crowd out
+check-ins.
+
+Unlike the synchronous import, every `IMPORT_JOB_CHUNK_SIZE` rows commit on
+their own together with the job's progress. Write locks are held for one
+chunk instead of the whole file, and any worker can report how far a job
+got. SQLAlchemy compiles a chunk's INSERT on the event loop, which takes
+over 100 ms for 500 rows, and check-ins arriving meanwhile wait for it; the
+chunk size trades that stall against import time. A job that fails part way
+keeps the chunks it committed; uploading the file again is safe because
+mobiles that already exist are reported as rejected rows, not inserted
+twice.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import UTC, datetime
+from typing import IO
+
+from starlette.concurrency import run_in_threadpool
+
+from config import config
+from database import database, import_job_table, sqlite_writes
+from importer import (
+    import_report,
+    insert_records,
+    parse_roster,
+    reject_existing_mobiles,
+)
+from rosters import roster_cache
+from search import search_index
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """Raised when `IMPORT_JOB_MAX_PENDING` jobs are already queued or running."""
+
+
+def _now() -> datetime:
+    return datetime.now(UTC)
+
+
+def _spool(file: IO, directory: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    descriptor, path = tempfile.mkstemp(dir=directory, suffix=".upload")
+    with os.fdopen(descriptor, "wb") as spooled:
+        shutil.copyfileobj(file, spooled)
+    return path
+
+
+class ImportJobs:
+    def __init__(self, directory: str, workers: int, max_pending: int, chunk_size: int):
+        self.directory = directory
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self._slots = asyncio.Semaphore(workers)
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    async def submit(self, file: IO, filename: str) -> dict:
+        """Spool the upload and queue it; returns the new job."""
+        if len(self._tasks) >= self.max_pending:
+            raise JobQueueFullError(f"{len(self._tasks)} imports are already waiting")
+
+        path = await run_in_threadpool(_spool, file, self.directory)
+        now = _now()
+        job = {
+            "id": uuid.uuid4().hex,
+            "filename": filename,
+            "status": QUEUED,
+            "total_rows": 0,
+            "inserted": 0,
+            "rejected": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        try:
+            await database.execute(import_job_table.insert().values(**job))
+        except BaseException:
+            os.unlink(path)
+            raise
+
+        task = asyncio.create_task(self._run(job, path))
+        self._tasks[job["id"]] = task
+        task.add_done_callback(lambda task: self._tasks.pop(job["id"], None))
+        logger.info("Queued import job %s for %s", job["id"], filename)
+        return job
+
+    async def _update(self, job: dict, **values):
+        values["updated_at"] = _now()
+        job.update(values)
+        await database.execute(
+            import_job_table.update()
+            .where(import_job_table.c.id == job["id"])
+            .values(**values)
+        )
+
+    async def _run(self, job: dict, path: str):
+        errors = []
+        try:
+            async with self._slots:
+                await self._update(job, status=RUNNING, started_at=_now())
+                file = await run_in_threadpool(open, path, "rb")
+                try:
+                    async for rows, records, chunk_errors in parse_roster(
+                        file, job["filename"], self.chunk_size
+                    ):
+                        errors.extend(chunk_errors)
+                        # Read before the transaction, so it only writes; on
+                        # SQLite a transaction that reads first cannot wait
+                        # for a check-in's write lock and fails instead.
+                        records = await reject_existing_mobiles(records, errors)
+                        async with sqlite_writes(), database.transaction():
+                            inserted = await insert_records(records)
+                            await self._update(
+                                job,
+                                total_rows=job["total_rows"] + rows,
+                                inserted=job["inserted"] + inserted,
+                                rejected=len(errors),
+                            )
+                finally:
+                    await run_in_threadpool(file.close)
+
+                report = import_report(job["total_rows"], job["inserted"], errors)
+                await self._update(
+                    job,
+                    status=SUCCEEDED,
+                    errors=json.dumps(report["errors"]),
+                    finished_at=_now(),
+                )
+                logger.info(
+                    "Import job %s finished: %d rows, %d inserted, %d rejected",
+                    job["id"],
+                    job["total_rows"],
+                    job["inserted"],
+                    job["rejected"],
+                )
+        except asyncio.CancelledError:
+            await self._fail(job, errors, "Interrupted by a server shutdown")
+            raise
+        except Exception as e:
+            logger.exception("Import job %s failed", job["id"])
+            await self._fail(job, errors, str(e))
+        finally:
+            os.unlink(path)
+            if job["inserted"]:
+                roster_cache.invalidate_all()
+                await search_index.refresh()
+
+    async def _fail(self, job: dict, errors: list[dict], error: str):
+        report = import_report(job["total_rows"], job["inserted"], errors)
+        try:
+            await self._update(
+                job,
+                status=FAILED,
+                error=error,
+                errors=json.dumps(report["errors"]),
+                finished_at=_now(),
+            )
+        except Exception:
+            logger.exception("Could not record the failure of import job %s", job["id"])
+
+    async def get(self, job_id: str) -> dict | None:
+        row = await database.fetch_one(
+            import_job_table.select().where(import_job_table.c.id == job_id)
+        )
+        if row is None:
+            return None
+        job = dict(row._mapping)
+        job["errors"] = json.loads(job["errors"]) if job["errors"] else []
+        return job
+
+    async def stop(self):
+        """Cancel this worker's unfinished jobs; they are recorded as failed."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"pending": len(self._tasks), "max_pending": self.max_pending}
+
+
+import_jobs = ImportJobs(
+    directory=config.IMPORT_JOB_DIR,
+    workers=config.IMPORT_JOB_WORKERS,
+    max_pending=config.IMPORT_JOB_MAX_PENDING,
+    chunk_size=config.IMPORT_JOB_CHUNK_SIZE,
+)
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = b": heartbeat\n\n"
+
+
+def encode_event(event: str, data: dict) -> bytes:
+    """Encode one Server-Sent Event frame."""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+class Subscriber:
+    __slots__ = ("dropped", "queue")
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+
+class LiveHub:
+    """
+    In-process fan-out of live events to Server-Sent Events subscribers.
+
+    Events are encoded once per publish and the same bytes are queued for
+    every subscriber. Each subscriber has a small bounded queue; when a slow
+    client falls behind, its oldest pending event is dropped so one stalled
+    phone can never grow memory without bound or hold up the publisher.
+    """
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self.subscribers: set[Subscriber] = set()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: dict):
+        frame = encode_event(event, data)
+        self.published += 1
+
+        for subscriber in self.subscribers:
+            if subscriber.queue.full():
+                subscriber.queue.get_nowait()
+                subscriber.dropped += 1
+                self.dropped += 1
+            subscriber.queue.put_nowait(frame)
+
+    async def stream(
+        self, subscriber: Subscriber, heartbeat_seconds: float, initial: bytes = b""
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield SSE frames for `subscriber` until the client goes away, sending a
+        heartbeat comment whenever nothing was published for a while so proxies
+        keep the idle connection open.
+        """
+        try:
+            if initial:
+                yield initial
+            while True:
+                try:
+                    frame = await asyncio.wait_for(
+                        subscriber.queue.get(), heartbeat_seconds
+                    )
+                except TimeoutError:
+                    frame = HEARTBEAT
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+hub = LiveHub(queue_size=config.LIVE_QUEUE_SIZE)
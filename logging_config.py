@@ -0,0 +1,117 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import TextIO
+
+from config import config
+
+# Attributes every LogRecord has; anything else was passed through `extra=`.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed via `extra=` are included as-is."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Logger that keeps only a `rate` fraction of its INFO (and lower) lines.
+
+    The coin is tossed in `isEnabledFor`, before a LogRecord is even built,
+    so dropped lines cost next to nothing. Warnings and errors always pass.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: float):
+        super().__init__(logger, {})
+        self.rate = rate
+
+    def isEnabledFor(self, level: int) -> bool:
+        if level <= logging.INFO and self.rate < 1.0 and random.random() >= self.rate:
+            return False
+        return self.logger.isEnabledFor(level)
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+
+def sampled_logger(logger: logging.Logger, route: str) -> logging.LoggerAdapter:
+    """Logger for a high-volume route handler, sampled per `config.LOG_SAMPLE_RATES`."""
+    return SampledLogger(logger, config.LOG_SAMPLE_RATES.get(route, 1.0))
+
+
+class InProcessQueueHandler(QueueHandler):
+    """
+    QueueHandler for a listener in the same process.
+
+    The stock `prepare` fully formats the record on the calling thread so it
+    can be pickled. Records never leave this process, so only the message is
+    interpolated here (to freeze mutable arguments) and the formatting is
+    left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(stream: TextIO = sys.stderr):
+    """
+    Route all logging through a queue to a background thread that formats
+    JSON and writes to `stream`, so request handlers never block on I/O.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = InProcessQueueHandler(log_queue)
+
+    # Nothing here runs in threads or subprocesses worth tagging records with.
+    logging.logThreads = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(config.LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,40 +1,228 @@
 import logging
+import time
 from contextlib import asynccontextmanager
+from typing import Annotated
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.cors import CORSMiddleware
 
-from database import database
+from analytics import analytics_cache
+from checkin_buffer import check_in_buffer
+from config import config
+from database import database, pool_manager, replica_pool_manager
+from jobs import import_jobs
+from live import hub
+from logging_config import setup_logging, stop_logging
+from metrics import Gauge, MetricsMiddleware, registry
+from migrations import upgrade
+from notifications import notification_cache
+from pool import DatabaseBusyError
+from profiling import (
+    PROFILES_PATH,
+    ProfilingMiddleware,
+    is_admin,
+    profile_store,
+    profiling_enabled,
+    sampler,
+)
+from qrcodes import shutdown_pool
+from replicas import StickyReadsMiddleware, replica_router
+from rosters import roster_cache
 from routers.employee import router as employee_router
-from starlette.middleware.cors import CORSMiddleware
+from scans import scan_deduplicator
+from search import search_index
+from security import identity_cache
+
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if config.MIGRATE_ON_STARTUP:
+        await run_in_threadpool(upgrade)
     await database.connect()
+    await replica_router.connect()
+    if config.SEARCH_INDEX_ON_STARTUP:
+        await search_index.build()
+    if config.CHECK_IN_BUFFER:
+        await check_in_buffer.start()
     yield
+    await import_jobs.stop()
+    if check_in_buffer.running:
+        await check_in_buffer.stop()
+    await replica_router.disconnect()
     await database.disconnect()
+    shutdown_pool()
+    stop_logging()
 
 
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(employee_router, prefix="/api/v1/employee")
 
+app.add_middleware(MetricsMiddleware)
+
+app.add_middleware(StickyReadsMiddleware, router=replica_router)
+
+# Wraps the metrics and replica middleware, so a profile covers them too.
+# Not installed at all unless a token or sample rate is configured.
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware, store=profile_store, sampler=sampler)
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=
-    [
+    allow_origins=[
         "http://localhost:5173",
-        "https://family-day-backend.onrender.com", 
+        "https://family-day-backend.onrender.com",
         "https://promate.legacy-taiwan.com",
     ],
     allow_credentials=True,
-    allow_methods=["*"],  
-    allow_headers=["*"],  
+    allow_methods=["*"],
+    allow_headers=["*"],
 )
 
 
+@app.exception_handler(DatabaseBusyError)
+async def database_busy_handler(request: Request, exc: DatabaseBusyError):
+    logger.warning("Database busy on %s %s: %s", request.method, request.url.path, exc)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "The service is busy, please try again"},
+        headers={"Retry-After": "1"},
+    )
+
+
 @app.get("/health-check")
 async def health_check():
     return "The API service is running!"
+
+
+@app.get("/ready")
+async def readiness():
+    # Unlike /health-check this needs a free pooled connection and a
+    # database answer, so a worker whose pool is exhausted reports 503.
+    health = pool_manager.health()
+    start = time.perf_counter()
+    try:
+        await database.fetch_one("SELECT 1")
+        health["database"] = "ok"
+    except Exception as e:  # noqa: BLE001 - any failure means not ready
+        logger.warning("Readiness probe failed: %s", e)
+        health["database"] = f"error: {type(e).__name__}"
+    health["probe_seconds"] = round(time.perf_counter() - start, 4)
+
+    if replica_router.enabled:
+        # Without the replica the read-heavy endpoints fail but check-ins
+        # still work, so the worker stays ready and keeps taking writes.
+        health["replica"] = replica_pool_manager.health()
+        try:
+            await replica_router.replica.fetch_one("SELECT 1")
+            health["replica"]["database"] = "ok"
+        except Exception as e:  # noqa: BLE001 - any failure means not ready
+            logger.warning("Replica readiness probe failed: %s", e)
+            health["replica"]["database"] = f"error: {type(e).__name__}"
+
+    ready = health["database"] == "ok"
+    return JSONResponse(
+        status_code=status.HTTP_200_OK
+        if ready
+        else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "unavailable", **health},
+    )
+
+
+registry.register(
+    Gauge(
+        "cache_events",
+        "In-process cache size, hits, misses and evictions.",
+        labels=("cache", "event"),
+        read=lambda: [
+            ((name, event), value)
+            for name, cache in (
+                ("identity", identity_cache),
+                ("group_roster", roster_cache),
+                ("notification", notification_cache),
+                ("analytics", analytics_cache),
+                ("check_in_scan", scan_deduplicator.recent),
+            )
+            for event, value in cache.stats().items()
+        ],
+    )
+)
+
+registry.register(
+    Gauge(
+        "live_feed",
+        "Live feed subscribers, published and dropped events.",
+        labels=("stat",),
+        read=lambda: [((stat,), value) for stat, value in hub.stats().items()],
+    )
+)
+
+registry.register(
+    Gauge(
+        "check_in_buffer",
+        "Buffered check-ins accepted, pending, flushed and replayed from the journal.",
+        labels=("stat",),
+        read=lambda: [
+            ((stat,), value) for stat, value in check_in_buffer.stats().items()
+        ],
+    )
+)
+
+registry.register(
+    Gauge(
+        "search_index",
+        "Help desk search index size, builds, refreshes and queries.",
+        labels=("stat",),
+        read=lambda: [((stat,), value) for stat, value in search_index.stats().items()],
+    )
+)
+
+registry.register(
+    Gauge(
+        "import_jobs",
+        "Background roster imports queued or running in this worker.",
+        labels=("stat",),
+        read=lambda: [((stat,), value) for stat, value in import_jobs.stats().items()],
+    )
+)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/stats/cache")
+async def cache_stats():
+    return {
+        "identity": identity_cache.stats(),
+        "group_roster": roster_cache.stats(),
+        "notification": notification_cache.stats(),
+        "analytics": analytics_cache.stats(),
+        "check_in_scan": scan_deduplicator.recent.stats(),
+    }
+
+
+@app.get(PROFILES_PATH, include_in_schema=False)
+async def list_profiles(x_profile: Annotated[str | None, Header()] = None):
+    if not is_admin(x_profile):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return profile_store.list()
+
+
+@app.get(PROFILES_PATH + "/{profile_id}", include_in_schema=False)
+async def get_profile(
+    profile_id: str, x_profile: Annotated[str | None, Header()] = None
+):
+    profile = profile_store.get(profile_id) if is_admin(x_profile) else None
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return profile
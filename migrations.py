@@ -0,0 +1,314 @@
+"""
+Versioned schema migrations.
+
+Each migration is a function that receives a SQLAlchemy connection inside a
+transaction. Migrations are written to be idempotent (they inspect the live
+schema before changing it), so they can be applied to databases that were
+originally created by `metadata.create_all` as well as to fresh ones.
+
+Run them once per deploy, before the new workers start. `upgrade` holds a
+lock while it migrates (an advisory lock on Postgres, a lock file next to
+an SQLite database), so processes that start together with
+`MIGRATE_ON_STARTUP` take turns instead of racing on the same DDL.
+
+Usage:
+    python migrations.py            # apply all pending migrations
+    python migrations.py status     # show applied / pending versions
+"""
+
+import fcntl
+import json
+import logging
+import sys
+from contextlib import contextmanager
+from datetime import UTC, datetime
+
+import sqlalchemy
+
+from database import (
+    employee_table,
+    get_engine,
+    import_job_table,
+    metadata,
+    participant_totals_table,
+)
+from totals import reconcile_totals_sync
+
+logger = logging.getLogger(__name__)
+
+# Key of the Postgres advisory lock held while migrating; any constant that
+# no other code locks on will do.
+MIGRATION_LOCK_KEY = 72400001
+
+schema_migrations_table = sqlalchemy.Table(
+    "schema_migrations",
+    sqlalchemy.MetaData(),
+    sqlalchemy.Column("version", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("description", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("applied_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+)
+
+
+# Rows removed by migration 0002 because another row had the same mobile.
+employee_duplicates_table = sqlalchemy.Table(
+    "employee_duplicates",
+    sqlalchemy.MetaData(),
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, autoincrement=False),
+    sqlalchemy.Column("mobile", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("kept_id", sqlalchemy.Integer, nullable=False),
+    # The removed row as JSON.
+    sqlalchemy.Column("record", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("removed_at", sqlalchemy.DateTime(timezone=True), nullable=False),
+)
+
+
+def _create_missing_indexes(conn, table: sqlalchemy.Table):
+    inspector = sqlalchemy.inspect(conn)
+    existing = {index["name"] for index in inspector.get_indexes(table.name)}
+    columns = {column["name"] for column in inspector.get_columns(table.name)}
+    for index in table.indexes:
+        # Indexes on columns a later migration adds are created by that migration.
+        if (
+            index.name not in existing
+            and {column.name for column in index.columns} <= columns
+        ):
+            logger.info("Creating index %s", index.name)
+            index.create(conn)
+
+
+def _add_missing_columns(conn, table: sqlalchemy.Table):
+    existing = {
+        column["name"] for column in sqlalchemy.inspect(conn).get_columns(table.name)
+    }
+    preparer = conn.dialect.identifier_preparer
+    for column in table.columns:
+        if column.name not in existing:
+            logger.info("Adding column %s.%s", table.name, column.name)
+            conn.execute(
+                sqlalchemy.text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                    f"{preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}"
+                )
+            )
+
+
+def _0001_initial_schema(conn):
+    # Creates any table that does not exist yet; existing tables are untouched.
+    metadata.create_all(conn)
+
+
+def _remove_duplicated_mobiles(conn):
+    """
+    Keep one row per mobile, the checked-in one or else the newest, and move
+    the others to employee_duplicates so nobody's data is lost.
+    """
+    duplicates = (
+        conn.execute(
+            sqlalchemy.select(employee_table.c.mobile)
+            .group_by(employee_table.c.mobile)
+            .having(sqlalchemy.func.count() > 1)
+        )
+        .scalars()
+        .all()
+    )
+    if not duplicates:
+        return
+
+    rows = (
+        conn.execute(
+            employee_table.select()
+            .where(employee_table.c.mobile.in_(duplicates))
+            .order_by(
+                employee_table.c.mobile,
+                sqlalchemy.func.coalesce(employee_table.c.is_checked, False).desc(),
+                employee_table.c.id.desc(),
+            )
+        )
+        .mappings()
+        .all()
+    )
+
+    kept = {}
+    removed = []
+    removed_at = datetime.now(UTC)
+    for row in rows:
+        if row["mobile"] not in kept:
+            kept[row["mobile"]] = row["id"]
+            continue
+        removed.append(
+            {
+                "id": row["id"],
+                "mobile": row["mobile"],
+                "kept_id": kept[row["mobile"]],
+                "record": json.dumps(dict(row), default=str, ensure_ascii=False),
+                "removed_at": removed_at,
+            }
+        )
+
+    employee_duplicates_table.create(conn, checkfirst=True)
+    conn.execute(employee_duplicates_table.insert(), removed)
+    conn.execute(
+        employee_table.delete().where(
+            employee_table.c.id.in_([row["id"] for row in removed])
+        )
+    )
+    for row in removed:
+        logger.warning(
+            "Removed employee %d with duplicated mobile %s, kept employee %d",
+            row["id"],
+            row["mobile"],
+            row["kept_id"],
+        )
+    logger.warning(
+        "Moved %d employees with duplicated mobiles to %s",
+        len(removed),
+        employee_duplicates_table.name,
+    )
+
+
+def _0002_employee_lookup_indexes(conn):
+    # The unique index on mobile cannot be built while duplicates exist.
+    _remove_duplicated_mobiles(conn)
+    _create_missing_indexes(conn, employee_table)
+
+
+def _0003_checked_in_time_timestamp(conn):
+    if conn.dialect.name != "postgresql":
+        # SQLite has no column types to alter; SQLAlchemy's DateTime reads the
+        # existing "YYYY-MM-DD HH:MM:SS" strings back as datetimes.
+        return
+
+    columns = {
+        column["name"]: column["type"]
+        for column in sqlalchemy.inspect(conn).get_columns(employee_table.name)
+    }
+    if isinstance(columns["checked_in_time"], sqlalchemy.DateTime):
+        return
+
+    # Existing values were written as Asia/Taipei wall-clock time.
+    conn.execute(
+        sqlalchemy.text(
+            "ALTER TABLE employee ALTER COLUMN checked_in_time TYPE TIMESTAMP WITH TIME ZONE "
+            "USING NULLIF(checked_in_time, '')::timestamp AT TIME ZONE 'Asia/Taipei'"
+        )
+    )
+
+
+def _0004_participant_totals(conn):
+    participant_totals_table.create(conn, checkfirst=True)
+    reconcile_totals_sync(conn)
+
+
+def _0005_employee_updated_at(conn):
+    _add_missing_columns(conn, employee_table)
+    conn.execute(
+        employee_table.update()
+        .where(employee_table.c.updated_at.is_(None))
+        .values(updated_at=datetime.now(UTC))
+    )
+    _create_missing_indexes(conn, employee_table)
+
+
+def _0006_checked_in_time_index(conn):
+    _create_missing_indexes(conn, employee_table)
+
+
+def _0007_import_jobs(conn):
+    import_job_table.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, "initial schema", _0001_initial_schema),
+    (2, "employee lookup indexes", _0002_employee_lookup_indexes),
+    (3, "checked_in_time as timestamp", _0003_checked_in_time_timestamp),
+    (4, "participant running totals", _0004_participant_totals),
+    (5, "employee updated_at for delta sync", _0005_employee_updated_at),
+    (6, "checked_in_time index for check-in rate buckets", _0006_checked_in_time_index),
+    (7, "background import jobs", _0007_import_jobs),
+]
+
+
+def applied_versions(conn) -> set[int]:
+    schema_migrations_table.create(conn, checkfirst=True)
+    return set(
+        conn.execute(sqlalchemy.select(schema_migrations_table.c.version)).scalars()
+    )
+
+
+@contextmanager
+def _migration_lock(bind: sqlalchemy.engine.Engine):
+    """Let one process at a time migrate this database; the others wait here."""
+    if bind.dialect.name == "postgresql":
+        # Transaction-scoped, so it holds behind pgbouncer in transaction mode too.
+        with bind.begin() as conn:
+            conn.execute(
+                sqlalchemy.text("SELECT pg_advisory_xact_lock(:key)"),
+                {"key": MIGRATION_LOCK_KEY},
+            )
+            yield
+    elif bind.dialect.name == "sqlite" and bind.url.database not in (
+        None,
+        "",
+        ":memory:",
+    ):
+        with open(f"{bind.url.database}.migrate-lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+    else:
+        yield
+
+
+def upgrade(bind: sqlalchemy.engine.Engine | None = None) -> list[int]:
+    """Apply every pending migration, each in its own transaction."""
+    bind = bind or get_engine()
+    with _migration_lock(bind):
+        # Read after taking the lock, so migrations another process just
+        # applied are not applied again.
+        with bind.begin() as conn:
+            applied = applied_versions(conn)
+
+        newly_applied = []
+        for version, description, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+
+            logger.info("Applying migration %04d: %s", version, description)
+            with bind.begin() as conn:
+                migrate(conn)
+                conn.execute(
+                    schema_migrations_table.insert().values(
+                        version=version,
+                        description=description,
+                        applied_at=datetime.now(UTC),
+                    )
+                )
+            newly_applied.append(version)
+
+    return newly_applied
+
+
+def status(bind: sqlalchemy.engine.Engine | None = None) -> list[tuple[int, str, bool]]:
+    bind = bind or get_engine()
+    with bind.begin() as conn:
+        applied = applied_versions(conn)
+    return [
+        (version, description, version in applied)
+        for version, description, _ in MIGRATIONS
+    ]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        for version, description, is_applied in status():
+            print(
+                f"{version:04d} {'applied' if is_applied else 'pending'}  {description}"
+            )
+    else:
+        versions = upgrade()
+        print(
+            f"Applied migrations: {versions}" if versions else "Database is up to date"
+        )
@@ -1,5 +1,4 @@
 from datetime import datetime
-from typing import Optional
 
 from pydantic import BaseModel
 
@@ -10,11 +9,11 @@ class EmployeeCreate(BaseModel):
     department: str
     company: str
     family_employee: int = 1
-    family_infant: Optional[int] = None
-    family_child: Optional[int] = None
-    family_adult: Optional[int] = None
-    family_elderly: Optional[int] = None
-    group: Optional[str] = None
+    family_infant: int | None = None
+    family_child: int | None = None
+    family_adult: int | None = None
+    family_elderly: int | None = None
+    group: str | None = None
     is_checked: bool = False
     is_deleted: bool = False
 
@@ -25,6 +24,12 @@ class EmployeeResponse(EmployeeCreate):
     company: str
 
 
+class CheckInResponse(EmployeeResponse):
+    checked_in_time: datetime | None = None
+    already_checked_in: bool = False
+    message: str
+
+
 class EmployeeIn(BaseModel):
     mobile: str
 
@@ -32,15 +37,73 @@ class EmployeeIn(BaseModel):
 class Notification(BaseModel):
     title: str
     message: str
-    
 
 
 class NotificationCreate(Notification):
     # id: int
-    created_at: Optional[str] = None
+    created_at: str | None = None
+
 
 class NotificationResponse(BaseModel):
     id: int
     title: str
     message: str
-    created_at: str
\ No newline at end of file
+    created_at: str
+
+
+class ImportRowError(BaseModel):
+    row: int
+    errors: list[str]
+
+
+class ImportReport(BaseModel):
+    total_rows: int
+    inserted: int
+    rejected: int
+    errors: list[ImportRowError]
+
+
+class ImportJob(BaseModel):
+    id: str
+    filename: str
+    status: str
+    total_rows: int
+    inserted: int
+    rejected: int
+    errors: list[ImportRowError] = []
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+class ReimportUpdate(BaseModel):
+    row: int
+    mobile: str
+    restored: bool
+    # column -> [current value, value in the file]
+    changes: dict[str, list[int | str | None]]
+
+
+class ReimportInsert(BaseModel):
+    row: int
+    mobile: str
+
+
+class ReimportChanges(BaseModel):
+    inserted: list[ReimportInsert]
+    updated: list[ReimportUpdate]
+    deleted: list[str]
+
+
+class ReimportReport(BaseModel):
+    dry_run: bool
+    total_rows: int
+    inserted: int
+    updated: int
+    restored: int
+    deleted: int
+    unchanged: int
+    rejected: int
+    errors: list[ImportRowError]
+    changes: ReimportChanges
@@ -0,0 +1,47 @@
+from sqlalchemy import select
+
+from cache import TTLCache
+from config import config
+from database import database, notifications_table
+from replicas import replica_router
+
+_LATEST = "latest"
+
+# The latest notification, refreshed by create_notification in this process.
+# Other workers pick a new one up once their entry expires. An empty dict
+# caches "no notifications yet", so polls before the first one skip the
+# database too.
+notification_cache = TTLCache(max_size=1, ttl=config.NOTIFICATION_CACHE_TTL_SECONDS)
+
+
+def _latest_query():
+    # Ids increase with created_at, and the primary key index serves this
+    # without sorting the string timestamps.
+    return (
+        select(notifications_table).order_by(notifications_table.c.id.desc()).limit(1)
+    )
+
+
+async def latest_notification() -> dict | None:
+    latest = None if replica_router.sticky() else notification_cache.get(_LATEST)
+    if latest is None:
+        row = await replica_router.reader().fetch_one(_latest_query())
+        latest = dict(row._mapping) if row else {}
+        notification_cache.set(_LATEST, latest)
+    return latest or None
+
+
+def remember_latest(notification: dict):
+    notification_cache.set(_LATEST, notification)
+
+
+async def notification_history(before: int | None, limit: int) -> list:
+    """Newest first, `limit` notifications with an id below `before`."""
+    query = (
+        select(notifications_table)
+        .order_by(notifications_table.c.id.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        query = query.where(notifications_table.c.id < before)
+    return await database.fetch_all(query)
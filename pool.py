@@ -0,0 +1,155 @@
+"""
+Connection pool settings and instrumentation for the asyncpg pool.
+
+Pool sizes, the acquire timeout and the prepared statement cache come from
+config, so each environment can be sized separately (e.g. PROD_DB_POOL_MAX_SIZE).
+
+Behind pgbouncer in transaction mode each transaction may run on a different
+server connection, so statements asyncpg prepared and cached on one server
+connection are missing (or clash) on the next. When the
+database URL points at pgbouncer, or `DB_PGBOUNCER_TRANSACTION_MODE` says so,
+the statement cache is turned off.
+
+Waiting for a connection is bounded by `DB_POOL_ACQUIRE_TIMEOUT_SECONDS`;
+a request that times out gets `PoolTimeoutError`, which the app answers with
+503 so clients back off instead of piling more waiters onto a full pool.
+SQLite writes that run out of busy timeout are answered the same way.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable
+from urllib.parse import urlsplit
+
+from config import config
+from metrics import Counter, Histogram, registry
+
+db_pool_acquire_wait = registry.register(
+    Histogram(
+        "db_pool_acquire_wait_seconds",
+        "Time spent waiting for a pooled database connection.",
+    )
+)
+
+db_pool_acquire_timeouts = registry.register(
+    Counter(
+        "db_pool_acquire_timeouts_total",
+        "Connection acquires that gave up after DB_POOL_ACQUIRE_TIMEOUT_SECONDS.",
+    )
+)
+
+
+class DatabaseBusyError(Exception):
+    """The database could not take the request in time; the app answers 503."""
+
+
+class PoolTimeoutError(DatabaseBusyError):
+    """Raised when no pooled connection became free within the acquire timeout."""
+
+
+def is_postgres(url: str) -> bool:
+    return url.startswith("postgres")
+
+
+def behind_pgbouncer(url: str) -> bool:
+    """Explicit setting, else a guess from the URL: a pgbouncer host or its usual port."""
+    if config.DB_PGBOUNCER_TRANSACTION_MODE is not None:
+        return config.DB_PGBOUNCER_TRANSACTION_MODE
+    parts = urlsplit(url)
+    return "pgbouncer" in (parts.hostname or "") or parts.port == 6432
+
+
+class PoolManager:
+    def __init__(self, url: str):
+        self.enabled = is_postgres(url)
+        self.pgbouncer = self.enabled and behind_pgbouncer(url)
+        self.acquire_timeout = config.DB_POOL_ACQUIRE_TIMEOUT_SECONDS
+        self._pool = None
+        self.acquired = 0
+        self.timeouts = 0
+
+    def options(self) -> dict:
+        """Keyword arguments for `databases.Database`, passed on to asyncpg.create_pool."""
+        if not self.enabled:
+            return {}
+
+        options = {
+            "min_size": config.DB_POOL_MIN_SIZE,
+            "max_size": config.DB_POOL_MAX_SIZE,
+            "statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+        }
+        if self.pgbouncer:
+            options["statement_cache_size"] = 0
+        return options
+
+    def attach(self, pool):
+        """Remember the connected pool for `stats`."""
+        self._pool = pool
+
+    async def acquire(self, acquiring: Awaitable):
+        """
+        Await `acquiring`, a connection checkout from the pool, with the
+        acquire timeout and wait-time metrics. asyncpg's Pool has __slots__,
+        so the checkout is wrapped here rather than by patching the pool.
+        """
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(acquiring, self.acquire_timeout or None)
+        except TimeoutError as e:
+            self.timeouts += 1
+            db_pool_acquire_timeouts.inc()
+            raise PoolTimeoutError(
+                f"No database connection free after {self.acquire_timeout}s"
+            ) from e
+        finally:
+            db_pool_acquire_wait.observe(time.perf_counter() - start)
+        self.acquired += 1
+        return result
+
+    def detach(self):
+        self._pool = None
+
+    def stats(self) -> dict:
+        """Connection pool usage; empty for backends without a pool (SQLite)."""
+        pool = self._pool
+        if pool is None or not hasattr(pool, "get_size"):
+            return {}
+
+        size = pool.get_size()
+        idle = pool.get_idle_size()
+        return {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "max": pool.get_max_size(),
+        }
+
+    def health(self) -> dict:
+        """Pool settings, usage and how this worker's pool fits the connection budget."""
+        stats = self.stats()
+        health = {
+            "pooled": self.enabled,
+            "pgbouncer_transaction_mode": self.pgbouncer,
+            "statement_cache_size": self.options().get("statement_cache_size"),
+            "acquire_timeout_seconds": self.acquire_timeout,
+            "acquired": self.acquired,
+            "acquire_timeouts": self.timeouts,
+            **stats,
+        }
+        if stats:
+            health["saturation"] = (
+                round(stats["in_use"] / stats["max"], 3) if stats["max"] else 0.0
+            )
+
+        if self.enabled and config.DB_CONNECTION_BUDGET:
+            workers = config.WEB_CONCURRENCY
+            demand = workers * config.DB_POOL_MAX_SIZE
+            health["budget"] = {
+                "workers": workers,
+                "max_per_worker": config.DB_POOL_MAX_SIZE,
+                "demand": demand,
+                "limit": config.DB_CONNECTION_BUDGET,
+                "max_workers": config.DB_CONNECTION_BUDGET // config.DB_POOL_MAX_SIZE,
+                "within": demand <= config.DB_CONNECTION_BUDGET,
+            }
+        return health
@@ -0,0 +1,278 @@
+"""
+On-demand sampling profiles of single requests.
+
+A request carrying `X-Profile: <PROFILE_ADMIN_TOKEN>`, or picked at random
+with probability `PROFILE_SAMPLE_RATE`, is profiled: while it runs, a
+background thread samples the event loop thread's stack every
+`PROFILE_INTERVAL_SECONDS` and keeps the samples taken while the request's
+task was the one running. Each sample is weighted by the time since the
+previous one, so the stacks add up to the request's time on the event loop,
+split by where it went (Pydantic models, JSON encoding, logging, the
+database driver, ...). Every database call the request makes is timed too,
+including the time spent waiting on the database, which the stacks cannot
+show.
+
+The last `PROFILE_STORE_SIZE` profiles are kept in memory and served by
+GET /debug/profiles to callers presenting the same token; a profiled
+response carries its id in `X-Profile-Id`.
+
+With neither a token nor a sample rate configured the middleware is not
+installed and the sampler thread never starts. Work the request hands to the
+thread pool or to other tasks is not in the stacks, only in the database
+timings.
+"""
+
+import asyncio
+import logging
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import UTC, datetime
+
+from config import config
+from metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILES_PATH = "/debug/profiles"
+MAX_STACK_DEPTH = 128
+# Stacks kept per profile; the rest are folded into the module breakdown only.
+MAX_STACKS = 200
+
+
+class Profile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.route = path
+        self.status = None
+        self.started_at = datetime.now(UTC)
+        self.duration = 0.0
+        self.sampled = 0.0
+        self.samples = 0
+        self.stacks: dict[str, float] = {}
+        self.modules: dict[str, float] = {}
+        self.queries: dict[str, list] = {}
+
+    def add_sample(self, frame, weight: float):
+        names = []
+        module = None
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            name = frame.f_globals.get("__name__", "?")
+            if module is None:
+                module = name.partition(".")[0]
+            names.append(f"{name}:{getattr(code, 'co_qualname', code.co_name)}")
+            frame = frame.f_back
+        stack = ";".join(reversed(names))
+
+        self.samples += 1
+        self.sampled += weight
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + weight
+        self.modules[module] = self.modules.get(module, 0.0) + weight
+
+    def add_query(self, operation: str, shape: str, seconds: float):
+        timing = self.queries.setdefault(f"{operation} {shape}", [0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_seconds": round(self.duration, 6),
+            "sampled_seconds": round(self.sampled, 6),
+            "samples": self.samples,
+            "db_queries": sum(count for count, _ in self.queries.values()),
+            "db_seconds": round(
+                sum(seconds for _, seconds in self.queries.values()), 6
+            ),
+        }
+
+    def report(self) -> dict:
+        stacks = sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)
+        return {
+            **self.summary(),
+            "interval_seconds": config.PROFILE_INTERVAL_SECONDS,
+            "db": {
+                query: {"count": count, "seconds": round(seconds, 6)}
+                for query, (count, seconds) in sorted(
+                    self.queries.items(), key=lambda item: -item[1][1]
+                )
+            },
+            # Sampled time by the module of the innermost Python frame.
+            "modules": {
+                module: round(seconds, 6)
+                for module, seconds in sorted(
+                    self.modules.items(), key=lambda item: -item[1]
+                )
+            },
+            # Collapsed stacks, outermost frame first; flamegraph.pl and
+            # speedscope read them once each line is "<stack> <microseconds>".
+            "stacks": [
+                {"stack": stack, "seconds": round(seconds, 6)}
+                for stack, seconds in stacks[:MAX_STACKS]
+            ],
+        }
+
+
+_profile: ContextVar[Profile | None] = ContextVar("profile", default=None)
+
+
+def record_query(operation: str, shape: str, seconds: float):
+    """Called for every database call; adds it to the current request's profile, if any."""
+    profile = _profile.get()
+    if profile is not None:
+        profile.add_query(operation, shape, seconds)
+
+
+class Sampler:
+    """
+    Samples the event loop thread from a background thread while at least
+    one profiled request is running.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._profiles: dict[asyncio.Task, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self, task: asyncio.Task, profile: Profile):
+        with self._lock:
+            self._profiles[task] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(asyncio.get_running_loop(), threading.get_ident()),
+                    name="profile-sampler",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def stop(self, task: asyncio.Task):
+        with self._lock:
+            self._profiles.pop(task, None)
+
+    def _run(self, loop: asyncio.AbstractEventLoop, thread_id: int):
+        # A busy event loop only gives up the GIL every switch interval (5 ms
+        # by default), which would be the real sampling interval.
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, self.interval))
+        last = time.perf_counter()
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            weight, last = now - last, now
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    sys.setswitchinterval(switch_interval)
+                    return
+                profile = self._profiles.get(asyncio.current_task(loop))
+                if profile is not None:
+                    frame = sys._current_frames().get(thread_id)
+                    if frame is not None:
+                        profile.add_sample(frame, weight)
+
+
+class ProfileStore:
+    def __init__(self, size: int):
+        self._profiles: deque[Profile] = deque(maxlen=size)
+
+    def add(self, profile: Profile):
+        self._profiles.append(profile)
+
+    def list(self) -> list[dict]:
+        """Newest first."""
+        return [profile.summary() for profile in reversed(self._profiles)]
+
+    def get(self, profile_id: str) -> dict | None:
+        for profile in self._profiles:
+            if profile.id == profile_id:
+                return profile.report()
+        return None
+
+
+def profiling_enabled() -> bool:
+    return bool(config.PROFILE_ADMIN_TOKEN) or config.PROFILE_SAMPLE_RATE > 0
+
+
+def is_admin(token: str | None) -> bool:
+    return bool(config.PROFILE_ADMIN_TOKEN and token) and secrets.compare_digest(
+        token.encode(), config.PROFILE_ADMIN_TOKEN.encode()
+    )
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests asking for it, plus a random sample."""
+
+    def __init__(self, app, store: "ProfileStore", sampler: "Sampler"):
+        self.app = app
+        self.store = store
+        self.sampler = sampler
+
+    def _wanted(self, scope) -> bool:
+        if scope["path"].startswith(PROFILES_PATH):
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return is_admin(value.decode("latin-1"))
+        return (
+            config.PROFILE_SAMPLE_RATE > 0
+            and random.random() < config.PROFILE_SAMPLE_RATE
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"])
+        token = _profile.set(profile)
+        task = asyncio.current_task()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile.id.encode()),
+                ]
+            await send(message)
+
+        start = time.perf_counter()
+        self.sampler.start(task, profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.sampler.stop(task)
+            profile.duration = time.perf_counter() - start
+            profile.route = route_template(scope)
+            _profile.reset(token)
+            self.store.add(profile)
+            summary = profile.summary()
+            logger.info(
+                "Profiled %s %s: %.1f ms, %.1f ms sampled on the event loop, %d queries in %.1f ms",
+                profile.method,
+                profile.route,
+                1000 * profile.duration,
+                1000 * profile.sampled,
+                summary["db_queries"],
+                1000 * summary["db_seconds"],
+            )
+
+
+profile_store = ProfileStore(config.PROFILE_STORE_SIZE)
+sampler = Sampler(config.PROFILE_INTERVAL_SECONDS)
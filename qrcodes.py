@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import logging
+import os
+import zipfile
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rendering parameters below change so cached images are
+# re-rendered instead of served stale.
+RENDER_VERSION = "v1"
+RENDER_BATCH_SIZE = 100
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def check_in_url(mobile: str) -> str:
+    return f"{config.PUBLIC_BASE_URL.rstrip('/')}/api/v1/employee/{mobile}/check-in"
+
+
+def cache_path(url: str, cache_dir: str) -> str:
+    """Content-addressed location of the rendered QR code for `url`."""
+    digest = hashlib.sha256(f"{RENDER_VERSION}:{url}".encode()).hexdigest()
+    return os.path.join(cache_dir, digest[:2], f"{digest}.png")
+
+
+def render_png(url: str) -> bytes:
+    # Imported here so qrcode and PIL load in the render workers, not at start-up.
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def render_cached(url: str, cache_dir: str) -> str:
+    """Render `url` into the cache unless it is already there; returns the path."""
+    path = cache_path(url, cache_dir)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so concurrent renders never expose a partial file.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(render_png(url))
+    os.replace(tmp_path, path)
+    return path
+
+
+def render_batch(urls: list[str], cache_dir: str) -> list[str]:
+    return [render_cached(url, cache_dir) for url in urls]
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=config.QR_RENDER_WORKERS or None)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def render_qr_code(mobile: str) -> str:
+    """Path of the cached QR code for one employee, rendering it off the event loop."""
+    url = check_in_url(mobile)
+    path = cache_path(url, config.QR_CACHE_DIR)
+    if os.path.exists(path):
+        return path
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_pool(), render_cached, url, config.QR_CACHE_DIR
+    )
+
+
+async def render_qr_codes(mobiles: list[str]) -> dict[str, str]:
+    """
+    Render every missing QR code in the process pool, in batches to keep the
+    pickling overhead per image low. Returns mobile -> cached file path.
+    """
+    paths = {
+        mobile: cache_path(check_in_url(mobile), config.QR_CACHE_DIR)
+        for mobile in mobiles
+    }
+    missing = [mobile for mobile, path in paths.items() if not os.path.exists(path)]
+
+    if missing:
+        logger.info("Rendering %d of %d QR codes", len(missing), len(mobiles))
+        loop = asyncio.get_running_loop()
+        pool = get_pool()
+        urls = [check_in_url(mobile) for mobile in missing]
+        await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    pool,
+                    render_batch,
+                    urls[i : i + RENDER_BATCH_SIZE],
+                    config.QR_CACHE_DIR,
+                )
+                for i in range(0, len(urls), RENDER_BATCH_SIZE)
+            ]
+        )
+
+    return paths
+
+
+class _ChunkWriter:
+    """Write-only file object that hands the ZIP bytes written so far to a generator."""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_zip(files: Iterable[tuple[str, str]]) -> Iterator[bytes]:
+    """
+    Stream a ZIP archive of `(archive name, file path)` pairs.
+
+    The writer is not seekable, so zipfile emits data descriptors and the
+    archive can be sent while it is being built. PNGs are already compressed,
+    so entries are stored as-is.
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for name, path in files:
+            archive.write(path, arcname=name)
+            yield writer.drain()
+    yield writer.drain()
@@ -0,0 +1,154 @@
+"""
+Read/write splitting between the primary and an optional read replica.
+
+With `DATABASE_REPLICA_URL` set, read-heavy endpoints that can tolerate a
+little replication lag (the roster, group members, participant totals, the
+latest notification, analytics and report exports) read through `reader()`,
+which returns the replica. Writes and everything else keep using
+`database.database`, the primary.
+
+Read-your-writes: POST, PUT, PATCH and DELETE requests read from the
+primary, so the totals published after a check-in include it, and a
+successful one sets a short-lived cookie. For `DB_REPLICA_STICKY_SECONDS`
+after it that client's reads go to the primary too, on whichever worker
+they land, so an attendee who just checked in never sees a replica that has
+not caught up yet. Reads outside a request (start-up, the check-in buffer's
+flusher, import jobs) always use the primary.
+
+Caches filled from the replica can hold rows as old as the replica, so
+sticky requests skip the group roster and latest notification caches.
+
+Snapshot deltas never use the replica: their versions come from the
+primary's clock, and a row that was not yet replicated when a delta was read
+would be skipped for good.
+"""
+
+import math
+import time
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+
+import databases
+
+from config import config
+from database import database, replica
+from metrics import Counter, registry
+
+STICKY_COOKIE = "db_primary_until"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+db_reads_routed = registry.register(
+    Counter(
+        "db_reads_routed_total",
+        "Replica-eligible reads by the database that served them.",
+        labels=("target",),
+    )
+)
+
+
+class _RequestRoute:
+    """Per-request routing state, shared with tasks the request starts."""
+
+    def __init__(self, primary_until: float, writes: bool):
+        self.primary_until = primary_until
+        self.writes = writes
+
+
+_route: ContextVar[_RequestRoute | None] = ContextVar("replica_route", default=None)
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        primary: databases.Database,
+        replica: databases.Database,
+        sticky_seconds: float,
+    ):
+        self.primary = primary
+        self.replica = replica
+        self.sticky_seconds = sticky_seconds
+
+    @property
+    def enabled(self) -> bool:
+        return self.replica is not self.primary
+
+    def sticky(self) -> bool:
+        """
+        Whether this request must see its client's recent writes. Caches may
+        have been filled from the replica, so such requests skip them too.
+        """
+        if not self.enabled:
+            return False
+        route = _route.get()
+        return route is not None and (route.writes or route.primary_until > time.time())
+
+    def reader(self) -> databases.Database:
+        """The database for a read that may lag the primary by a moment."""
+        if not self.enabled:
+            return self.primary
+        if _route.get() is None or self.sticky():
+            db_reads_routed.inc("primary")
+            return self.primary
+        db_reads_routed.inc("replica")
+        return self.replica
+
+    async def connect(self):
+        if self.enabled:
+            await self.replica.connect()
+
+    async def disconnect(self):
+        if self.enabled:
+            await self.replica.disconnect()
+
+
+def _primary_until(scope) -> float:
+    for name, value in scope["headers"]:
+        if name == b"cookie":
+            morsel = SimpleCookie(value.decode("latin-1")).get(STICKY_COOKIE)
+            if morsel is not None:
+                try:
+                    return float(morsel.value)
+                except ValueError:
+                    return 0.0
+    return 0.0
+
+
+class StickyReadsMiddleware:
+    """ASGI middleware that carries read-your-writes stickiness in a cookie."""
+
+    def __init__(self, app, router: "ReplicaRouter"):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.router.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        route = _RequestRoute(_primary_until(scope), scope["method"] in WRITE_METHODS)
+        token = _route.set(route)
+
+        async def send_with_cookie(message):
+            if (
+                message["type"] == "http.response.start"
+                and route.writes
+                and message["status"] < 400
+            ):
+                seconds = self.router.sticky_seconds
+                cookie = (
+                    f"{STICKY_COOKIE}={time.time() + seconds:.3f}; Max-Age={math.ceil(seconds)}; "
+                    "Path=/; HttpOnly; SameSite=None; Secure"
+                )
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"set-cookie", cookie.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _route.reset(token)
+
+
+replica_router = ReplicaRouter(database, replica, config.DB_REPLICA_STICKY_SECONDS)
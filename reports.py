@@ -0,0 +1,161 @@
+"""
+Attendance report export for the organizers.
+
+The attendance sheet is read through `Database.iterate`, a server-side
+cursor on Postgres, and written out as it arrives, so memory does not grow with the
+roster. The per company, department and group summaries are GROUP BY
+queries; the database does the counting and only one row per group comes
+back.
+
+CSV is streamed straight to the client one sheet per request. XLSX is a zip
+that can only be finished once every sheet is written, so it is built in
+openpyxl's write-only mode (rows go to temporary files, not memory) into a
+temporary file that is then streamed and removed.
+"""
+
+import csv
+import io
+import os
+import tempfile
+from collections.abc import AsyncIterator
+
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+
+from checkin import to_taipei_time
+from database import employee_table
+from replicas import replica_router
+from totals import TOTAL_COLUMNS
+
+XLSX_BATCH_SIZE = 1000
+
+ATTENDANCE_COLUMNS = [
+    "id",
+    "name",
+    "mobile",
+    "company",
+    "department",
+    "group",
+    "family_employee",
+    "family_infant",
+    "family_child",
+    "family_adult",
+    "family_elderly",
+    "is_checked",
+    "checked_in_time",
+]
+
+SUMMARY_BY = {
+    "company": employee_table.c.company,
+    "department": employee_table.c.department,
+    "group": employee_table.c.group,
+}
+
+SHEETS = ["attendance", *SUMMARY_BY]
+
+# "total_infant" -> "checked_in_infant" and so on, in TOTAL_COLUMNS order.
+SUMMARY_TOTALS = {
+    total.replace("total_", "checked_in_"): column
+    for total, column in TOTAL_COLUMNS.items()
+}
+
+
+def attendance_query():
+    return (
+        select(*[employee_table.c[name] for name in ATTENDANCE_COLUMNS])
+        .where(employee_table.c.is_deleted == False)
+        .order_by(employee_table.c.id)
+    )
+
+
+def summary_query(by: str):
+    key = SUMMARY_BY[by]
+    checked = employee_table.c.is_checked == True
+    return (
+        select(
+            key.label(by),
+            func.count().label("families"),
+            func.count().filter(checked).label("checked_in_families"),
+            *[
+                func.coalesce(func.sum(column).filter(checked), 0).label(name)
+                for name, column in SUMMARY_TOTALS.items()
+            ],
+        )
+        .where(employee_table.c.is_deleted == False)
+        .group_by(key)
+        .order_by(key)
+    )
+
+
+def summary_header(by: str) -> list[str]:
+    return [by, "families", "checked_in_families", *SUMMARY_TOTALS]
+
+
+def _attendance_row(row) -> list:
+    values = [row[name] for name in ATTENDANCE_COLUMNS]
+    checked_in_time = to_taipei_time(row["checked_in_time"])
+    # Spreadsheets cannot hold time zone aware datetimes; Taipei wall time.
+    values[-1] = f"{checked_in_time:%Y-%m-%d %H:%M:%S}" if checked_in_time else None
+    values[-2] = bool(values[-2])
+    return values
+
+
+def _csv_line(values: list) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode("utf-8")
+
+
+async def iter_csv(sheet: str) -> AsyncIterator[bytes]:
+    """One sheet of the report as CSV, starting with a BOM so Excel reads it as UTF-8."""
+    yield "\ufeff".encode("utf-8")
+
+    if sheet == "attendance":
+        yield _csv_line(ATTENDANCE_COLUMNS)
+        async for row in replica_router.reader().iterate(attendance_query()):
+            yield _csv_line(_attendance_row(row))
+        return
+
+    yield _csv_line(summary_header(sheet))
+    for row in await replica_router.reader().fetch_all(summary_query(sheet)):
+        yield _csv_line(list(row._mapping.values()))
+
+
+def _append_rows(worksheet, rows: list[list]):
+    for row in rows:
+        worksheet.append(row)
+
+
+async def write_xlsx() -> str:
+    """Write every sheet to a temporary XLSX file and return its path; the caller removes it."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("attendance")
+    worksheet.append(ATTENDANCE_COLUMNS)
+
+    batch = []
+    async for row in replica_router.reader().iterate(attendance_query()):
+        batch.append(_attendance_row(row))
+        if len(batch) >= XLSX_BATCH_SIZE:
+            await run_in_threadpool(_append_rows, worksheet, batch)
+            batch = []
+    await run_in_threadpool(_append_rows, worksheet, batch)
+
+    for by in SUMMARY_BY:
+        worksheet = workbook.create_sheet(f"by {by}")
+        worksheet.append(summary_header(by))
+        rows = [
+            list(row._mapping.values())
+            for row in await replica_router.reader().fetch_all(summary_query(by))
+        ]
+        await run_in_threadpool(_append_rows, worksheet, rows)
+
+    descriptor, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(descriptor)
+    try:
+        await run_in_threadpool(workbook.save, path)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
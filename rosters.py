@@ -0,0 +1,81 @@
+import hashlib
+
+from sqlalchemy import func, select
+
+from cache import TTLCache
+from config import config
+from database import employee_table
+
+
+def version_query(group: str):
+    """
+    What a group's ETag is derived from. Every write to employee sets
+    updated_at, adding or removing a member changes the count, and check-ins
+    change the number of check-in times even if two workers' clocks disagree.
+    """
+    return select(
+        func.count(),
+        func.count(employee_table.c.checked_in_time),
+        func.max(employee_table.c.updated_at),
+    ).where(employee_table.c.group == group)
+
+
+def roster_etag(version) -> str:
+    """
+    The ETag of a group roster at `version`, a row of `version_query`.
+
+    Computed from the database alone, so every worker hands out the same
+    ETag for the same roster and a client's If-None-Match is honoured by
+    whichever worker it reaches.
+    """
+    members, checked_in, updated_at = version[0], version[1], version[2]
+    digest = hashlib.blake2b(
+        f"{members}|{checked_in}|{updated_at}".encode(), digest_size=12
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+class GroupRosterCache:
+    """
+    Serialized group rosters with their ETags.
+
+    While a group's entry is fresh a request is answered without a query. A
+    changed roster is picked up when this process changes one of its members
+    (`invalidate`), or from the database once the entry expires, where the
+    version query alone answers clients whose ETag is still current.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._rosters = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get(self, group: str) -> tuple[str, bytes] | None:
+        """`(etag, body)` of the cached roster, or None when it must be re-read."""
+        return self._rosters.get(group)
+
+    def store(self, group: str, etag: str, body: bytes):
+        self._rosters.set(group, (etag, body))
+
+    def invalidate(self, group: str | None):
+        if group is not None:
+            self._rosters.invalidate(group)
+
+    def invalidate_all(self):
+        self._rosters.clear()
+
+    def stats(self) -> dict:
+        return self._rosters.stats()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`, per RFC 9110."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+roster_cache = GroupRosterCache(
+    max_size=config.ROSTER_CACHE_MAX_SIZE, ttl=config.ROSTER_CACHE_TTL_SECONDS
+)
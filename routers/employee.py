@@ -1,162 +1,205 @@
-import base64
+import json
 import logging
-from datetime import datetime
-from io import BytesIO
-from typing import Annotated
+import os
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+from typing import Annotated, Literal
 
-import pandas as pd
-import qrcode
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+import pytz
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import insert, select, func
+from jose import ExpiredSignatureError, JWTError, jwt
+from sqlalchemy import select
+from starlette.background import BackgroundTask
 
+from analytics import breakdown, check_in_rate
+from checkin import check_in, to_taipei_time
+from checkin_buffer import check_in_buffer
+from config import config
 from database import database, employee_table, notifications_table
-from models.employee import EmployeeCreate, EmployeeIn, EmployeeResponse, Notification, NotificationCreate, NotificationResponse
-from security import authenticate_user, create_access_token, get_current_employee, SECRET_KEY, ALGORITHM, credentials_exception
-from jose import ExpiredSignatureError, JWTError, jwt
-import pytz
+from importer import ImportFileError, import_roster, reimport_roster
+from jobs import JobQueueFullError, import_jobs
+from live import encode_event, hub
+from logging_config import sampled_logger
+from models.employee import (
+    CheckInResponse,
+    EmployeeCreate,
+    EmployeeIn,
+    EmployeeResponse,
+    ImportJob,
+    ImportReport,
+    Notification,
+    NotificationCreate,
+    NotificationResponse,
+    ReimportReport,
+)
+from notifications import latest_notification, notification_history, remember_latest
+from qrcodes import iter_zip, render_qr_code, render_qr_codes
+from replicas import replica_router
+from reports import iter_csv, write_xlsx
+from rosters import etag_matches, roster_cache, roster_etag, version_query
+from scans import scan_deduplicator
+from search import search_index
+from security import (
+    ALGORITHM,
+    SECRET_KEY,
+    authenticate_user,
+    create_access_token,
+    credentials_exception,
+    get_current_employee,
+    invalidate_identity,
+)
+from snapshots import compress, encode_rows, fetch_delta, fetch_snapshot
+from totals import add_check_in, read_totals, reconcile_totals
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-handler = logging.StreamHandler()
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+# The dashboards and group leaders poll these constantly; keep a sample.
+totals_logger = sampled_logger(logger, "get_total_of_participants")
+roster_logger = sampled_logger(logger, "get_team_members")
+notification_logger = sampled_logger(logger, "get_latest_notification")
+live_logger = sampled_logger(logger, "live_feed")
+analytics_logger = sampled_logger(logger, "analytics")
+snapshot_logger = sampled_logger(logger, "get_roster_delta")
+search_logger = sampled_logger(logger, "search_employees")
 
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-'''
-# Generate QR code for an employee
-# POST /api/v1/generate-qr-code
-'''
-def generate_qr_code(employee_data: EmployeeCreate):
-
-    # minimal_employee_data = {
-    #     "name": employee_data["name"],
-    #     "family_employee": employee_data["family_employee"],
-    #     "family_infant": employee_data["family_infant"],
-    #     "family_child": employee_data["family_child"],
-    #     "family_adult": employee_data["family_adult"],
-    #     "family_elderly": employee_data["family_elderly"],
-    #     "group": employee_data["group"],
-    #     "is_checked": employee_data["is_checked"],
-    # }
-
-    base_url = "http://127.0.0.1:8000/api/v1/employee/{mobile}/check-in"
-    check_in_url = base_url.format(mobile=employee_data["mobile"])
-
-    # data = json.dumps(minimal_employee_data, ensure_ascii=False)
-    file_path = f"qrcodes/qr_code_{employee_data['mobile']}.png"
-    render_file_path = f"/qrcodes/qr_code_{employee_data['mobile']}.png"
-    
-    
-
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_M,
-        box_size=10,
-        border=4,
-    )
+"""
+# Batch create employees
+# POST /api/v1/batch-create-employees
+# Request Body: EXCEL or CSV file with columns (name, company, department, mobile, group, family_employee, family_infant, family_child, family_adult, family_elderly)
+# Response Body: {"total_rows": 2, "inserted": 1, "rejected": 1, "errors": [{"row": 3, "errors": ["mobile is required"]}]}
+"""
 
-    # qr.add_data(data)
-    qr.add_data(check_in_url)
-    qr.make(fit=True)
 
-    # Create an image from the QR Code instance
-    img = qr.make_image(fill_color="black", back_color="white")
-    img.save(render_file_path)
+@router.post(
+    "/batch-create-employees",
+    response_model=ImportReport,
+    status_code=status.HTTP_201_CREATED,
+)
+async def batch_create_employees(file: UploadFile):
+    # Stream the uploaded EXCEL/CSV file into the database chunk by chunk
+    try:
+        report = await import_roster(file.file, file.filename or "")
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if report["inserted"]:
+        roster_cache.invalidate_all()
+        await search_index.refresh()
 
-    # Convert the image to a base64 string
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
+    return report
 
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
 
-    return img_str
+"""
+# Batch create employees in the background
+# POST /api/v1/employee/batch-create-employees/jobs
+# Request Body: EXCEL or CSV file, same columns as batch-create-employees
+# Response Body (202): {"id": "3f2c...", "filename": "roster.xlsx", "status": "queued", "total_rows": 0, "inserted": 0, "rejected": 0, "errors": [], "error": null, "created_at": "2021-08-01T04:00:00Z", "started_at": null, "finished_at": null}
+# Note: Poll GET /api/v1/employee/jobs/{id} for progress; 503 when too many imports are already waiting
+"""
 
 
-'''
-# Batch create employees
-# POST /api/v1/batch-create-employees
-# Request Body: EXCEL file with columns (name, company, department, mobile, group, family_employee, family_infant, family_child, family_adult, family_elderly)
-'''
 @router.post(
-    "/batch-create-employees",
-    response_model=str,
-    status_code=status.HTTP_201_CREATED,
+    "/batch-create-employees/jobs",
+    response_model=ImportJob,
+    status_code=status.HTTP_202_ACCEPTED,
 )
-async def batch_create_employees(file: UploadFile):
-    # Read the uploaded EXCEL file
+async def submit_import_job(file: UploadFile, request: Request, response: Response):
     try:
-        df = pd.read_excel(file.file, dtype={"mobile": str})
-        print("==df==", df.head())
-    except Exception as e:
+        job = await import_jobs.submit(file.file, file.filename or "")
+    except JobQueueFullError:
         raise HTTPException(
-            status_code=400, detail=f"Failed to process the uploaded file: {str(e)}"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many imports in progress, please try again later",
+            headers={"Retry-After": "30"},
         )
 
-    # Check if the required columns are present
-    required_columns = {
-        "name",
-        "company",
-        "department",
-        "mobile",
-        "group",
-        "family_employee",
-        "family_infant",
-        "family_child",
-        "family_adult",
-        "family_elderly",
-    }
-    if not required_columns.issubset(df.columns):
+    response.headers["Location"] = str(
+        request.url_for("get_import_job", job_id=job["id"])
+    )
+    return job
+
+
+"""
+# Progress of a background import
+# GET /api/v1/employee/jobs/{id}
+# Response Body: {"id": "3f2c...", "filename": "roster.xlsx", "status": "running", "total_rows": 4000, "inserted": 3990, "rejected": 10, "errors": [], "error": null, "created_at": "2021-08-01T04:00:00Z", "started_at": "2021-08-01T04:00:01Z", "finished_at": null}
+# Note: status is queued, running, succeeded or failed; row errors are listed once the job has finished
+"""
+
+
+@router.get("/jobs/{job_id}", response_model=ImportJob)
+async def get_import_job(job_id: str):
+    job = await import_jobs.get(job_id)
+    if job is None:
         raise HTTPException(
-            status_code=400,
-            detail=f"Missing required columns. Required: {required_columns}",
+            status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found"
         )
+    return job
+
+
+"""
+# Re-import an updated roster, applying only what changed
+# POST /api/v1/batch-reimport-employees?dry_run=true
+# Request Body: EXCEL or CSV file with the same columns as batch-create-employees
+# Response Body: {"dry_run": true, "total_rows": 3, "inserted": 1, "updated": 1, "restored": 0, "deleted": 1, "unchanged": 1, "rejected": 0, "errors": [], "changes": {"inserted": [{"row": 4, "mobile": "0912000004"}], "updated": [{"row": 2, "mobile": "0912000001", "restored": false, "changes": {"family_child": [1, 2]}}], "deleted": ["0912000003"]}}
+# Note: Rows are matched by mobile. Employees missing from the file are soft-deleted (is_deleted), check-ins are kept
+# Note: dry_run=true (the default) only reports the diff; send the same file with dry_run=false to apply it
+"""
 
-    # Read the EXCEL file and create a list of employee data
-    employees = []
-    for _, row in df.iterrows():
-        employee_data = {
-            "name": row["name"],
-            "mobile": row["mobile"],
-            "group": row["group"],
-            "company": row["company"],
-            "department": row["department"],
-            "family_employee": row["family_employee"],
-            "family_infant": row["family_infant"],
-            "family_child": row["family_child"],
-            "family_adult": row["family_adult"],
-            "family_elderly": row["family_elderly"],
-            "is_checked": False,
-            "is_deleted": False,
-            # "qr_code": generate_qr_code(row.to_dict()),
-        }
-        employees.append(employee_data)
-
-    # Insert the employee data into the database
-    query = insert(employee_table).values(employees)
-    await database.execute(query)
-
-    return "Batch employees data insert successfully"
-
-
-'''
+
+@router.post("/batch-reimport-employees", response_model=ReimportReport)
+async def batch_reimport_employees(file: UploadFile, dry_run: bool = True):
+    try:
+        report = await reimport_roster(file.file, file.filename or "", dry_run=dry_run)
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    changes = report["changes"]
+    if not dry_run and (
+        changes["inserted"] or changes["updated"] or changes["deleted"]
+    ):
+        for mobile in [update["mobile"] for update in changes["updated"]] + changes[
+            "deleted"
+        ]:
+            invalidate_identity(mobile)
+        roster_cache.invalidate_all()
+        await search_index.refresh()
+        hub.publish("totals", await read_totals())
+
+    return report
+
+
+"""
 # Create an employee
 # POST /api/v1/create-employees
 # Request Body: {"name": "Employee Name", "mobile": "Employee Mobile", "department": "Employee Department", "company": "Employee Company", "group": "Employee Group", "family_employee": 1, "family_infant": 1, "family_child": 1, "family_adult": 1, "family_elderly": 1}
-'''
+"""
+
+
 @router.post(
     "/create-employees",
     response_model=EmployeeResponse,
     status_code=status.HTTP_201_CREATED,
 )
 async def create_employee(employee: EmployeeCreate):
-    logger.info("Received request to create employee: %s", employee.model_dump_json())
-    
+    logger.info("Received request to create employee with mobile: %s", employee.mobile)
+
     query = employee_table.insert().values(
         name=employee.name,
         mobile=employee.mobile,
@@ -170,215 +213,681 @@ async def create_employee(employee: EmployeeCreate):
         group=employee.group,
         is_checked=employee.is_checked,
         is_deleted=employee.is_deleted,
+        updated_at=datetime.now(UTC),
     )
-    last_record_id = await database.execute(query)
+    async with database.transaction():
+        last_record_id = await database.execute(query)
+        if employee.is_checked:
+            await add_check_in(employee.model_dump())
     logger.info("Employee created successfully with name: %s", employee.name)
 
+    roster_cache.invalidate(employee.group)
+    search_index.apply(
+        {**employee.model_dump(), "id": last_record_id, "checked_in_time": None}
+    )
+
     return {**employee.model_dump(), "id": last_record_id}
 
 
-'''
+EMPLOYEE_FIELDS = list(EmployeeResponse.model_fields)
+
+
+def _employee_columns(fields: str | None):
+    if not fields:
+        return [employee_table.c[name] for name in EMPLOYEE_FIELDS]
+
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in EMPLOYEE_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {unknown}. Available: {EMPLOYEE_FIELDS}",
+        )
+    # The id is always returned, it is the pagination cursor.
+    return [employee_table.c.id] + [
+        employee_table.c[name] for name in names if name != "id"
+    ]
+
+
+def _dump_row(row) -> str:
+    return json.dumps(dict(row._mapping), ensure_ascii=False, separators=(",", ":"))
+
+
+async def _stream_employees(
+    query, output_format: str, limit: int | None = None
+) -> AsyncIterator[str]:
+    # Rows are encoded as they come off the database cursor, so memory stays
+    # flat and the first bytes go out before the whole roster is read.
+    if output_format == "ndjson":
+        rows, last_id = 0, None
+        async for row in replica_router.reader().iterate(query):
+            rows, last_id = rows + 1, row["id"]
+            yield _dump_row(row) + "\n"
+        # Headers are sent before the first row, so a full page ends with a
+        # cursor record instead of X-Next-Cursor.
+        if limit is not None and rows == limit:
+            yield json.dumps({"next_cursor": last_id}) + "\n"
+        return
+
+    separator = "["
+    async for row in replica_router.reader().iterate(query):
+        yield separator + _dump_row(row)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+"""
 # Get all employees
 # GET /api/v1/all-employees
-'''
+# Query Parameters (all optional):
+#   after: only return employees with id greater than this cursor
+#   limit: page size; the next cursor is returned in the X-Next-Cursor header,
+#          or with ndjson as a last line {"next_cursor": <id>}
+#   fields: comma separated list of fields to return, e.g. fields=name,mobile,group
+#   format: "json" (default) or "ndjson"
+#   stream: send rows as they are read from the database instead of one response body (implied by ndjson);
+#           a streamed JSON array cannot carry the next cursor, so it is refused together with limit
+"""
+
+
 @router.get("/all-employees", response_model=list[EmployeeResponse])
-async def get_all_employees():
-    
+async def get_all_employees(
+    after: int | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=10000)] = None,
+    fields: str | None = None,
+    format: Literal["json", "ndjson"] = "json",
+    stream: bool = False,
+):
+
     logger.info("Received request to fetch all employees")
 
-    query = employee_table.select()
-    employees = await database.fetch_all(query)
+    query = select(*_employee_columns(fields)).order_by(employee_table.c.id)
+    if after is not None:
+        query = query.where(employee_table.c.id > after)
+    if limit is not None:
+        query = query.limit(limit)
+
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_employees(query, format, limit), media_type="application/x-ndjson"
+        )
+    if stream:
+        if limit is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="A streamed JSON array has no place for the next cursor; page with format=ndjson",
+            )
+        return StreamingResponse(
+            _stream_employees(query, format), media_type="application/json"
+        )
+
+    employees = await replica_router.reader().fetch_all(query)
 
-    if not employees:
+    if not employees and after is None:
         logger.warning("No employees found in the database")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="No employees found"
         )
-        
-    logger.info(f"Successfully retrieved {len(employees)} employees")
 
-    return [EmployeeResponse(**employee) for employee in employees]
+    logger.info("Successfully retrieved %d employees", len(employees))
 
+    headers = {}
+    if limit is not None and len(employees) == limit:
+        headers["X-Next-Cursor"] = str(employees[-1]["id"])
+
+    # Rows are already exactly the response shape; skip building one
+    # EmployeeResponse per row.
+    return Response(
+        content="[" + ",".join(_dump_row(employee) for employee in employees) + "]",
+        media_type="application/json",
+        headers=headers,
+    )
 
-'''
+
+"""
 # Get employees by group
 # GET /api/v1/group/members/{group}
-'''
+# Response Headers: ETag; send it back as If-None-Match to get 304 Not Modified while the group is unchanged
+# Note: ETags are computed from the database, so any worker honours them
+"""
+
+
 @router.get("/group/members/{group}", response_model=list[EmployeeResponse])
-async def get_team_members(group: str):
-    
-    logger.info(f"Received request to fetch members of group: {group}")
-    
-    query = employee_table.select().where(employee_table.c.group == group)
-    
-    try:
-        employees = await database.fetch_all(query)
-    except Exception as e:
-        logger.error(f"Failed to fetch employees for group: {group}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to fetch employees",
-        ) 
+async def get_team_members(
+    group: str, if_none_match: Annotated[str | None, Header()] = None
+):
 
-    if not employees:
-        logger.warning(f"No employees found for group: {group}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="No employees found for group {group}"
+    roster_logger.info("Received request to fetch members of group: %s", group)
+
+    # A client that just wrote skips a roster that may have come from the replica
+    cached = None if replica_router.sticky() else roster_cache.get(group)
+    if cached is not None:
+        etag, body = cached
+    else:
+        reader = replica_router.reader()
+        query = (
+            select(*_employee_columns(None))
+            .where(employee_table.c.group == group)
+            .order_by(employee_table.c.id)
         )
-    
-    logger.info(f"Successfully retrieved {len(employees)} employees for group: {group}")
 
-    return [EmployeeResponse(**employee) for employee in employees]
+        try:
+            # Read before the roster, so the ETag is never newer than the body.
+            version = await reader.fetch_one(version_query(group))
+            etag = roster_etag(version)
+            if etag_matches(if_none_match, etag):
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={"ETag": etag, "Cache-Control": "no-cache"},
+                )
+            employees = await reader.fetch_all(query) if version[0] else []
+        except Exception:
+            logger.error("Failed to fetch employees for group: %s", group)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to fetch employees",
+            )
+
+        if not employees:
+            logger.warning("No employees found for group: %s", group)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No employees found for group {group}",
+            )
+
+        roster_logger.info(
+            "Successfully retrieved %d employees for group: %s", len(employees), group
+        )
+
+        body = (
+            "[" + ",".join(_dump_row(employee) for employee in employees) + "]"
+        ).encode("utf-8")
+        roster_cache.store(group, etag, body)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
-'''
+"""
 # Get the total number of participants
 # GET /api/v1/total/participants
 # Response Body: {"total_employee": 1, "total_infant": 1, "total_child": 1, "total_adult": 1, "total_elderly": 1}
 # Note: The response body should contain the total number of participants for each category
 # (employee, infant, child, adult, elderly)
-'''
+"""
+
+
 @router.get("/total/participants", response_model=dict)
 async def get_total_of_participants():
-    
-    logger.info("Received request to calculate total participants")
-
-    query = select(
-        func.sum(employee_table.c.family_employee).label("total_employee"),
-        func.sum(employee_table.c.family_infant).label("total_infant"),
-        func.sum(employee_table.c.family_child).label("total_child"),
-        func.sum(employee_table.c.family_adult).label("total_adult"),
-        func.sum(employee_table.c.family_elderly).label("total_elderly"),
-    ).where(employee_table.c.is_checked == True)
-
-    result = await database.fetch_one(query)
-    
-    response = {
-            "total_employee": result["total_employee"] or 0,
-            "total_infant": result["total_infant"] or 0,
-            "total_child": result["total_child"] or 0,
-            "total_adult": result["total_adult"] or 0,
-            "total_elderly": result["total_elderly"] or 0,
-        }
 
-    logger.info(f"Response data: {response}")
+    totals_logger.info("Received request to calculate total participants")
+
+    response = await read_totals()
+
+    totals_logger.info("Response data: %s", response)
+
+    return response
+
+
+"""
+# Rebuild the participant totals from the employee table
+# POST /api/v1/total/participants/reconcile
+# Response Body: {"total_employee": 1, "total_infant": 1, "total_child": 1, "total_adult": 1, "total_elderly": 1}
+"""
+
+
+@router.post("/total/participants/reconcile", response_model=dict)
+async def reconcile_total_of_participants():
+
+    logger.info("Received request to reconcile total participants")
+
+    response = await reconcile_totals()
+
+    logger.info("Reconciled participant totals: %s", response)
 
     return response
 
 
-'''
+"""
+# Attendance per company, department or group
+# GET /api/v1/employee/analytics/breakdown?by=group
+# Response Body: {"by": "group", "as_of": "2021-08-01T12:00:00+08:00", "rows": [{"group": "A", "families": 30, "checked_in_families": 12, "checked_in_employee": 12, "checked_in_infant": 1, "checked_in_child": 8, "checked_in_adult": 10, "checked_in_elderly": 2, "check_in_rate": 0.4}]}
+# Note: Results are cached for a few seconds (ANALYTICS_CACHE_TTL_SECONDS)
+"""
+
+
+@router.get("/analytics/breakdown", response_model=dict)
+async def get_attendance_breakdown(
+    by: Literal["group", "company", "department"] = "group",
+):
+
+    analytics_logger.info("Received request for the attendance breakdown by %s", by)
+
+    return await breakdown(by)
+
+
+"""
+# Check-ins over time
+# GET /api/v1/employee/analytics/check-ins?bucket_minutes=1&since=2021-08-01T08:00:00%2B08:00
+# Query Parameters (all optional):
+#   bucket_minutes: bucket width in minutes, aligned to Taipei time (default 1)
+#   since, until: only count check-ins in [since, until); times without an offset are Taipei time
+# Response Body: {"bucket_minutes": 1, "as_of": "2021-08-01T12:00:00+08:00", "buckets": [{"start": "2021-08-01T09:00+08:00", "check_ins": 42, "people": 130}]}
+"""
+
+
+@router.get("/analytics/check-ins", response_model=dict)
+async def get_check_in_rate(
+    bucket_minutes: Annotated[int, Query(ge=1, le=1440)] = 1,
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+
+    analytics_logger.info(
+        "Received request for check-ins per %d minutes", bucket_minutes
+    )
+
+    return await check_in_rate(bucket_minutes, since, until)
+
+
+"""
+# Live feed of notifications and attendance totals (Server-Sent Events)
+# GET /api/v1/employee/live
+# Events: "totals" with the participant totals, "notification" with a newly created notification
+"""
+
+
+@router.get("/live")
+async def live_feed():
+
+    live_logger.info("Received live feed subscription")
+
+    initial = encode_event("totals", await read_totals())
+    subscriber = hub.subscribe()
+
+    return StreamingResponse(
+        hub.stream(subscriber, config.LIVE_HEARTBEAT_SECONDS, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _snapshot_response(
+    body: bytes, version: int, accept_encoding: str | None
+) -> Response:
+    headers = {
+        "X-Snapshot-Version": str(version),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if accept_encoding and "gzip" in accept_encoding.lower():
+        body = compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+"""
+# Compact roster snapshot for the gate check-in devices
+# GET /api/v1/employee/snapshot
+# Response Body: {"version": 1723000000000000, "count": 1, "dictionaries": {"department": ["IT"], "company": ["Legacy"], "group": ["A"]}, "columns": {"id": [1], "name": ["Employee Name"], "department": [0], ..., "is_checked": [0], "checked_in_time": [null]}}
+# Response Headers: X-Snapshot-Version; gzip encoded when the client sends Accept-Encoding: gzip
+# Note: Dictionary columns hold indexes into "dictionaries", booleans are 0/1 and check-in times are Unix seconds
+"""
+
+
+@router.get("/snapshot")
+async def get_roster_snapshot(accept_encoding: Annotated[str | None, Header()] = None):
+
+    logger.info("Received request for a roster snapshot")
+
+    version, rows = await fetch_snapshot()
+
+    logger.info(
+        "Encoded roster snapshot of %d employees at version %d", len(rows), version
+    )
+
+    return _snapshot_response(encode_rows(rows, version), version, accept_encoding)
+
+
+"""
+# Rows changed since a snapshot or an earlier delta
+# GET /api/v1/employee/snapshot/delta?since={version}
+# Response Body: same layout as /snapshot, deleted employees included with "is_deleted": 1
+# Note: Pass the returned "version" as the next "since"; rows are upserts keyed by "id"
+"""
+
+
+@router.get("/snapshot/delta")
+async def get_roster_delta(
+    since: Annotated[int, Query(ge=0)],
+    accept_encoding: Annotated[str | None, Header()] = None,
+):
+
+    snapshot_logger.info("Received request for roster changes since version %d", since)
+
+    version, rows = await fetch_delta(since)
+
+    snapshot_logger.info(
+        "Encoded %d changed employees at version %d", len(rows), version
+    )
+
+    return _snapshot_response(encode_rows(rows, version), version, accept_encoding)
+
+
+"""
+# Download the QR codes of all employees as a ZIP file
+# GET /api/v1/employee/qr-codes
+# Response Body: ZIP file with one qr_code_{mobile}.png per employee
+"""
+
+
+@router.get("/qr-codes")
+async def export_qr_codes():
+
+    logger.info("Received request to export all QR codes")
+
+    query = (
+        employee_table.select()
+        .with_only_columns(employee_table.c.mobile)
+        .where(employee_table.c.is_deleted == False)
+    )
+    mobiles = [row["mobile"] for row in await database.fetch_all(query)]
+
+    if not mobiles:
+        logger.warning("No employees found in the database")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No employees found"
+        )
+
+    paths = await render_qr_codes(mobiles)
+
+    logger.info("Streaming %d QR codes", len(paths))
+
+    return StreamingResponse(
+        iter_zip((f"qr_code_{mobile}.png", path) for mobile, path in paths.items()),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="qr_codes.zip"'},
+    )
+
+
+"""
+# Get the QR code of an employee
+# GET /api/v1/employee/qr-codes/{mobile}
+# Response Body: PNG image encoding the employee's check-in URL
+"""
+
+
+@router.get("/qr-codes/{mobile}")
+async def get_qr_code(
+    mobile: str, current_employee: Annotated[EmployeeIn, Depends(get_current_employee)]
+):
+
+    logger.info("Received request to get QR code for mobile: %s", mobile)
+
+    if mobile != current_employee.mobile:
+        logger.warning(
+            "Unauthorized QR code access attempt by mobile: %s for employee: %s",
+            current_employee.mobile,
+            mobile,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="You are not authorized to view this QR code",
+        )
+
+    path = await render_qr_code(mobile)
+
+    return FileResponse(
+        path,
+        media_type="image/png",
+        headers={"Cache-Control": "private, max-age=86400"},
+    )
+
+
+"""
+# Export the attendance report
+# GET /api/v1/employee/reports/attendance?format=xlsx
+# GET /api/v1/employee/reports/attendance?format=csv&sheet=group
+# Query Parameters (all optional):
+#   format: "xlsx" (default) with the attendance sheet plus one summary sheet per company, department and group, or "csv" with one of them
+#   sheet: for CSV, "attendance" (default), "company", "department" or "group"
+# Summary columns: families, checked_in_families, checked_in_employee, checked_in_infant, checked_in_child, checked_in_adult, checked_in_elderly
+"""
+
+
+@router.get("/reports/attendance")
+async def export_attendance_report(
+    format: Literal["xlsx", "csv"] = "xlsx",
+    sheet: Literal["attendance", "company", "department", "group"] = "attendance",
+):
+
+    logger.info("Received request to export the attendance report as %s", format)
+
+    if format == "csv":
+        return StreamingResponse(
+            iter_csv(sheet),
+            media_type="text/csv; charset=utf-8",
+            headers={
+                "Content-Disposition": f'attachment; filename="attendance_{sheet}.csv"'
+            },
+        )
+
+    path = await write_xlsx()
+
+    logger.info("Attendance report written, streaming %d bytes", os.path.getsize(path))
+
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename="attendance.xlsx",
+        background=BackgroundTask(os.unlink, path),
+    )
+
+
+"""
+# Get earlier notifications, newest first
+# GET /api/v1/employee/notifications?before={id}&limit=20
+# Response Body: [{"id": 2, "title": "Notification Title", "message": "Notification Message", "created_at": "2021-08-01 12:00:00"}, ...]
+# Response Headers: X-Next-Cursor, pass it as "before" to get the next page
+# Note: Declared ahead of /{mobile}, which would otherwise match /notifications
+"""
+
+
+@router.get("/notifications", response_model=list[NotificationResponse])
+async def get_notifications(
+    before: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+
+    logger.info("Received request for notifications before: %s", before)
+
+    notifications = await notification_history(before, limit)
+
+    headers = {}
+    if len(notifications) == limit:
+        headers["X-Next-Cursor"] = str(notifications[-1]["id"])
+
+    return Response(
+        content="["
+        + ",".join(_dump_row(notification) for notification in notifications)
+        + "]",
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+"""
+# Search employees for the help desk by part of the name or of the mobile
+# GET /api/v1/employee/search?q=1234&limit=10
+# Response Body: [{"id": 1, "name": "Employee Name", "mobile": "0912341234", "department": "Employee Department", "company": "Employee Company", "group": "Employee Group", "family_employee": 1, "family_infant": 1, "family_child": 1, "family_adult": 1, "family_elderly": 1, "is_checked": true, "checked_in_time": "2021-08-01T12:00:00+08:00"}]
+# Note: Mobile searches need at least 3 digits; exact and trailing-digit matches come first
+"""
+
+
+@router.get("/search", response_model=list[dict])
+async def search_employees(
+    q: Annotated[str, Query(min_length=1, max_length=50)],
+    limit: Annotated[int, Query(ge=1, le=50)] = 10,
+):
+
+    search_logger.info("Received employee search for %r", q)
+
+    matches = await search_index.search(q, limit)
+    for match in matches:
+        match["is_checked"] = bool(match["is_checked"])
+        match["checked_in_time"] = to_taipei_time(match["checked_in_time"])
+    return matches
+
+
+"""
 # Get an employee by mobile
 # GET /api/v1/employee/{mobile}
 # Response Body: {"id": 1, "name": "Employee Name", "mobile": "Employee Mobile", "department": "Employee Department", "company": "Employee Company", "group": "Employee Group", "family_employee": 1, "family_infant": 1, "family_child": 1, "family_adult": 1, "family_elderly": 1, "is_checked": true, "is_deleted": false, "checked_in_time": "2021-08-01 12:00:00"}
-'''
+"""
+
+
 @router.get("/{mobile}", response_model=EmployeeResponse)
-async def get_employee(mobile: str, current_employee: Annotated[EmployeeIn, Depends(get_current_employee)]):
-    
-    logger.info(f"Received request to get employee with mobile: {mobile}")
-    
+async def get_employee(
+    mobile: str, current_employee: Annotated[EmployeeIn, Depends(get_current_employee)]
+):
+
+    logger.info("Received request to get employee with mobile: %s", mobile)
+
     if mobile != current_employee.mobile:
         logger.warning(
-            f"Unauthorized access attempt by mobile: {current_employee.mobile} for employee: {mobile}"
+            "Unauthorized access attempt by mobile: %s for employee: %s",
+            current_employee.mobile,
+            mobile,
         )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="You are not authorized to view this employee",
         )
-        
+
     query = employee_table.select().where(employee_table.c.mobile == mobile)
     employee = await database.fetch_one(query)
 
     if not employee:
-        logger.warning(f"Employee with mobile: {mobile} not found")
+        logger.warning("Employee with mobile: %s not found", mobile)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Employee not found"
         )
-    
-    logger.info(f"Successfully retrieved employee with mobile: {mobile}")
+
+    logger.info("Successfully retrieved employee with mobile: %s", mobile)
 
     return EmployeeResponse(**employee)
 
 
-'''
+"""
 # Check in an employee
 # POST /api/v1/employee/{mobile}/check-in
-# Response Body: {"id": 1, "name": "Employee Name", "mobile": "Employee Mobile", "department": "Employee Department", "company": "Employee Company", "group": "Employee Group", "family_employee": 1, "family_infant": 1, "family_child": 1, "family_adult": 1, "family_elderly": 1, "is_checked": true, "is_deleted": false, "checked_in_time": "2021-08-01 12:00:00"}
-'''
-@router.post("/{mobile}/check-in", response_model=EmployeeResponse, status_code=200)
+# Response Body: {"id": 1, "name": "Employee Name", "mobile": "Employee Mobile", "department": "Employee Department", "company": "Employee Company", "group": "Employee Group", "family_employee": 1, "family_infant": 1, "family_child": 1, "family_adult": 1, "family_elderly": 1, "is_checked": true, "is_deleted": false, "checked_in_time": "2021-08-01T12:00:00+08:00", "already_checked_in": false, "message": "Checked in at 2021-08-01 12:00:00"}
+# Note: Checking in again is idempotent, it returns the original check-in with "already_checked_in": true
+# Note: Repeat scans within CHECK_IN_DEDUP_WINDOW_SECONDS are answered from memory without a database write
+# Note: With CHECK_IN_BUFFER enabled the check-in is acknowledged from a local journal and written to the database shortly after
+"""
+
+
+@router.post("/{mobile}/check-in", response_model=CheckInResponse, status_code=200)
 async def check_in_employee(
     mobile: str,
     current_employee: Annotated[EmployeeIn, Depends(get_current_employee)],
 ):
-    
-    logger.info(f"Received check-in request for employee with mobile: {mobile}")
-    
+
+    logger.info("Received check-in request for employee with mobile: %s", mobile)
+
     if mobile != current_employee.mobile:
         logger.warning(
-            f"Unauthorized check-in attempt by mobile: {current_employee.mobile} for employee: {mobile}"
+            "Unauthorized check-in attempt by mobile: %s for employee: %s",
+            current_employee.mobile,
+            mobile,
         )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="You are not authorized to check in this employee",
         )
 
-    query = employee_table.select().where(
-        employee_table.c.mobile == current_employee.mobile
-    )
-    employee = await database.fetch_one(query)
+    tz = pytz.timezone("Asia/Taipei")
+    if check_in_buffer.running:
+        # Acknowledged from the local journal, written to the database in batches
+        employee, newly_checked_in = check_in_buffer.check_in(
+            current_employee, datetime.now(tz)
+        )
+    else:
+        # Repeat scans within the dedup window are answered from memory
+        employee, newly_checked_in = await scan_deduplicator.check_in(
+            mobile, lambda: check_in(mobile, datetime.now(tz))
+        )
 
     if not employee:
-        logger.warning(f"Employee with mobile: {mobile} not found")
+        logger.warning("Employee with mobile: %s not found", mobile)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Employee not found"
         )
 
-    tz = pytz.timezone("Asia/Taipei")
-    taipei_time = datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
+    checked_in_time = to_taipei_time(employee["checked_in_time"])
+
+    if newly_checked_in:
+        search_index.checked_in(mobile, checked_in_time)
+        # The buffer's flusher does this once per batch instead.
+        if not check_in_buffer.running:
+            invalidate_identity(mobile)
+            roster_cache.invalidate(employee["group"])
+            hub.publish("totals", await read_totals())
+        message = f"Checked in at {checked_in_time:%Y-%m-%d %H:%M:%S}"
+        logger.info(
+            "Employee with mobile: %s checked in at %s", mobile, checked_in_time
+        )
+    else:
+        message = f"Already checked in at {checked_in_time:%Y-%m-%d %H:%M:%S}"
+        logger.info(
+            "Employee with mobile: %s already checked in at %s", mobile, checked_in_time
+        )
 
-    update_query = (
-        employee_table.update()
-        .where(employee_table.c.mobile == current_employee.mobile)
-        .values(is_checked=True, checked_in_time=taipei_time)
+    return CheckInResponse(
+        **{**employee, "checked_in_time": checked_in_time},
+        already_checked_in=not newly_checked_in,
+        message=message,
     )
-    await database.execute(update_query)
-
-    updated_employee = await database.fetch_one(query)
-    
-    logger.info(f"Employee with mobile: {mobile} checked in at {taipei_time}")
 
-    return EmployeeResponse(**updated_employee)
 
-
-'''
+"""
 # Generate JWT token for an employee to check in
 # POST /api/v1/employee/token
 # Request Body: {"mobile": "employee_mobile"}
-'''
+"""
+
+
 @router.post("/token")
 async def login(employee: EmployeeIn):
-    
-    logger.info(f"Received login request for mobile: {employee.mobile}")
-    
+
+    logger.info("Received login request for mobile: %s", employee.mobile)
+
     employee = await authenticate_user(employee.mobile)
     access_token = create_access_token(employee.mobile)
-    
-    logger.info(f"Generated access token for mobile: {employee.mobile}")
+
+    logger.info("Generated access token for mobile: %s", employee.mobile)
 
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-'''
+"""
 # Verify the access token
 # POST /api/v1/token/verify
-'''
+"""
+
+
 @router.post("/token/verify")
 async def verify_token(token: Annotated[str, Depends(oauth2_scheme)]):
-    
+
     logger.info("Received request to verify token")
-    
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        logger.info(f"Token verified successfully: {payload}")
+        logger.info("Token verified successfully for mobile: %s", payload.get("sub"))
         return payload
     except ExpiredSignatureError as e:
         logger.warning("Token has expired")
@@ -388,67 +897,65 @@ async def verify_token(token: Annotated[str, Depends(oauth2_scheme)]):
             headers={"WWW-Authenticate": "Bearer"},
         ) from e
     except JWTError as e:
-        logger.error(f"Invalid token: {str(e)}")
+        logger.error("Invalid token: %s", e)
         raise credentials_exception from e
 
 
-'''
+"""
 # Create a notification
 # POST /api/v1/notifications
 # Request Body: {"title": "Notification Title", "message": "Notification Message"}
 # Response Body: {"id": 1, "title": "Notification Title", "message": "Notification Message", "created_at": "2021-08-01 12:00:00"}
-'''
+"""
+
+
 @router.post("/notifications", response_model=NotificationResponse)
 async def create_notification(notification: NotificationCreate):
-    
-    # Logging 請求數據
-    logger.info(f"Received notification creation request: {notification.model_dump_json()}")
-    
+
+    logger.info("Received notification creation request: %s", notification.title)
+
     tz = pytz.timezone("Asia/Taipei")
     taipei_time = datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
-    
+
     query = notifications_table.insert().values(
-        title=notification.title,
-        message=notification.message,
-        created_at=taipei_time
+        title=notification.title, message=notification.message, created_at=taipei_time
     )
-    
+
     last_record_id = await database.execute(query)
-    logger.info(f"Notification created with ID: {last_record_id}")
-    
+    logger.info("Notification created with ID: %s", last_record_id)
+
     response = {
         "id": last_record_id,
         "title": notification.title,
         "message": notification.message,
         "created_at": taipei_time,
     }
-    
-    logger.info(f"Notification created successfully: {response}")
-    
+
+    logger.debug("Notification created successfully: %s", response)
+
+    remember_latest(response)
+    hub.publish("notification", response)
+
     return response
 
 
-'''
+"""
 # Get the latest notification
 # GET /api/v1/notifications/latest
 # Response Body: {"id": 1, "title": "Notification Title", "message": "Notification Message", "created_at": "2021-08-01 12:00:00"}
-'''
+"""
+
+
 @router.get("/notifications/latest", response_model=Notification)
 async def get_latest_notification():
-    
-    logger.info("Received request to fetch the latest notification")
-    
-    query = (
-        notifications_table.select()
-        .order_by(notifications_table.c.created_at.desc())
-        .limit(1)
-    )
-    result = await database.fetch_one(query)
+
+    notification_logger.info("Received request to fetch the latest notification")
+
+    result = await latest_notification()
     if not result:
         logger.warning("No notifications found")
         raise HTTPException(status_code=404, detail="目前沒有任何公告")
-    
-    logger.info(f"Latest notification fetched successfully")
-    
-    return result
 
+    notification_logger.info("Latest notification fetched successfully")
+
+    return result
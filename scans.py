@@ -0,0 +1,84 @@
+"""
+De-duplication of repeated QR code scans.
+
+Gate scanners and attendees often scan the same code several times within a
+few seconds. The first scan checks the employee in; repeats within
+`CHECK_IN_DEDUP_WINDOW_SECONDS` are answered from memory with the original
+check-in, marked as already checked in, without touching the database.
+Scans that arrive while the first one is still being written wait for it
+instead of sending their own UPDATE.
+
+Per worker, like every cache here: a repeat that lands on another worker
+still goes to the database, where the conditional UPDATE keeps it from
+checking anyone in twice.
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from cache import TTLCache
+from config import config
+from metrics import Counter, registry
+
+check_in_scans_deduplicated = registry.register(
+    Counter(
+        "check_in_scans_deduplicated_total",
+        "Repeat check-in scans answered without a database write.",
+        labels=("source",),
+    )
+)
+
+CheckIn = Callable[[], Awaitable[tuple[object | None, bool]]]
+
+
+class ScanDeduplicator:
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.recent = TTLCache(max_size=max_size, ttl=window)
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.suppressed = 0
+
+    def _suppressed(self, source: str):
+        self.suppressed += 1
+        check_in_scans_deduplicated.inc(source)
+
+    async def check_in(
+        self, mobile: str, check_in: CheckIn
+    ) -> tuple[object | None, bool]:
+        """
+        `check_in()`'s `(employee, newly_checked_in)` for the first scan of
+        `mobile` in the window, `(employee, False)` for the repeats.
+        """
+        if self.window <= 0:
+            return await check_in()
+
+        employee = self.recent.get(mobile)
+        if employee is not None:
+            self._suppressed("recent")
+            return employee, False
+
+        task = self._inflight.get(mobile)
+        if task is None:
+            # Its own task, so a scanner that disconnects does not cancel the
+            # write the other scans are waiting on.
+            task = self._inflight[mobile] = asyncio.ensure_future(check_in())
+            task.add_done_callback(lambda task: self._finish(mobile, task))
+            return await asyncio.shield(task)
+
+        self._suppressed("in_flight")
+        employee, _ = await asyncio.shield(task)
+        return employee, False
+
+    def _finish(self, mobile: str, task: asyncio.Task):
+        del self._inflight[mobile]
+        # exception() also marks a failure as retrieved when nobody was waiting.
+        if task.cancelled() or task.exception() is not None:
+            return
+        employee, _ = task.result()
+        if employee is not None:
+            self.recent.set(mobile, employee)
+
+
+scan_deduplicator = ScanDeduplicator(
+    window=config.CHECK_IN_DEDUP_WINDOW_SECONDS, max_size=config.CHECK_IN_DEDUP_MAX_SIZE
+)
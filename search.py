@@ -0,0 +1,269 @@
+"""
+In-process search over names and mobiles for the help desk.
+
+Attendees who forgot their phone are looked up by part of their name or a
+few digits of their mobile, usually the last ones. A `LIKE '%...%'` query
+cannot use an index and scans the whole roster on every keystroke, so each
+worker keeps an n-gram index instead:
+
+- names are NFKC normalized, case folded and stripped of spaces, and indexed
+  by single characters and bigrams; a two or three character Chinese name
+  needs both for one character surname searches;
+- mobiles are reduced to their digits and indexed by trigrams, so any three
+  or more consecutive digits, the last four included, find them.
+
+Posting lists are `array("i")` of row slots, four bytes an entry; Python
+sets would take about fifteen times that. A query intersects the two
+shortest posting lists of its n-grams and checks the few candidates left for
+the actual substring before ranking them.
+
+The index is built from the roster snapshot at start-up and kept current
+from the same `updated_at` deltas the gate tablets use, at most
+`SEARCH_REFRESH_SECONDS` behind other workers' writes. Writes made by this
+worker (creates, check-ins) are applied immediately.
+"""
+
+import asyncio
+import heapq
+import time
+import unicodedata
+from array import array
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+
+from config import config
+from snapshots import COLUMNS, fetch_delta, fetch_snapshot
+
+# Everything but is_deleted, which is never kept in the index.
+FIELDS = [name for name in COLUMNS if name != "is_deleted"]
+_NAME = FIELDS.index("name")
+_MOBILE = FIELDS.index("mobile")
+_IS_CHECKED = FIELDS.index("is_checked")
+_CHECKED_IN_TIME = FIELDS.index("checked_in_time")
+
+MIN_MOBILE_DIGITS = 3
+
+
+def normalize_name(value: str) -> str:
+    return "".join(unicodedata.normalize("NFKC", value or "").casefold().split())
+
+
+def normalize_mobile(value: str) -> str:
+    return "".join(character for character in value or "" if character.isdigit())
+
+
+def name_grams(name: str) -> set[str]:
+    return set(name) | {name[i : i + 2] for i in range(len(name) - 1)}
+
+
+def mobile_grams(mobile: str) -> set[str]:
+    return {
+        mobile[i : i + MIN_MOBILE_DIGITS]
+        for i in range(len(mobile) - MIN_MOBILE_DIGITS + 1)
+    }
+
+
+def _grams(key: tuple[str, str]) -> set[str]:
+    # Mobile grams are prefixed so "123" as a name never matches a mobile.
+    name, mobile = key
+    return name_grams(name) | {"#" + gram for gram in mobile_grams(mobile)}
+
+
+def _reuse(normalized: str, original: str) -> str:
+    # Most names and mobiles are already normalized; share the row's string
+    # instead of keeping a second copy.
+    return original if normalized == original else normalized
+
+
+class _Postings:
+    """Slots of the rows and the n-gram posting lists; built off the event loop."""
+
+    def __init__(self, rows):
+        self.rows: list[tuple | None] = []
+        # Normalized (name, mobile) per slot, for matching and ranking.
+        self.keys: list[tuple[str, str] | None] = []
+        self.by_id: dict[int, int] = {}
+        self.by_mobile: dict[str, int] = {}
+        self.grams: dict[str, array] = {}
+        self.free: list[int] = []
+        for row in rows:
+            self.put(tuple(row[name] for name in FIELDS))
+
+    def put(self, row: tuple):
+        slot = self.by_id.get(row[0])
+        if slot is not None:
+            old = self.rows[slot]
+            if old[_NAME] == row[_NAME] and old[_MOBILE] == row[_MOBILE]:
+                # Check-ins and the like; the n-grams stay as they are.
+                self.rows[slot] = row
+                return
+            self.remove(row[0])
+
+        key = (
+            _reuse(normalize_name(row[_NAME]), row[_NAME]),
+            _reuse(normalize_mobile(row[_MOBILE]), row[_MOBILE]),
+        )
+        slot = self.free.pop() if self.free else len(self.rows)
+        if slot == len(self.rows):
+            self.rows.append(row)
+            self.keys.append(key)
+        else:
+            self.rows[slot] = row
+            self.keys[slot] = key
+        self.by_id[row[0]] = slot
+        self.by_mobile[row[_MOBILE]] = slot
+        for gram in _grams(key):
+            postings = self.grams.get(gram)
+            if postings is None:
+                postings = self.grams[gram] = array("i")
+            postings.append(slot)
+
+    def remove(self, employee_id: int):
+        slot = self.by_id.pop(employee_id, None)
+        if slot is None:
+            return
+        row, key = self.rows[slot], self.keys[slot]
+        self.rows[slot] = self.keys[slot] = None
+        self.free.append(slot)
+        if self.by_mobile.get(row[_MOBILE]) == slot:
+            del self.by_mobile[row[_MOBILE]]
+        for gram in _grams(key):
+            slots = self.grams.get(gram)
+            if slots is not None:
+                # Linear, but posting lists are short and removals rare.
+                slots.remove(slot)
+                if not slots:
+                    del self.grams[gram]
+
+
+class SearchIndex:
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.version: int | None = None
+        self._postings = _Postings([])
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+        self.builds = 0
+        self.refreshes = 0
+        self.queries = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.version is not None
+
+    async def build(self):
+        """Index the whole roster; searches keep using the old index meanwhile."""
+        async with self._lock:
+            await self._build()
+
+    async def _build(self):
+        version, rows = await fetch_snapshot()
+        self._postings = await run_in_threadpool(_Postings, rows)
+        self.version = version
+        self._refreshed_at = time.monotonic()
+        self.builds += 1
+
+    async def refresh(self):
+        """Apply the rows changed since the last build or refresh."""
+        async with self._lock:
+            if not self.ready:
+                await self._build()
+                return
+
+            version, rows = await fetch_delta(self.version)
+            for row in rows:
+                self.apply(row)
+            self.version = version
+            self._refreshed_at = time.monotonic()
+            self.refreshes += 1
+
+    async def _refresh_if_stale(self):
+        if time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        if self.ready and self._lock.locked():
+            # Another request is already refreshing; answer from what we have.
+            return
+        await self.refresh()
+
+    def apply(self, row):
+        """Add, update or (for deleted employees) drop one roster row."""
+        if row["is_deleted"]:
+            self._postings.remove(row["id"])
+        else:
+            self._postings.put(tuple(row[name] for name in FIELDS))
+
+    def checked_in(self, mobile: str, checked_in_time: datetime):
+        postings = self._postings
+        slot = postings.by_mobile.get(mobile)
+        if slot is None:
+            return
+        row = list(postings.rows[slot])
+        row[_IS_CHECKED] = True
+        row[_CHECKED_IN_TIME] = checked_in_time
+        postings.rows[slot] = tuple(row)
+
+    def _candidates(self, name: str, mobile: str) -> set[int]:
+        postings = self._postings
+        if mobile:
+            grams = ["#" + gram for gram in mobile_grams(mobile)]
+        elif len(name) == 1:
+            grams = [name]
+        else:
+            grams = [name[i : i + 2] for i in range(len(name) - 1)]
+
+        lists = sorted((postings.grams.get(gram, ()) for gram in grams), key=len)
+        if not lists or not lists[0]:
+            return set()
+        # The substring check does the rest of the filtering.
+        return set(lists[0]).intersection(*lists[1:2])
+
+    async def search(self, query: str, limit: int = 10) -> list[dict]:
+        """
+        Best matches for `query`, a name fragment or at least three digits of
+        a mobile. Mobiles matching exactly or at the end rank first, then names
+        matching exactly, then at the start, then anywhere.
+        """
+        await self._refresh_if_stale()
+        self.queries += 1
+
+        name = normalize_name(query)
+        # "0912-345", "+886 912" and the like are mobiles too.
+        is_mobile = any(c.isdigit() for c in name) and all(
+            c.isdigit() or c in "+-()" for c in name
+        )
+        mobile = normalize_mobile(name) if is_mobile else ""
+        if not name or (mobile and len(mobile) < MIN_MOBILE_DIGITS):
+            return []
+
+        ranked = []
+        postings = self._postings
+        for slot in self._candidates(name, mobile):
+            row_name, digits = postings.keys[slot]
+            if mobile:
+                if mobile not in digits:
+                    continue
+                rank = 0 if digits == mobile else 1 if digits.endswith(mobile) else 4
+            else:
+                if name not in row_name:
+                    continue
+                rank = 2 if row_name == name else 3 if row_name.startswith(name) else 4
+            ranked.append((rank, row_name, slot))
+
+        return [
+            dict(zip(FIELDS, postings.rows[slot]))
+            for *_, slot in heapq.nsmallest(limit, ranked)
+        ]
+
+    def stats(self) -> dict:
+        postings = self._postings
+        return {
+            "employees": len(postings.by_id),
+            "grams": len(postings.grams),
+            "builds": self.builds,
+            "refreshes": self.refreshes,
+            "queries": self.queries,
+        }
+
+
+search_index = SearchIndex(refresh_interval=config.SEARCH_REFRESH_SECONDS)
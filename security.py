@@ -8,6 +8,8 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import ExpiredSignatureError, JWTError, jwt
 
+from cache import TTLCache
+from config import config
 from database import database, employee_table
 
 logger = logging.getLogger(__name__)
@@ -19,6 +21,13 @@ ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 8
 
+# Authenticated employees keyed by token subject (mobile), so repeat requests
+# skip the get_user round trip. Anything that changes an employee row must
+# call invalidate_identity().
+identity_cache = TTLCache(
+    max_size=config.IDENTITY_CACHE_MAX_SIZE, ttl=config.IDENTITY_CACHE_TTL_SECONDS
+)
+
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Could not validate credentials",
@@ -31,8 +40,8 @@ def access_token_expire_minutes() -> int:
 
 
 def create_access_token(mobile: str):
-    logger.debug("Creating access token", mobile={"mobile": mobile})
-    expire = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+    logger.debug("Creating access token for mobile: %s", mobile)
+    expire = datetime.datetime.now(datetime.UTC) + datetime.timedelta(
         minutes=ACCESS_TOKEN_EXPIRE_MINUTES
     )
     jwt_data = {"sub": mobile, "exp": expire}
@@ -42,7 +51,7 @@ def create_access_token(mobile: str):
 
 
 async def get_user(mobile: str):
-    logger.debug("Getting user from the database", mobile={"mobile": mobile})
+    logger.debug("Getting user from the database for mobile: %s", mobile)
     query = employee_table.select().where(employee_table.c.mobile == mobile)
     result = await database.fetch_one(query)
 
@@ -51,7 +60,7 @@ async def get_user(mobile: str):
 
 
 async def authenticate_user(mobile: str):
-    logger.debug("Authenticating user", mobile={"mobile": mobile})
+    logger.debug("Authenticating user with mobile: %s", mobile)
     user = await get_user(mobile)
 
     if not user:
@@ -78,16 +87,26 @@ async def get_current_employee(token: Annotated[str, Depends(oauth2_scheme)]):
     except JWTError as e:
         raise credentials_exception from e
 
+    employee = identity_cache.get(mobile)
+    if employee is not None:
+        return employee
+
     employee = await get_user(mobile=mobile)
 
     if employee is None:
         raise credentials_exception
+
+    identity_cache.set(mobile, employee)
     return employee
 
+
+def invalidate_identity(mobile: str):
+    identity_cache.invalidate(mobile)
+
+
 async def verify_jwt_token(token: Annotated[str, Depends(oauth2_scheme)]):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print("==payload==", payload)
         return payload
     except ExpiredSignatureError as e:
         raise HTTPException(
@@ -0,0 +1,127 @@
+"""
+Compact roster snapshots and deltas for the gate check-in tablets.
+
+The payload is columnar JSON: one array per column instead of one object per
+employee, so field names are sent once. Department, company and group repeat
+across thousands of rows and are dictionary encoded (a list of distinct
+values plus an index per row). Booleans are sent as 0/1 and check-in times as
+Unix seconds. The route gzips the result, which is where most of the savings
+come from once the keys are gone.
+
+Versions are `updated_at` positions in microseconds since the epoch. A
+version is taken `SNAPSHOT_SAFETY_MARGIN_SECONDS` behind the clock before
+the rows are read, so a write whose transaction was still open is picked up
+by the next delta instead of being missed. The price is that consecutive
+deltas overlap slightly; devices apply rows as upserts keyed by `id`, so
+receiving a row twice is harmless.
+"""
+
+import gzip
+import json
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import select
+
+from checkin import to_taipei_time
+from config import config
+from database import database, employee_table
+
+COLUMNS = [
+    "id",
+    "name",
+    "mobile",
+    "department",
+    "company",
+    "group",
+    "family_employee",
+    "family_infant",
+    "family_child",
+    "family_adult",
+    "family_elderly",
+    "is_checked",
+    "checked_in_time",
+    "is_deleted",
+]
+DICTIONARY_COLUMNS = {"department", "company", "group"}
+BOOLEAN_COLUMNS = {"is_checked", "is_deleted"}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def current_version() -> int:
+    """Version a read started now is guaranteed to be complete up to."""
+    safe_point = datetime.now(UTC) - timedelta(
+        seconds=config.SNAPSHOT_SAFETY_MARGIN_SECONDS
+    )
+    return to_version(safe_point)
+
+
+def to_version(value: datetime) -> int:
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_version(version: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=version)
+
+
+def _checked_in_seconds(value: datetime | None) -> int | None:
+    value = to_taipei_time(value)
+    return None if value is None else int(value.timestamp())
+
+
+def encode_rows(rows, version: int) -> bytes:
+    """Columnar JSON for `rows`, see the module docstring for the layout."""
+    columns = {name: [] for name in COLUMNS}
+    dictionaries = {name: {} for name in COLUMNS if name in DICTIONARY_COLUMNS}
+
+    for row in rows:
+        for name in COLUMNS:
+            value = row[name]
+            if name in DICTIONARY_COLUMNS:
+                value = dictionaries[name].setdefault(value, len(dictionaries[name]))
+            elif name in BOOLEAN_COLUMNS:
+                value = int(bool(value))
+            elif name == "checked_in_time":
+                value = _checked_in_seconds(value)
+            columns[name].append(value)
+
+    payload = {
+        "version": version,
+        "count": len(columns["id"]),
+        # dicts keep insertion order, so the keys are already index ordered
+        "dictionaries": {name: list(values) for name, values in dictionaries.items()},
+        "columns": columns,
+    }
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+def compress(body: bytes) -> bytes:
+    # Level 6 gets nearly all of level 9's ratio on this data at a third of the CPU.
+    return gzip.compress(body, compresslevel=6)
+
+
+async def fetch_snapshot() -> tuple[int, list]:
+    """`(version, rows)` for every employee that is not deleted."""
+    version = current_version()
+    query = (
+        select(*[employee_table.c[name] for name in COLUMNS])
+        .where(employee_table.c.is_deleted == False)
+        .order_by(employee_table.c.id)
+    )
+    return version, await database.fetch_all(query)
+
+
+async def fetch_delta(since: int) -> tuple[int, list]:
+    """
+    `(version, rows)` changed at or after `since`, deleted ones included so
+    devices can drop them.
+    """
+    version = current_version()
+    query = (
+        select(*[employee_table.c[name] for name in COLUMNS])
+        .where(employee_table.c.updated_at >= from_version(since))
+        .order_by(employee_table.c.id)
+    )
+    return version, await database.fetch_all(query)
@@ -0,0 +1,79 @@
+"""Roster factories and test-only operations shared by the tests."""
+
+from datetime import UTC, datetime
+
+import pytest
+
+from checkin import SQLITE_HAS_RETURNING
+from config import config
+from database import database, employee_table, sqlite_writes
+from totals import TOTAL_COLUMNS, add_check_in, reconcile_totals
+
+postgres = pytest.mark.skipif(
+    not config.DATABASE_URL.startswith("postgres"),
+    reason="needs TEST_DATABASE_URL pointing at Postgres",
+)
+
+
+def employee(i: int, **values) -> dict:
+    return {
+        "name": f"Employee {i}",
+        "mobile": f"09{i:08d}",
+        "department": f"Department {i % 3}",
+        "company": f"Company {i % 2}",
+        "group": f"G{i % 5}",
+        "family_employee": 1,
+        "family_infant": i % 2,
+        "family_child": i % 3,
+        "family_adult": 2,
+        "family_elderly": i % 4 // 3,
+        "is_checked": False,
+        "is_deleted": False,
+        **values,
+    }
+
+
+async def seed(count: int, **values):
+    await database.execute(
+        employee_table.insert().values([employee(i, **values) for i in range(count)])
+    )
+    await reconcile_totals()
+
+
+async def undo_check_in(mobile: str) -> object | None:
+    """
+    Reverse a check-in and take the family off the running totals in the same
+    transaction, so tests can race reversals against check-ins. Returns the
+    employee, or None when nobody with this mobile was checked in.
+    """
+    now = datetime.now(UTC)
+    update_query = (
+        employee_table.update()
+        .where(employee_table.c.mobile == mobile, employee_table.c.is_checked == True)
+        .values(is_checked=False, checked_in_time=None, updated_at=now)
+    )
+    async with sqlite_writes(), database.transaction():
+        if database.url.dialect.startswith("postgres") or SQLITE_HAS_RETURNING:
+            employee = await database.fetch_one(
+                update_query.returning(*employee_table.c)
+            )
+        else:
+            await database.execute(update_query)
+            # The new updated_at identifies the row this update flipped.
+            employee = await database.fetch_one(
+                employee_table.select().where(
+                    employee_table.c.mobile == mobile,
+                    employee_table.c.is_checked == False,
+                    employee_table.c.updated_at == now,
+                )
+            )
+
+        if employee is not None:
+            await add_check_in(
+                {
+                    column.name: -(employee[column.name] or 0)
+                    for column in TOTAL_COLUMNS.values()
+                }
+            )
+
+    return employee
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+from helpers import seed
+
+from benchmarks.asgi_client import request
+from main import app
+
+pytestmark = pytest.mark.anyio
+
+URL = "/api/v1/employee/all-employees"
+
+
+async def test_ndjson_pages_end_with_the_next_cursor(db):
+    await seed(5)
+
+    ids, after = [], None
+    while True:
+        query = "?format=ndjson&limit=2&fields=name" + (
+            f"&after={after}" if after is not None else ""
+        )
+        response = await request(app, "GET", URL + query)
+        assert response["status"] == 200
+        lines = [json.loads(line) for line in response["body"].splitlines()]
+        if lines and "next_cursor" in lines[-1]:
+            after = lines.pop()["next_cursor"]
+            assert after == lines[-1]["id"]
+        else:
+            after = None
+        ids += [line["id"] for line in lines]
+        if after is None:
+            break
+
+    assert len(ids) == 5 and ids == sorted(ids)
+
+
+async def test_streamed_json_array_refuses_a_limit(db):
+    await seed(3)
+
+    response = await request(app, "GET", URL + "?stream=true&limit=2")
+    assert response["status"] == 400
+
+    response = await request(app, "GET", URL + "?stream=true")
+    assert response["status"] == 200
+    assert len(json.loads(response["body"])) == 3
@@ -0,0 +1,50 @@
+import json
+from datetime import datetime
+
+import pytest
+from helpers import employee, seed
+
+from analytics import analytics_cache
+from benchmarks.asgi_client import request
+from checkin import TAIPEI, check_in
+from main import app
+
+pytestmark = pytest.mark.anyio
+
+EMPLOYEES = 20
+CHECKED_IN = range(0, EMPLOYEES, 4)
+
+
+@pytest.mark.parametrize("by", ["company", "department", "group"])
+async def test_breakdown_endpoint(db, by):
+    analytics_cache.clear()
+    await seed(EMPLOYEES)
+    for i in CHECKED_IN:
+        await check_in(employee(i)["mobile"], datetime.now(TAIPEI))
+
+    response = await request(
+        app, "GET", f"/api/v1/employee/analytics/breakdown?by={by}"
+    )
+    assert response["status"] == 200
+    body = json.loads(response["body"])
+    assert body["by"] == by
+
+    expected = {}
+    for i in range(EMPLOYEES):
+        row = employee(i)
+        counts = expected.setdefault(
+            row[by], {"families": 0, "checked_in_families": 0, "checked_in_adult": 0}
+        )
+        counts["families"] += 1
+        if i in CHECKED_IN:
+            counts["checked_in_families"] += 1
+            counts["checked_in_adult"] += row["family_adult"]
+
+    rows = {row[by]: row for row in body["rows"]}
+    assert {
+        key: {name: row[name] for name in expected[key]} for key, row in rows.items()
+    } == expected
+    for row in rows.values():
+        assert row["check_in_rate"] == round(
+            row["checked_in_families"] / row["families"], 4
+        )
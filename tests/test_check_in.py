@@ -0,0 +1,93 @@
+import asyncio
+import sqlite3
+from collections import Counter
+from datetime import datetime
+
+import pytest
+from helpers import seed
+
+import routers.employee
+from benchmarks.asgi_client import request
+from checkin import SQLITE_HAS_RETURNING, TAIPEI, check_in
+from database import database, participant_totals_table
+from main import app
+from security import create_access_token
+from totals import TOTAL_COLUMNS, reconcile_totals
+
+pytestmark = pytest.mark.anyio
+
+EMPLOYEES = 100
+SCANS = 3
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    """Counts the statements sent to the database, by operation."""
+    counted = Counter()
+    timed = database._timed
+
+    def counting(operation, query, call):
+        counted[operation] += 1
+        return timed(operation, query, call)
+
+    monkeypatch.setattr(database, "_timed", counting)
+    return counted
+
+
+async def test_first_scan_is_one_round_trip(db, statements):
+    await seed(EMPLOYEES)
+    statements.clear()
+    mobiles = [f"09{i:08d}" for i in range(EMPLOYEES)]
+
+    results = await asyncio.gather(
+        *[check_in(mobile, datetime.now(TAIPEI)) for mobile in mobiles]
+    )
+
+    assert all(newly_checked_in for _, newly_checked_in in results)
+    if database.url.dialect.startswith("postgres"):
+        # The UPDATE ... RETURNING and the totals update are one statement.
+        assert statements == {"fetch_one": EMPLOYEES}
+    elif SQLITE_HAS_RETURNING:
+        # UPDATE ... RETURNING, then the totals UPDATE in the same transaction.
+        assert statements == {"fetch_one": EMPLOYEES, "execute": EMPLOYEES}
+
+
+async def test_concurrent_scans_check_everyone_in_exactly_once(db):
+    await seed(EMPLOYEES)
+    mobiles = [f"09{i:08d}" for i in range(EMPLOYEES)] * SCANS
+
+    results = await asyncio.gather(
+        *[check_in(mobile, datetime.now(TAIPEI)) for mobile in mobiles]
+    )
+
+    assert all(employee is not None for employee, _ in results)
+    newly = Counter(
+        employee["mobile"] for employee, newly_checked_in in results if newly_checked_in
+    )
+    assert len(newly) == EMPLOYEES
+    assert set(newly.values()) == {1}
+
+    row = await database.fetch_one(participant_totals_table.select())
+    totals = await reconcile_totals()
+    assert {total: row[total] for total in TOTAL_COLUMNS} == totals
+    assert totals["total_employee"] == EMPLOYEES
+
+
+async def test_locked_database_answers_503(db, monkeypatch):
+    await seed(1)
+    mobile = "0900000000"
+
+    async def locked():
+        raise sqlite3.OperationalError("database is locked")
+
+    async def check_in_while_locked(mobile, checked_in_time):
+        return await database._timed("fetch_one", "text", locked())
+
+    monkeypatch.setattr(routers.employee, "check_in", check_in_while_locked)
+    headers = {"Authorization": f"Bearer {create_access_token(mobile)}"}
+    response = await request(
+        app, "POST", f"/api/v1/employee/{mobile}/check-in", headers=headers
+    )
+
+    assert response["status"] == 503
+    assert response["headers"]["retry-after"] == "1"
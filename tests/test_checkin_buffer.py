@@ -0,0 +1,109 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import textwrap
+from datetime import datetime
+
+import pytest
+from helpers import employee, seed
+from sqlalchemy import select
+
+from checkin import to_taipei_time
+from checkin_buffer import CheckInBuffer
+from database import database, employee_table, participant_totals_table
+from totals import TOTAL_COLUMNS, reconcile_totals
+
+pytestmark = pytest.mark.anyio
+
+EMPLOYEES = 30
+
+# Accepts check-ins into the journal and dies with SIGKILL before the
+# flusher (an hour away) writes any of them.
+CRASHING_WORKER = textwrap.dedent(
+    """
+    import asyncio, os, signal, sys
+    from datetime import datetime
+    sys.path.insert(0, {root!r})
+    from checkin import TAIPEI
+    from checkin_buffer import CheckInBuffer
+
+    async def main():
+        buffer = CheckInBuffer({journal!r}, flush_interval=3600)
+        await buffer.start()
+        for i in range({employees}):
+            employee = {{"id": i + 1, "mobile": f"09{{i:08d}}", "is_checked": False}}
+            buffer.check_in(employee, TAIPEI.localize(datetime(2026, 5, 1, 9, 0, i)))
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    asyncio.run(main())
+    """
+)
+
+
+def crash_after_accepting(journal: str):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = CRASHING_WORKER.format(root=root, journal=journal, employees=EMPLOYEES)
+    worker = subprocess.run(
+        [sys.executable, "-c", script], env=os.environ, capture_output=True, check=False
+    )
+    assert worker.returncode == -signal.SIGKILL, worker.stderr.decode()
+
+
+async def test_journal_is_replayed_after_a_crash(db, tmp_path):
+    await seed(EMPLOYEES)
+    journal = str(tmp_path)
+    crash_after_accepting(journal)
+    assert os.listdir(journal)
+    assert not await database.fetch_val(
+        select(employee_table.c.id).where(employee_table.c.is_checked == True)
+    )
+
+    recovered = CheckInBuffer(journal)
+    await recovered.start()
+    await recovered.stop()
+
+    assert recovered.replayed == EMPLOYEES
+    assert os.listdir(journal) == []
+    rows = await database.fetch_all(
+        employee_table.select().order_by(employee_table.c.id)
+    )
+    assert all(row["is_checked"] for row in rows)
+    assert [to_taipei_time(row["checked_in_time"]).second for row in rows] == list(
+        range(EMPLOYEES)
+    )
+
+    counters = await database.fetch_one(participant_totals_table.select())
+    assert {
+        total: counters[total] for total in TOTAL_COLUMNS
+    } == await reconcile_totals()
+    assert counters["total_employee"] == EMPLOYEES
+
+
+async def test_replaying_twice_checks_nobody_in_twice(db, tmp_path):
+    await seed(EMPLOYEES)
+    first, second = tmp_path / "first", tmp_path / "second"
+    crash_after_accepting(str(first))
+    shutil.copytree(first, second)
+
+    for journal in (first, second):
+        recovered = CheckInBuffer(str(journal))
+        await recovered.start()
+        await recovered.stop()
+        assert recovered.replayed == EMPLOYEES
+
+    assert (await reconcile_totals())["total_employee"] == EMPLOYEES
+    counters = await database.fetch_one(participant_totals_table.select())
+    assert counters["total_employee"] == EMPLOYEES
+
+
+def test_check_in_is_acknowledged_from_the_journal(tmp_path):
+    buffer = CheckInBuffer(str(tmp_path))
+    buffer._segment = buffer._new_segment()
+
+    first, newly_checked_in = buffer.check_in(employee(1), datetime(2026, 5, 1, 9, 0))
+    assert newly_checked_in and first["is_checked"]
+    again, newly_checked_in = buffer.check_in(employee(1), datetime(2026, 5, 1, 9, 5))
+    assert not newly_checked_in
+    assert again["checked_in_time"] == first["checked_in_time"]
@@ -0,0 +1,61 @@
+import pytest
+from fastapi.routing import APIRoute
+
+from main import app
+from metrics import registry, route_template
+
+
+async def endpoint():
+    return None
+
+
+def test_route_template_puts_back_the_router_prefix():
+    # A path parameter equal to a literal segment of the path.
+    scope = {
+        "path": "/api/v1/employee/group/members/members",
+        "route": APIRoute("/group/members/{group}", endpoint),
+    }
+    assert route_template(scope) == "/api/v1/employee/group/members/{group}"
+
+
+def test_route_template_of_a_route_with_its_full_path():
+    scope = {
+        "path": "/api/v1/employee/group/1/members/1",
+        "route": APIRoute("/api/v1/employee/group/{group}/members/{id}", endpoint),
+    }
+    assert route_template(scope) == "/api/v1/employee/group/{group}/members/{id}"
+
+
+def test_route_template_of_an_unmatched_request():
+    assert route_template({"path": "/nowhere"}) == "unmatched"
+
+
+@pytest.mark.anyio
+async def test_requests_are_labelled_by_route(db):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    path = "/api/v1/employee/group/members/members"
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"test")],
+        "client": ("127.0.0.1", 0),
+        "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+
+    assert messages[0]["status"] == 404
+    assert 'route="/api/v1/employee/group/members/{group}"' in registry.render()
@@ -0,0 +1,89 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy
+
+from database import employee_table, participant_totals_table
+from migrations import (
+    MIGRATIONS,
+    _0001_initial_schema,
+    employee_duplicates_table,
+    status,
+    upgrade,
+)
+
+
+def row(id: int, mobile: str, name: str, **values) -> dict:
+    return {
+        "id": id,
+        "name": name,
+        "mobile": mobile,
+        "department": "Department",
+        "company": "Company",
+        "family_employee": 1,
+        "family_infant": 0,
+        "family_child": 0,
+        "family_adult": 0,
+        "family_elderly": 0,
+        "is_checked": False,
+        "is_deleted": False,
+        **values,
+    }
+
+
+def test_duplicated_mobiles_are_set_aside_before_the_unique_index(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    # A roster from before the unique index, with the same mobile imported twice.
+    with engine.begin() as conn:
+        _0001_initial_schema(conn)
+        conn.execute(sqlalchemy.text("DROP INDEX ix_employee_mobile"))
+        conn.execute(
+            employee_table.insert(),
+            [
+                row(1, "0911", "Checked in", is_checked=True, family_adult=2),
+                row(2, "0911", "Newer"),
+                row(3, "0922", "Older"),
+                row(4, "0922", "Newest"),
+                row(5, "0933", "Unique"),
+            ],
+        )
+
+    assert upgrade(engine) == [version for version, _, _ in MIGRATIONS]
+    assert all(applied for _, _, applied in status(engine))
+
+    with engine.begin() as conn:
+        assert conn.execute(
+            sqlalchemy.select(employee_table.c.id).order_by("id")
+        ).scalars().all() == [1, 4, 5]
+        removed = (
+            conn.execute(employee_duplicates_table.select().order_by("id"))
+            .mappings()
+            .all()
+        )
+        assert [(row["id"], row["kept_id"]) for row in removed] == [(2, 1), (3, 4)]
+        assert json.loads(removed[0]["record"])["name"] == "Newer"
+        totals = conn.execute(participant_totals_table.select()).mappings().one()
+        assert totals["total_employee"] == 1 and totals["total_adult"] == 2
+
+        indexes = sqlalchemy.inspect(conn).get_indexes(employee_table.name)
+        assert {"name": "ix_employee_mobile", "unique": 1} in [
+            {"name": index["name"], "unique": index["unique"]} for index in indexes
+        ]
+
+
+def test_workers_starting_together_migrate_once(tmp_path):
+    engines = [
+        sqlalchemy.create_engine(f"sqlite:///{tmp_path}/fresh.db") for _ in range(4)
+    ]
+
+    with ThreadPoolExecutor(len(engines)) as pool:
+        results = list(pool.map(upgrade, engines))
+
+    # One worker applied everything; the others waited and found nothing pending.
+    assert sorted(results, key=len) == [
+        [],
+        [],
+        [],
+        [version for version, _, _ in MIGRATIONS],
+    ]
+    assert all(applied for _, _, applied in status(engines[0]))
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from helpers import postgres
+
+from config import config
+from database import InstrumentedDatabase
+from pool import PoolManager, PoolTimeoutError
+
+pytestmark = [pytest.mark.anyio, postgres]
+
+
+async def test_app_database_connects_through_the_pool(db):
+    before = db.pool_manager.acquired
+    assert await db.fetch_val("SELECT 1") == 1
+
+    stats = db.pool_manager.stats()
+    assert stats["size"] >= 1 and stats["max"] == config.DB_POOL_MAX_SIZE
+    assert db.pool_manager.acquired > before
+    assert db.pool_manager.health()["pooled"]
+
+
+async def test_acquire_times_out_when_the_pool_is_exhausted():
+    manager = PoolManager(config.DATABASE_URL)
+    manager.acquire_timeout = 0.2
+    database = InstrumentedDatabase(
+        config.DATABASE_URL, manager, min_size=1, max_size=1
+    )
+    await database.connect()
+    try:
+        held, release = asyncio.Event(), asyncio.Event()
+
+        async def hold():
+            async with database.connection():
+                held.set()
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await held.wait()
+        with pytest.raises(PoolTimeoutError):
+            await database.fetch_val("SELECT 1")
+        assert manager.timeouts == 1
+
+        release.set()
+        await holder
+        assert await database.fetch_val("SELECT 1") == 1
+    finally:
+        await database.disconnect()
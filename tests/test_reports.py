@@ -0,0 +1,80 @@
+import csv
+import io
+import os
+from datetime import datetime
+
+import pytest
+from helpers import employee, seed
+
+from checkin import TAIPEI, check_in
+from reports import SUMMARY_TOTALS, iter_csv, summary_header, write_xlsx
+
+pytestmark = pytest.mark.anyio
+
+EMPLOYEES = 20
+CHECKED_IN = range(0, EMPLOYEES, 3)
+
+
+async def seed_and_check_in():
+    await seed(EMPLOYEES)
+    for i in CHECKED_IN:
+        await check_in(
+            employee(i)["mobile"], TAIPEI.localize(datetime(2026, 5, 1, 9, i))
+        )
+
+
+def expected_summary(by: str) -> list[list[str]]:
+    groups = {}
+    for i in range(EMPLOYEES):
+        row = employee(i)
+        counts = groups.setdefault(row[by], [0] * (2 + len(SUMMARY_TOTALS)))
+        counts[0] += 1
+        if i in CHECKED_IN:
+            counts[1] += 1
+            for n, column in enumerate(SUMMARY_TOTALS.values(), 2):
+                counts[n] += row[column.name]
+    return [[key, *map(str, counts)] for key, counts in sorted(groups.items())]
+
+
+async def read_csv(sheet: str) -> list[list[str]]:
+    body = b"".join([chunk async for chunk in iter_csv(sheet)])
+    return list(csv.reader(io.StringIO(body.decode("utf-8-sig"))))
+
+
+@pytest.mark.parametrize("by", ["company", "department", "group"])
+async def test_csv_summary_counts_checked_in_families(db, by):
+    await seed_and_check_in()
+    rows = await read_csv(by)
+    assert rows[0] == summary_header(by)
+    assert rows[1:] == expected_summary(by)
+
+
+async def test_csv_attendance_lists_everyone_in_taipei_time(db):
+    await seed_and_check_in()
+    rows = await read_csv("attendance")
+    assert len(rows) == 1 + EMPLOYEES
+    assert rows[1][-2:] == ["True", "2026-05-01 09:00:00"]
+    assert rows[2][-2:] == ["False", ""]
+
+
+async def test_xlsx_has_every_sheet(db):
+    from openpyxl import load_workbook
+
+    await seed_and_check_in()
+    path = await write_xlsx()
+    try:
+        workbook = load_workbook(path, read_only=True)
+        assert workbook.sheetnames == [
+            "attendance",
+            "by company",
+            "by department",
+            "by group",
+        ]
+        rows = [
+            [str(value) for value in row]
+            for row in workbook["by group"].iter_rows(values_only=True)
+        ]
+        assert rows[1:] == expected_summary("group")
+        workbook.close()
+    finally:
+        os.unlink(path)
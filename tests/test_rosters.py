@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import pytest
+from helpers import seed
+
+from checkin import TAIPEI, check_in
+from rosters import roster_cache
+from routers.employee import get_team_members
+
+pytestmark = pytest.mark.anyio
+
+
+async def members(if_none_match=None):
+    return await get_team_members("G1", if_none_match=if_none_match)
+
+
+async def test_etag_is_honoured_by_another_worker(db):
+    await seed(20)
+    first = await members()
+    assert first.status_code == 200
+
+    # A fresh cache stands for another worker, or this one after the TTL.
+    roster_cache.invalidate_all()
+    second = await members(if_none_match=first.headers["etag"])
+    assert second.status_code == 304
+    assert second.headers["etag"] == first.headers["etag"]
+
+
+async def test_etag_changes_with_the_roster(db):
+    await seed(20)
+    before = await members()
+
+    await check_in("0900000001", datetime.now(TAIPEI))
+    roster_cache.invalidate_all()
+    after = await members(if_none_match=before.headers["etag"])
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+
+
+async def test_unknown_group_is_not_found(db):
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as error:
+        await get_team_members("nobody", if_none_match=None)
+    assert error.value.status_code == 404
@@ -0,0 +1,101 @@
+import asyncio
+import json
+from collections import Counter
+
+import pytest
+from helpers import seed
+
+import routers.employee
+from benchmarks.asgi_client import request
+from database import database, employee_table
+from main import app
+from scans import ScanDeduplicator
+from security import create_access_token
+
+pytestmark = pytest.mark.anyio
+
+EMPLOYEES = 10
+BURST = 5
+
+
+@pytest.fixture
+def check_in_updates(monkeypatch):
+    """Counts the statements that try to check an employee in."""
+    counted = Counter()
+    timed = database._timed
+
+    def counting(operation, query, call):
+        sql = str(query)
+        if f"UPDATE {employee_table.name}" in sql and "is_checked" in sql:
+            counted[query_mobile(query)] += 1
+        return timed(operation, query, call)
+
+    monkeypatch.setattr(database, "_timed", counting)
+    return counted
+
+
+def query_mobile(query) -> str:
+    params = query.compile().params.values()
+    return next(
+        value for value in params if isinstance(value, str) and value.startswith("09")
+    )
+
+
+@pytest.fixture
+def deduplicator(monkeypatch):
+    def use(window: float) -> ScanDeduplicator:
+        scans = ScanDeduplicator(window=window, max_size=100)
+        monkeypatch.setattr(routers.employee, "scan_deduplicator", scans)
+        return scans
+
+    return use
+
+
+async def scan(mobile: str) -> dict:
+    response = await request(
+        app,
+        "POST",
+        f"/api/v1/employee/{mobile}/check-in",
+        headers={"Authorization": f"Bearer {create_access_token(mobile)}"},
+    )
+    assert response["status"] == 200, response
+    return json.loads(bytes(response["body"]))
+
+
+async def test_burst_of_duplicate_scans_is_one_write(
+    db, check_in_updates, deduplicator
+):
+    scans = deduplicator(window=10)
+    await seed(EMPLOYEES)
+    mobiles = [f"09{i:08d}" for i in range(EMPLOYEES)]
+
+    bursts = await asyncio.gather(
+        *[asyncio.gather(*[scan(mobile) for _ in range(BURST)]) for mobile in mobiles]
+    )
+    repeats = await asyncio.gather(*[scan(mobile) for mobile in mobiles])
+
+    assert check_in_updates == {mobile: 1 for mobile in mobiles}
+    assert scans.suppressed == EMPLOYEES * BURST
+    for responses, repeat in zip(bursts, repeats):
+        responses = [*responses, repeat]
+        assert sum(not response["already_checked_in"] for response in responses) == 1
+        assert len({response["checked_in_time"] for response in responses}) == 1
+
+
+async def test_scan_after_the_window_goes_to_the_database(
+    db, check_in_updates, deduplicator
+):
+    scans = deduplicator(window=0.2)
+    await seed(1)
+    mobile = "0900000000"
+
+    first = await scan(mobile)
+    assert (await scan(mobile))["already_checked_in"]
+    assert check_in_updates[mobile] == 1
+
+    await asyncio.sleep(0.3)
+    late = await scan(mobile)
+    assert check_in_updates[mobile] == 2
+    assert scans.suppressed == 1
+    assert late["already_checked_in"]
+    assert late["checked_in_time"] == first["checked_in_time"]
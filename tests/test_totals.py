@@ -0,0 +1,67 @@
+import asyncio
+import random
+from datetime import datetime
+
+import pytest
+from helpers import seed, undo_check_in
+
+from checkin import TAIPEI, check_in
+from database import database, participant_totals_table
+from totals import TOTAL_COLUMNS, read_totals, reconcile_totals
+
+pytestmark = pytest.mark.anyio
+
+# SQLite serializes the writes and gives up on a lock after 5 s, which
+# bounds how many can be in flight at once there.
+EMPLOYEES = 40
+
+
+async def counters() -> dict:
+    row = await database.fetch_one(participant_totals_table.select())
+    return {total: row[total] for total in TOTAL_COLUMNS}
+
+
+async def test_totals_follow_check_ins(db):
+    await seed(3)
+
+    employee, newly_checked_in = await check_in("0900000001", datetime.now(TAIPEI))
+    assert employee["mobile"] == "0900000001"
+    assert newly_checked_in
+    assert await read_totals() == {
+        "total_employee": 1,
+        "total_infant": 1,
+        "total_child": 1,
+        "total_adult": 2,
+        "total_elderly": 0,
+    }
+
+    _, newly_checked_in = await check_in("0900000001", datetime.now(TAIPEI))
+    assert not newly_checked_in
+    assert (await read_totals())["total_employee"] == 1
+
+    assert await undo_check_in("0900000001") is not None
+    assert await undo_check_in("0900000001") is None
+    assert set((await read_totals()).values()) == {0}
+
+
+async def test_totals_do_not_drift_under_concurrent_check_ins_and_reversals(db):
+    await seed(EMPLOYEES)
+    rng = random.Random(3)
+    mobiles = [f"09{i:08d}" for i in range(EMPLOYEES)]
+
+    # Every employee is scanned twice and a third of them also have their
+    # check-in reversed twice, all at once and in random order.
+    operations = [
+        lambda mobile=mobile: check_in(mobile, datetime.now(TAIPEI))
+        for mobile in mobiles * 2
+    ]
+    operations += [
+        lambda mobile=mobile: undo_check_in(mobile)
+        for mobile in mobiles[: EMPLOYEES // 3] * 2
+    ]
+    rng.shuffle(operations)
+    await asyncio.gather(*[operation() for operation in operations])
+
+    running = await counters()
+    assert running == await reconcile_totals()
+    assert running["total_employee"] > 0
@@ -0,0 +1,142 @@
+import logging
+
+import sqlalchemy
+from sqlalchemy import func, select
+
+from database import database, employee_table, participant_totals_table
+from replicas import replica_router
+
+logger = logging.getLogger(__name__)
+
+TOTALS_ROW_ID = 1
+
+# Running total column -> employee column it sums.
+TOTAL_COLUMNS = {
+    "total_employee": employee_table.c.family_employee,
+    "total_infant": employee_table.c.family_infant,
+    "total_child": employee_table.c.family_child,
+    "total_adult": employee_table.c.family_adult,
+    "total_elderly": employee_table.c.family_elderly,
+}
+
+
+def _sum_query():
+    return select(
+        *[
+            func.coalesce(func.sum(column), 0).label(total)
+            for total, column in TOTAL_COLUMNS.items()
+        ]
+    ).where(employee_table.c.is_checked == True)
+
+
+def _locked_totals_query():
+    return (
+        participant_totals_table.select()
+        .where(participant_totals_table.c.id == TOTALS_ROW_ID)
+        .with_for_update()
+    )
+
+
+def _to_response(row) -> dict:
+    return {total: row[total] or 0 for total in TOTAL_COLUMNS}
+
+
+async def add_check_in(employee):
+    """
+    Add a newly checked-in employee's family to the running totals.
+
+    Must run inside the same transaction that flips `is_checked`, so the
+    counters commit or roll back together with the check-in.
+    """
+    increments = {
+        total: participant_totals_table.c[total] + (employee[column.name] or 0)
+        for total, column in TOTAL_COLUMNS.items()
+    }
+    query = (
+        participant_totals_table.update()
+        .where(participant_totals_table.c.id == TOTALS_ROW_ID)
+        .values(**increments)
+    )
+    await database.execute(query)
+
+
+def add_check_in_cte(checked):
+    """
+    Data-modifying CTE that adds the rows of the `checked` CTE (employees
+    flipped to checked in by the same statement) to the running totals.
+    Postgres only; lets the check-in and the counter update share one
+    round trip.
+    """
+    increments = {
+        total: participant_totals_table.c[total]
+        + select(func.coalesce(func.sum(checked.c[column.name]), 0)).scalar_subquery()
+        for total, column in TOTAL_COLUMNS.items()
+    }
+    return (
+        participant_totals_table.update()
+        .where(
+            participant_totals_table.c.id == TOTALS_ROW_ID,
+            select(checked.c.id).exists(),
+        )
+        .values(**increments)
+        .cte("bumped_totals")
+    )
+
+
+async def reconcile_totals() -> dict:
+    """Rebuild the running totals from the employee table."""
+    async with database.transaction():
+        # Lock the counters row first: check-ins that are still in flight
+        # block on it and apply their increment after the rebuilt value.
+        current = await database.fetch_one(_locked_totals_query())
+        totals = dict(await database.fetch_one(_sum_query()))
+
+        if current is None:
+            query = participant_totals_table.insert().values(id=TOTALS_ROW_ID, **totals)
+        else:
+            query = (
+                participant_totals_table.update()
+                .where(participant_totals_table.c.id == TOTALS_ROW_ID)
+                .values(**totals)
+            )
+        await database.execute(query)
+
+    if current is not None and _to_response(current) != totals:
+        logger.warning(
+            "Participant totals drifted: %s, rebuilt as %s",
+            _to_response(current),
+            totals,
+        )
+
+    return totals
+
+
+def reconcile_totals_sync(conn: sqlalchemy.Connection) -> dict:
+    """Synchronous `reconcile_totals` for migrations and maintenance scripts."""
+    current = conn.execute(_locked_totals_query()).mappings().first()
+    totals = dict(conn.execute(_sum_query()).mappings().one())
+
+    if current is None:
+        conn.execute(
+            participant_totals_table.insert().values(id=TOTALS_ROW_ID, **totals)
+        )
+    else:
+        conn.execute(
+            participant_totals_table.update()
+            .where(participant_totals_table.c.id == TOTALS_ROW_ID)
+            .values(**totals)
+        )
+    return totals
+
+
+async def read_totals() -> dict:
+    """Read the running totals; a single primary-key lookup."""
+    query = participant_totals_table.select().where(
+        participant_totals_table.c.id == TOTALS_ROW_ID
+    )
+    row = await replica_router.reader().fetch_one(query)
+
+    if row is None:
+        return await reconcile_totals()
+
+    return _to_response(row)